@@ -0,0 +1,70 @@
+"""add conversations inbox
+
+Revision ID: a7c3e5f9b124
+Revises: f2b6d8e0a413
+Create Date: 2026-10-17 23:05:48.931204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a7c3e5f9b124'
+down_revision: Union[str, Sequence[str], None] = 'f2b6d8e0a413'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Una fila por participante a partir del último mensaje de cada
+# conversación; sin leer = recibidos después de su marca de lectura
+BACKFILL = """
+    INSERT INTO conversations (
+        user_id, other_user_id, conversation_key, last_message_id, last_sender_id,
+        last_message_preview, last_message_at, unread_count
+    )
+    SELECT m.{me}, m.{other}, m.conversation_key, m.id, m.sender_id,
+        SUBSTR(m.content, 1, 120), COALESCE(m.timestamp, CURRENT_TIMESTAMP),
+        (
+            SELECT COUNT(*) FROM messages u
+            WHERE u.conversation_key = m.conversation_key
+                AND u.receiver_id = m.{me}
+                AND u.id > COALESCE((
+                    SELECT r.last_read_message_id FROM conversation_reads r
+                    WHERE r.user_id = m.{me} AND r.conversation_key = m.conversation_key
+                ), 0)
+        )
+    FROM messages m
+    WHERE m.id IN (SELECT MAX(id) FROM messages GROUP BY conversation_key)
+"""
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('conversations',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('other_user_id', sa.Integer(), nullable=False),
+    sa.Column('conversation_key', sa.String(), nullable=False),
+    sa.Column('last_message_id', sa.Integer(), nullable=False),
+    sa.Column('last_sender_id', sa.Integer(), nullable=False),
+    sa.Column('last_message_preview', sa.String(), nullable=False),
+    sa.Column('last_message_at', sa.DateTime(), nullable=False),
+    sa.Column('unread_count', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['other_user_id'], ['users.id'], ),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('user_id', 'other_user_id', name='uq_conversation_participant')
+    )
+    op.create_index(op.f('ix_conversations_id'), 'conversations', ['id'], unique=False)
+    op.create_index('ix_conversations_inbox', 'conversations', ['user_id', 'last_message_id'], unique=False)
+    op.execute(BACKFILL.format(me='sender_id', other='receiver_id'))
+    op.execute(BACKFILL.format(me='receiver_id', other='sender_id'))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_conversations_inbox', table_name='conversations')
+    op.drop_index(op.f('ix_conversations_id'), table_name='conversations')
+    op.drop_table('conversations')
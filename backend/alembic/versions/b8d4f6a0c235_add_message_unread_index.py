@@ -0,0 +1,28 @@
+"""add message unread index
+
+Revision ID: b8d4f6a0c235
+Revises: a7c3e5f9b124
+Create Date: 2026-10-18 10:12:03.517740
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b8d4f6a0c235'
+down_revision: Union[str, Sequence[str], None] = 'a7c3e5f9b124'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_messages_unread', 'messages', ['conversation_key', 'receiver_id', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_messages_unread', table_name='messages')
@@ -0,0 +1,69 @@
+"""add places catalog
+
+Revision ID: c3a1e7f4b920
+Revises: 99d37f46b6d8
+Create Date: 2026-10-17 10:12:31.482113
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c3a1e7f4b920'
+down_revision: Union[str, Sequence[str], None] = '99d37f46b6d8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('places',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('place_id', sa.String(), nullable=False),
+    sa.Column('name', sa.String(), nullable=True),
+    sa.Column('address', sa.String(), nullable=True),
+    sa.Column('types', sa.JSON(), nullable=False),
+    sa.Column('rating', sa.Float(), nullable=True),
+    sa.Column('user_ratings_total', sa.Integer(), nullable=True),
+    sa.Column('latitude', sa.Float(), nullable=False),
+    sa.Column('longitude', sa.Float(), nullable=False),
+    sa.Column('geohash', sa.String(length=12), nullable=False),
+    sa.Column('open_now', sa.Boolean(), nullable=True),
+    sa.Column('photos', sa.JSON(), nullable=False),
+    sa.Column('fetched_at', sa.DateTime(), nullable=False),
+    sa.Column('details', sa.JSON(), nullable=True),
+    sa.Column('details_fetched_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_places_id'), 'places', ['id'], unique=False)
+    op.create_index(op.f('ix_places_place_id'), 'places', ['place_id'], unique=True)
+    op.create_index(op.f('ix_places_geohash'), 'places', ['geohash'], unique=False)
+    op.create_table('place_searches',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('geohash', sa.String(length=12), nullable=False),
+    sa.Column('latitude', sa.Float(), nullable=False),
+    sa.Column('longitude', sa.Float(), nullable=False),
+    sa.Column('radius', sa.Integer(), nullable=False),
+    sa.Column('place_type', sa.String(), nullable=False),
+    sa.Column('keyword', sa.String(), nullable=False),
+    sa.Column('result_count', sa.Integer(), nullable=False),
+    sa.Column('searched_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('geohash', 'radius', 'place_type', 'keyword', name='uq_place_search')
+    )
+    op.create_index(op.f('ix_place_searches_id'), 'place_searches', ['id'], unique=False)
+    op.create_index(op.f('ix_place_searches_geohash'), 'place_searches', ['geohash'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_place_searches_geohash'), table_name='place_searches')
+    op.drop_index(op.f('ix_place_searches_id'), table_name='place_searches')
+    op.drop_table('place_searches')
+    op.drop_index(op.f('ix_places_geohash'), table_name='places')
+    op.drop_index(op.f('ix_places_place_id'), table_name='places')
+    op.drop_index(op.f('ix_places_id'), table_name='places')
+    op.drop_table('places')
@@ -0,0 +1,33 @@
+"""order inbox by last message at
+
+Revision ID: c9e5a7b1d346
+Revises: b8d4f6a0c235
+Create Date: 2026-10-18 10:41:26.804113
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c9e5a7b1d346'
+down_revision: Union[str, Sequence[str], None] = 'b8d4f6a0c235'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.drop_index('ix_conversations_inbox', table_name='conversations')
+    op.create_index(
+        'ix_conversations_inbox', 'conversations',
+        ['user_id', 'last_message_at', 'last_message_id'], unique=False,
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_conversations_inbox', table_name='conversations')
+    op.create_index('ix_conversations_inbox', 'conversations', ['user_id', 'last_message_id'], unique=False)
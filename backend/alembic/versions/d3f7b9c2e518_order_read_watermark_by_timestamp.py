@@ -0,0 +1,63 @@
+"""order read watermark by timestamp
+
+Revision ID: d3f7b9c2e518
+Revises: c9e5a7b1d346
+Create Date: 2026-10-18 12:20:44.391572
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd3f7b9c2e518'
+down_revision: Union[str, Sequence[str], None] = 'c9e5a7b1d346'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Timestamp del mensaje de cada marca de lectura
+BACKFILL_READ_AT = """
+    UPDATE conversation_reads SET last_read_at = COALESCE((
+        SELECT m.timestamp FROM messages m WHERE m.id = conversation_reads.last_read_message_id
+    ), updated_at)
+"""
+
+# Sin leer = recibidos después de la marca, en el orden indicado
+RECOUNT_UNREAD = """
+    UPDATE conversations SET unread_count = (
+        SELECT COUNT(*) FROM messages u
+        WHERE u.conversation_key = conversations.conversation_key
+            AND u.receiver_id = conversations.user_id
+            AND NOT EXISTS (
+                SELECT 1 FROM conversation_reads r
+                WHERE r.user_id = conversations.user_id
+                    AND r.conversation_key = conversations.conversation_key
+                    AND {read}
+            )
+    )
+"""
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('conversation_reads', sa.Column('last_read_at', sa.DateTime(), nullable=True))
+    op.execute(BACKFILL_READ_AT)
+    with op.batch_alter_table('conversation_reads') as batch_op:
+        batch_op.alter_column('last_read_at', existing_type=sa.DateTime(), nullable=False)
+    op.drop_index('ix_messages_unread', table_name='messages')
+    op.create_index(
+        'ix_messages_unread', 'messages',
+        ['conversation_key', 'receiver_id', 'timestamp', 'id'], unique=False,
+    )
+    op.execute(RECOUNT_UNREAD.format(read="(u.timestamp, u.id) <= (r.last_read_at, r.last_read_message_id)"))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_messages_unread', table_name='messages')
+    op.create_index('ix_messages_unread', 'messages', ['conversation_key', 'receiver_id', 'id'], unique=False)
+    with op.batch_alter_table('conversation_reads') as batch_op:
+        batch_op.drop_column('last_read_at')
+    op.execute(RECOUNT_UNREAD.format(read="u.id <= r.last_read_message_id"))
@@ -0,0 +1,41 @@
+"""add geocode cache
+
+Revision ID: d81f0b6c2e47
+Revises: c3a1e7f4b920
+Create Date: 2026-10-17 12:03:54.917260
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd81f0b6c2e47'
+down_revision: Union[str, Sequence[str], None] = 'c3a1e7f4b920'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('geocode_cache',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('query', sa.String(), nullable=False),
+    sa.Column('formatted_address', sa.String(), nullable=True),
+    sa.Column('latitude', sa.Float(), nullable=False),
+    sa.Column('longitude', sa.Float(), nullable=False),
+    sa.Column('place_id', sa.String(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_geocode_cache_id'), 'geocode_cache', ['id'], unique=False)
+    op.create_index(op.f('ix_geocode_cache_query'), 'geocode_cache', ['query'], unique=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_geocode_cache_query'), table_name='geocode_cache')
+    op.drop_index(op.f('ix_geocode_cache_id'), table_name='geocode_cache')
+    op.drop_table('geocode_cache')
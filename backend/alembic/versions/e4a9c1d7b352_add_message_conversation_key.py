@@ -0,0 +1,43 @@
+"""add message conversation key
+
+Revision ID: e4a9c1d7b352
+Revises: d81f0b6c2e47
+Create Date: 2026-10-17 22:30:12.604118
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e4a9c1d7b352'
+down_revision: Union[str, Sequence[str], None] = 'd81f0b6c2e47'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('messages', sa.Column('conversation_key', sa.String(), nullable=True))
+    # '{min_id}_{max_id}' de los mensajes existentes
+    op.execute(
+        """
+        UPDATE messages SET conversation_key = CASE
+            WHEN sender_id < receiver_id
+                THEN CAST(sender_id AS VARCHAR) || '_' || CAST(receiver_id AS VARCHAR)
+            ELSE CAST(receiver_id AS VARCHAR) || '_' || CAST(sender_id AS VARCHAR)
+        END
+        """
+    )
+    with op.batch_alter_table('messages') as batch_op:
+        batch_op.alter_column('conversation_key', existing_type=sa.String(), nullable=False)
+    op.create_index('ix_messages_conversation', 'messages', ['conversation_key', 'timestamp', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_messages_conversation', table_name='messages')
+    with op.batch_alter_table('messages') as batch_op:
+        batch_op.drop_column('conversation_key')
@@ -0,0 +1,50 @@
+"""add conversation reads
+
+Revision ID: f2b6d8e0a413
+Revises: e4a9c1d7b352
+Create Date: 2026-10-17 22:41:37.218950
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f2b6d8e0a413'
+down_revision: Union[str, Sequence[str], None] = 'e4a9c1d7b352'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Marca inicial de cada receptor: su último mensaje recibido con is_read,
+# para que lo ya leído no vuelva a contar como no leído
+SEED_WATERMARKS = """
+    INSERT INTO conversation_reads (user_id, conversation_key, last_read_message_id, updated_at)
+    SELECT receiver_id, conversation_key, MAX(id), CURRENT_TIMESTAMP
+    FROM messages
+    WHERE is_read
+    GROUP BY receiver_id, conversation_key
+"""
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('conversation_reads',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('conversation_key', sa.String(), nullable=False),
+    sa.Column('last_read_message_id', sa.Integer(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('user_id', 'conversation_key', name='uq_conversation_read')
+    )
+    op.create_index(op.f('ix_conversation_reads_id'), 'conversation_reads', ['id'], unique=False)
+    op.execute(SEED_WATERMARKS)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_conversation_reads_id'), table_name='conversation_reads')
+    op.drop_table('conversation_reads')
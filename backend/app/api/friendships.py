@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, status
+from fastapi import APIRouter, BackgroundTasks, Depends, status
 from sqlalchemy.orm import Session
 from typing import List
 from fastapi import Request
@@ -14,6 +14,7 @@ from app.schemas.friendship import (
     FriendshipResponse,
 )
 from app.services.friendship_service import FriendshipService
+from app.websocket.presence_manager import presence_manager
 
 router = APIRouter(prefix="/friends", tags=["Friends"])
 
@@ -63,11 +64,17 @@ def lookup_invite(
 @router.post("/invites/{token}/accept", response_model=FriendshipResponse)
 def accept_invite(
     token: str,
+    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_active_user),
 ):
     """Aceptar una invitación (crea la amistad)"""
-    return FriendshipService.accept_invite(db, current_user, token)
+    friendship = FriendshipService.accept_invite(db, current_user, token)
+    # Tras la respuesta, en el event loop: avisar a la presencia en vivo
+    background_tasks.add_task(
+        presence_manager.friendship_changed, friendship.requester_id, friendship.addressee_id, True
+    )
+    return friendship
 
 
 # -------- Friends --------
@@ -97,11 +104,13 @@ def list_friends(
 @router.delete("/{user_id}", status_code=status.HTTP_204_NO_CONTENT)
 def remove_friend(
     user_id: int,
+    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_active_user),
 ):
     """Eliminar una amistad"""
     FriendshipService.remove_friend(db, current_user, user_id)
+    background_tasks.add_task(presence_manager.friendship_changed, current_user.id, user_id, False)
 
 
 @router.post("/invites/code/{code}/accept", response_model=FriendshipResponse)
@@ -109,8 +118,13 @@ def remove_friend(
 def accept_invite_by_code(
     request: Request,
     code: str,
+    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_active_user),
 ):
     """Aceptar una invitación usando el código corto (en vez del token)"""
-    return FriendshipService.accept_invite_by_code(db, current_user, code)
+    friendship = FriendshipService.accept_invite_by_code(db, current_user, code)
+    background_tasks.add_task(
+        presence_manager.friendship_changed, friendship.requester_id, friendship.addressee_id, True
+    )
+    return friendship
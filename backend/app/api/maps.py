@@ -1,20 +1,31 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from sqlalchemy.orm import Session
 from typing import Optional, List, Dict, Any
+from app.core.circuit_breaker import CircuitOpenError
+from app.core.database import get_db
 from app.core.deps import get_current_active_user
 from app.models.user import User
+from app.services.catalog_writer import catalog_writer
+from app.services.geocode_service import GeocodeService
 from app.services.maps_services import maps_service
+from app.services.place_service import PlaceService
 
 # Create router with prefix and tag for documentation
 router = APIRouter(prefix="/maps", tags=["Maps"])
 
+# Set on responses served from cached or catalog data because Google failed
+DEGRADED_HEADER = "X-Maps-Degraded"
+
 
 @router.get("/nearby", response_model=List[Dict[str, Any]])
 def get_nearby_places(
+    response: Response,
     latitude: float = Query(..., description="Latitude of the location", ge=-90, le=90),
     longitude: float = Query(..., description="Longitude of the location", ge=-180, le=180),
     radius: int = Query(1000, description="Search radius in meters", ge=100, le=50000),
     place_type: Optional[str] = Query(None, description="Type of place (restaurant, cafe, museum, park, etc.)"),
     keyword: Optional[str] = Query(None, description="Keyword to filter results"),
+    db: Session = Depends(get_db),
     current_user: User = Depends(get_current_active_user)
 ):
     """
@@ -26,21 +37,29 @@ def get_nearby_places(
     - **place_type**: Filter by place type (restaurant, cafe, museum, park, etc.)
     - **keyword**: Additional keyword filter (e.g., "italian", "pizza")
 
-    Returns a list of nearby places with their details.
+    Returns a list of nearby places with their details. Areas already
+    covered by a recent search are answered from the local place catalog.
+    If Google Maps is failing, whatever the catalog has for the area is
+    returned with `degraded: true` on each place and the `X-Maps-Degraded`
+    header set.
     """
-    places = maps_service.get_nearby_places(
+    places = PlaceService.get_nearby_places(
+        db,
         latitude=latitude,
         longitude=longitude,
         radius=radius,
         place_type=place_type,
         keyword=keyword
     )
+    if any(place.get("degraded") for place in places):
+        response.headers[DEGRADED_HEADER] = "true"
     return places
 
 
 @router.get("/place/{place_id}")
 def get_place_details(
     place_id: str,
+    response: Response,
     current_user: User = Depends(get_current_active_user)
 ):
     """
@@ -49,8 +68,28 @@ def get_place_details(
     - **place_id**: The Google Maps place ID
 
     Returns complete details including reviews, opening hours, contact info.
+    Details are cached with stale-while-revalidate and stored in the place
+    catalog whenever they are fetched from Google. If Google Maps is
+    failing, the last known copy is returned with `degraded: true`; without
+    one the response is 503 while its circuit is open and 502 otherwise.
+    A place known not to exist is 404 whatever the state of the circuit.
     """
-    place = maps_service.get_place_details(place_id)
+    try:
+        place = maps_service.get_place_details(
+            place_id,
+            on_fetched=PlaceService.save_place_details,
+            fallback=PlaceService.load_place_details,
+        )
+    except CircuitOpenError:
+        raise HTTPException(
+            status_code=503,
+            detail="Maps service temporarily unavailable"
+        )
+    except Exception:
+        raise HTTPException(
+            status_code=502,
+            detail="Maps service error"
+        )
 
     if place is None:
         raise HTTPException(
@@ -58,12 +97,16 @@ def get_place_details(
             detail="Place not found"
         )
 
+    if place.get("degraded"):
+        response.headers[DEGRADED_HEADER] = "true"
     return place
 
 
 @router.get("/geocode")
 def geocode_address(
+    response: Response,
     address: str = Query(..., description="Address to convert to coordinates", min_length=3),
+    db: Session = Depends(get_db),
     current_user: User = Depends(get_current_active_user)
 ):
     """
@@ -72,8 +115,23 @@ def geocode_address(
     - **address**: Full or partial address (e.g., "Gran Via, Madrid")
 
     Returns the formatted address, coordinates (lat/lng), and place_id.
+    Repeated addresses (ignoring case, accents, punctuation and spacing)
+    are served from the geocode cache. If Google Maps is failing, an
+    expired cache entry is returned with `degraded: true`; without one the
+    response is 503 while its circuit is open and 502 otherwise.
     """
-    result = maps_service.geocode_address(address)
+    try:
+        result = GeocodeService.geocode(db, address)
+    except CircuitOpenError:
+        raise HTTPException(
+            status_code=503,
+            detail="Maps service temporarily unavailable"
+        )
+    except Exception:
+        raise HTTPException(
+            status_code=502,
+            detail="Maps service error"
+        )
 
     if result is None:
         raise HTTPException(
@@ -81,4 +139,21 @@ def geocode_address(
             detail="Address not found"
         )
 
+    if result.get("degraded"):
+        response.headers[DEGRADED_HEADER] = "true"
     return result
+
+
+@router.get("/stats")
+def get_maps_stats(
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    Return hit/miss counters and sizes of the Maps service caches, plus
+    circuit breaker states, bulkhead usage and pending catalog writes.
+    """
+    return {
+        **maps_service.stats(),
+        "geocode_cache": GeocodeService.stats(),
+        "catalog_writer": catalog_writer.stats(),
+    }
@@ -1,35 +1,97 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+import json
+from datetime import datetime
+from typing import Optional
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query, status
 from sqlalchemy.orm import Session
 
 from app.core.database import get_db
 from app.core.deps import get_current_active_user
 from app.models.user import User
-from app.schemas.message import MessageCreate, MessageResponse
+from app.models.message import conversation_key
+from app.schemas.message import (
+    InboxEntry,
+    MessageCreate,
+    MessageResponse,
+    ReadWatermarkResponse,
+    ReadWatermarkUpdate,
+    UnreadCount,
+)
 from app.services.message_service import MessageService
+from app.websocket.manager import manager
 
 router = APIRouter(prefix="/messages", tags=["Messages"])
 
 
+# Declaradas antes de /{user_id} para que "inbox" y "unread" no se tomen por un user_id
+@router.get("/inbox", response_model=list[InboxEntry])
+def get_inbox(
+    limit: int = Query(20, ge=1, le=100, description="Maximum number of conversations to return"),
+    before_at: Optional[datetime] = Query(None, description="last_message_at of the previous page's last entry"),
+    before_id: Optional[int] = Query(None, description="last_message_id of the previous page's last entry"),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    Return your conversations, most recently active first, with a preview
+    of the last message and the unread count of each.
+
+    - **before_at** / **before_id**: cursor pagination. Pass the
+      `last_message_at` and `last_message_id` of the last entry of the
+      current page to get the next one.
+
+    Returns 400 if only one half of the cursor is given.
+    """
+    if (before_at is None) != (before_id is None):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Cursor inválido: before_at y before_id van juntos"
+        )
+    before = (before_at, before_id) if before_at is not None else None
+    return MessageService.get_inbox(db, current_user.id, limit=limit, before=before)
+
+
+@router.get("/unread", response_model=list[UnreadCount])
+def get_unread_counts(
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    Return the number of unread messages of every conversation that has
+    any, from the inbox counters.
+    """
+    return MessageService.unread_counts(db, current_user.id)
+
+
 @router.get("/{user_id}", response_model=list[MessageResponse],status_code=status.HTTP_200_OK)
 def get_conversation(
     user_id: int,
     skip: int = 0,
     limit: int = 20,
+    before: Optional[int] = Query(None, description="Messages older than this message ID"),
+    after: Optional[int] = Query(None, description="Messages newer than this message ID"),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_active_user)
 ):
     """
-    Return the full message history between the authenticated user and user_id,
-    ordered chronologically (oldest message first).
+    Return a page of the message history between the authenticated user and
+    user_id, ordered chronologically (oldest message first).
 
     - **user_id**: ID of the conversation partner
+    - **before** / **after**: cursor pagination. Pass the ID of the first
+      message of the current page as `before` to scroll back, or of the last
+      one as `after` to fetch newer messages. Cost does not grow with depth.
+    - **skip**: offset from the oldest message, used only without a cursor.
+
+    Returns 400 if a cursor is not a message of this conversation.
     """ 
     return MessageService.get_conversation(
         db,
         current_user_id=current_user.id,
         other_user_id=user_id,
         skip=skip,
-        limit=limit
+        limit=limit,
+        before=before,
+        after=after,
     )
 
 
@@ -59,11 +121,15 @@ def send_message(
 @router.patch("/{message_id}/read", response_model=MessageResponse)
 def mark_message_as_read(
     message_id: int,
+    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_active_user)
 ):
     """
-    Mark a message as read.
+    Mark a message as read. Read state is the per-conversation watermark,
+    so this is `PUT /messages/{user_id}/read-watermark` with this message:
+    every earlier message of the conversation is read too, the unread
+    count drops accordingly and the chat room gets a `{"type": "read"}` frame.
 
     Only the intended receiver of the message can mark it as read.
     Returns 404 if the message does not exist and 403 if the current
@@ -82,7 +148,53 @@ def mark_message_as_read(
             detail="No tienes permiso para marcar este mensaje como leído"
         )
 
-    return MessageService.mark_as_read(db, message)
+    message = MessageService.mark_as_read(db, message)
+    watermark = MessageService.get_read_watermark(db, current_user.id, message.sender_id)
+    frame = json.dumps({"type": "read", "user_id": current_user.id, "message_id": watermark})
+    background_tasks.add_task(manager.broadcast, message.conversation_key, frame)
+    return message
+
+@router.get("/{user_id}/read-watermark", response_model=ReadWatermarkResponse)
+def get_read_watermark(
+    user_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    Return the last message of the conversation with user_id that you
+    have read, and how many you have received after it.
+    """
+    return {
+        "user_id": user_id,
+        "last_read_message_id": MessageService.get_read_watermark(db, current_user.id, user_id),
+        "unread_count": MessageService.count_unread(db, current_user.id, user_id),
+    }
+
+
+@router.put("/{user_id}/read-watermark", response_model=ReadWatermarkResponse)
+def update_read_watermark(
+    user_id: int,
+    data: ReadWatermarkUpdate,
+    background_tasks: BackgroundTasks,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    Mark the conversation with user_id as read up to `message_id`, with a
+    single write however many messages that covers. The watermark never
+    moves back. The chat room gets a `{"type": "read"}` frame.
+
+    Returns 400 if the message is not part of this conversation.
+    """
+    watermark = MessageService.advance_read_watermark(db, current_user.id, user_id, data.message_id)
+    frame = json.dumps({"type": "read", "user_id": current_user.id, "message_id": watermark})
+    background_tasks.add_task(manager.broadcast, conversation_key(current_user.id, user_id), frame)
+    return {
+        "user_id": user_id,
+        "last_read_message_id": watermark,
+        "unread_count": MessageService.count_unread(db, current_user.id, user_id),
+    }
+
 
 @router.delete("/{user_id}", status_code=status.HTTP_200_OK)
 def delete_conversation(
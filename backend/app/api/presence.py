@@ -0,0 +1,97 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy.orm import Session
+from typing import Any, Dict, List, Optional
+
+from app.core.config import settings
+from app.core.database import get_db
+from app.core.deps import get_current_active_user
+from app.models.user import User
+from app.services.friendship_service import FriendshipService
+from app.services.position_recorder import position_recorder
+from app.websocket.heartbeat import heartbeat
+from app.websocket.presence_manager import presence_manager
+
+router = APIRouter(prefix="/presence", tags=["Presence"])
+
+
+def _friend_ids(db: Session, user: User) -> set[int]:
+    """friend_ids de la conexión de presencia, o de la BD si no está online."""
+    friend_ids = presence_manager.get_friend_ids(user.id)
+    if friend_ids is not None:
+        return friend_ids
+    return {
+        f.addressee_id if f.requester_id == user.id else f.requester_id
+        for f in FriendshipService.list_friends(db, user)
+    }
+
+
+@router.get("/nearby", response_model=List[Dict[str, Any]])
+def get_nearby_friends(
+    radius: float = Query(1000, description="Search radius in meters", gt=0, le=settings.PRESENCE_NEARBY_MAX_RADIUS),
+    latitude: Optional[float] = Query(None, description="Centre latitude (defaults to your live position)", ge=-90, le=90),
+    longitude: Optional[float] = Query(None, description="Centre longitude (defaults to your live position)", ge=-180, le=180),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    Online friends sharing their location within `radius` meters, nearest
+    first, with their distance in `distance_m`.
+
+    The centre is the position you last sent over the presence WebSocket,
+    or `latitude`/`longitude` if both are given. Returns 404 if neither is
+    available.
+    """
+    if latitude is not None and longitude is not None:
+        center = (latitude, longitude)
+    else:
+        center = presence_manager.get_position(current_user.id)
+        if center is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="No live position; send latitude and longitude"
+            )
+    return presence_manager.friends_within(
+        _friend_ids(db, current_user), center[0], center[1], radius
+    )
+
+
+@router.get("/bbox", response_model=List[Dict[str, Any]])
+def get_friends_in_bbox(
+    south: float = Query(..., ge=-90, le=90),
+    west: float = Query(..., ge=-180, le=180),
+    north: float = Query(..., ge=-90, le=90),
+    east: float = Query(..., ge=-180, le=180),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    Online friends sharing their location inside a bounding box, e.g. the
+    visible map area. Use `west > east` for a box crossing the
+    antimeridian.
+    """
+    if south > north:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="south must be <= north"
+        )
+    return presence_manager.friends_in_bbox(
+        _friend_ids(db, current_user), south, west, north, east
+    )
+
+
+@router.get("/stats")
+def get_presence_stats(
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    Return online/sharing user counts and location broadcast counters
+    (received, dropped as GPS jitter, coalesced within a tick, flushed,
+    frames sent), the write-behind position persistence counters, and
+    WebSocket heartbeat gauges for every endpoint (live sockets, pings
+    sent, idle sockets reaped).
+    """
+    return {
+        **presence_manager.stats(),
+        "persistence": position_recorder.stats(),
+        "heartbeat": heartbeat.stats(),
+    }
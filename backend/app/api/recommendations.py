@@ -1,18 +1,21 @@
-from fastapi import APIRouter, Depends, Query
+from fastapi import APIRouter, Depends, Query, Response
 from sqlalchemy.orm import Session
 from typing import Any, Dict, List
 
 from app.core.database import get_db
+from app.api.maps import DEGRADED_HEADER
 from app.core.deps import get_current_active_user
 from app.models.user import User
-from app.services.maps_services import maps_service
 from app.services.preference_service import PreferenceService
+from app.services.recommendation_prewarmer import recommendation_prewarmer
+from app.services.recommendation_service import RecommendationService
 
 router = APIRouter(prefix="/recommendations", tags=["Recommendations"])
 
 
 @router.get("/", response_model=List[Dict[str, Any]])
 def get_recommendations(
+    response: Response,
     latitude: float = Query(..., description="Latitude of the user", ge=-90, le=90),
     longitude: float = Query(..., description="Longitude of the user", ge=-180, le=180),
     radius: int = Query(1500, description="Search radius in meters", ge=100, le=50000),
@@ -25,73 +28,58 @@ def get_recommendations(
 
     The engine works as follows:
     1. Fetch the user's saved preferences (category / subcategory pairs).
-    2. For each preference, query Google Maps for nearby places matching
-       the preference category as a place type.
-    3. Deduplicate results by place_id.
-    4. Sort by rating (descending), boosting places whose types overlap
-       with the user's preferred categories.
-    5. Return the top `limit` results.
+    2. Serve the result from the recommendation cache if this user already
+       has recommendations for the same map cell, radius and preferences
+       (usually precomputed by the background pre-warmer).
+    3. Otherwise, for each distinct preference category, look up nearby
+       places of that type (in-memory cache, then the local place catalog,
+       then Google Maps). Categories are queried concurrently under a
+       per-request deadline; categories that time out are left out.
+       Further result pages are fetched only while there are fewer than
+       `limit` candidates.
+    4. Deduplicate results by place_id.
+    5. Score every candidate by preference match, rating, distance to the
+       user, review count and open status (see app.services.ranking).
+    6. Return the top `limit` results by score.
 
     If the user has no preferences, generic nearby places are returned
     without type filtering.
 
+    While Google Maps is failing, candidates come from the local place
+    catalog regardless of age; those places carry `degraded: true`, the
+    `X-Maps-Degraded` header is set and the result is not cached.
+
     - **latitude**: GPS latitude (-90 to 90)
     - **longitude**: GPS longitude (-180 to 180)
     - **radius**: Search radius in meters (default 1500 m)
     - **limit**: Maximum number of results (default 10, max 50)
     """
     preferences = PreferenceService.get_user_preferences(db, current_user.id)
+    categories = RecommendationService.distinct_categories(
+        pref.category for pref in preferences
+    )
 
-    # Collect unique categories from user preferences
-    preferred_categories = {pref.category.lower() for pref in preferences}
-
-    seen_place_ids: set = set()
-    all_places: List[Dict[str, Any]] = []
-
-    if preferences:
-        # Query Maps for each distinct category the user prefers
-        queried_categories: set = set()
-        for pref in preferences:
-            category = pref.category.lower()
-            if category in queried_categories:
-                continue
-            queried_categories.add(category)
-
-            places = maps_service.get_nearby_places(
-                latitude=latitude,
-                longitude=longitude,
-                radius=radius,
-                place_type=category
-            )
-            for place in places:
-                place_id = place.get("place_id")
-                if place_id and place_id not in seen_place_ids:
-                    seen_place_ids.add(place_id)
-                    all_places.append(place)
-    else:
-        # No preferences -- return generic nearby places
-        places = maps_service.get_nearby_places(
-            latitude=latitude,
-            longitude=longitude,
-            radius=radius
-        )
-        for place in places:
-            place_id = place.get("place_id")
-            if place_id and place_id not in seen_place_ids:
-                seen_place_ids.add(place_id)
-                all_places.append(place)
-
-    def _sort_key(place: Dict[str, Any]):
-        """
-        Primary sort: whether the place types overlap with user preferences
-        (preferred = True sorts before False).
-        Secondary sort: rating descending (missing rating treated as 0).
-        """
-        place_types = {t.lower() for t in place.get("types", [])}
-        matches_preference = bool(place_types & preferred_categories)
-        rating = place.get("rating") or 0
-        return (not matches_preference, -rating)
+    places = RecommendationService.get_recommendations(
+        current_user.id,
+        latitude=latitude,
+        longitude=longitude,
+        radius=radius,
+        limit=limit,
+        categories=categories,
+    )
+    if any(place.get("degraded") for place in places):
+        response.headers[DEGRADED_HEADER] = "true"
+    return places
 
-    all_places.sort(key=_sort_key)
 
-    return all_places[:limit]
+@router.get("/stats")
+def get_recommendation_stats(
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    Return recommendation cache counters and the last pre-warm cycle summary.
+    """
+    return {
+        "cache": RecommendationService.stats(),
+        "prewarmer": recommendation_prewarmer.stats(),
+    }
@@ -0,0 +1,214 @@
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Hashable, Optional
+
+
+class TTLCache:
+    """
+    Thread-safe LRU cache with a per-entry time to live.
+
+    Entries are evicted in least-recently-used order once maxsize is
+    reached, and lazily dropped on read once they are older than their
+    TTL. Hit, miss and eviction counters are kept for observability.
+    """
+
+    def __init__(self, maxsize: int, ttl: float) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        # key -> (expires_at, value)
+        self._data: "OrderedDict[Hashable, tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """
+        Return the cached value for key, or default if missing or expired.
+
+        Args:
+            key:     Hashable cache key.
+            default: Value returned on a miss.
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            expires_at, value = entry
+            if expires_at <= now:
+                del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        """
+        Store value under key, evicting the least recently used entries
+        if the cache is full.
+
+        Args:
+            key:   Hashable cache key.
+            value: Value to store.
+            ttl:   Optional TTL in seconds overriding the cache default.
+        """
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key: Hashable) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return size and hit/miss counters as a plain dict."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+class StaleWhileRevalidateCache:
+    """
+    Thread-safe LRU cache with soft and hard TTLs.
+
+    - Younger than soft_ttl: served as is.
+    - Between soft_ttl and hard_ttl: served immediately while a single
+      background refresh is scheduled for the key.
+    - Older than hard_ttl or missing: the caller blocks on the loader.
+      The expired entry is kept (see peek) until the loader replaces it.
+
+    A loader returning None is a negative result (e.g. not found) and is
+    cached for negative_ttl only. A loader raising an exception is never
+    cached; a failed background refresh keeps the stale entry.
+    """
+
+    def __init__(
+        self,
+        maxsize: int,
+        soft_ttl: float,
+        hard_ttl: float,
+        negative_ttl: float,
+        max_workers: int = 2,
+    ) -> None:
+        self.maxsize = maxsize
+        self.soft_ttl = soft_ttl
+        self.hard_ttl = hard_ttl
+        self.negative_ttl = negative_ttl
+        # key -> (stored_at, value)
+        self._data: "OrderedDict[Hashable, tuple[float, Any]]" = OrderedDict()
+        self._refreshing: set = set()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="swr-refresh")
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.refresh_errors = 0
+        self.evictions = 0
+
+    def _store(self, key: Hashable, value: Any) -> None:
+        with self._lock:
+            self._data[key] = (time.monotonic(), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def _refresh(self, key: Hashable, loader: Callable[[], Any]) -> None:
+        try:
+            value = loader()
+        except Exception:
+            with self._lock:
+                self.refresh_errors += 1
+        else:
+            self._store(key, value)
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def get_or_load(self, key: Hashable, loader: Callable[[], Any]) -> Any:
+        """
+        Return the value for key, loading or refreshing it as needed.
+
+        Args:
+            key:    Hashable cache key.
+            loader: Zero-argument callable fetching the fresh value.
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                stored_at, value = entry
+                age = now - stored_at
+                soft, hard = (
+                    (self.negative_ttl, self.negative_ttl)
+                    if value is None
+                    else (self.soft_ttl, self.hard_ttl)
+                )
+                if age < soft:
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                if age < hard:
+                    self._data.move_to_end(key)
+                    self.stale_hits += 1
+                    if key not in self._refreshing:
+                        self._refreshing.add(key)
+                        self.refreshes += 1
+                        self._executor.submit(self._refresh, key, loader)
+                    return value
+            self.misses += 1
+
+        value = loader()
+        self._store(key, value)
+        return value
+
+    def peek(self, key: Hashable) -> Any:
+        """
+        Return the cached value regardless of age, or None. No counters.
+        Useful as a last resort when the loader is failing.
+        """
+        with self._lock:
+            entry = self._data.get(key)
+            return entry[1] if entry is not None else None
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Return size and hit/stale/miss counters as a plain dict."""
+        with self._lock:
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "stale_hits": self.stale_hits,
+                "misses": self.misses,
+                "refreshes": self.refreshes,
+                "refresh_errors": self.refresh_errors,
+                "evictions": self.evictions,
+            }
@@ -16,7 +16,108 @@ class Settings(BaseSettings):
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
     
     # Google Maps
-    GOOGLE_MAPS_API_KEY: str
+    # Proveedor: "google" o "fake" (lugares sintéticos, sin gastar cuota)
+    MAPS_PROVIDER: str = "google"
+    GOOGLE_MAPS_API_KEY: str = ""
+    MAPS_TIMEOUT_SECONDS: float = 5.0
+    MAPS_RETRY_TIMEOUT_SECONDS: int = 10
+
+    # Protección frente a Google lento o sin cuota
+    MAPS_MAX_CONCURRENT_CALLS: int = 16
+    MAPS_BULKHEAD_TIMEOUT_SECONDS: float = 0.5
+    MAPS_BREAKER_RESET_SECONDS: float = 30.0
+    MAPS_NEARBY_FAILURE_THRESHOLD: int = 5
+    MAPS_DETAILS_FAILURE_THRESHOLD: int = 5
+    MAPS_GEOCODE_FAILURE_THRESHOLD: int = 3
+
+    # Proveedor fake (pruebas de carga y desarrollo sin clave)
+    FAKE_MAPS_LATENCY_MS: float = 0.0
+    FAKE_MAPS_JITTER_MS: float = 0.0
+    FAKE_MAPS_ERROR_RATE: float = 0.0
+    FAKE_MAPS_SEED: int = 0
+
+    # Cache de lugares cercanos
+    NEARBY_CACHE_TTL_SECONDS: int = 300
+    NEARBY_CACHE_MAX_ENTRIES: int = 4096
+
+    # Cache de detalles de lugares (stale-while-revalidate)
+    PLACE_DETAILS_SOFT_TTL_SECONDS: int = 3600
+    PLACE_DETAILS_HARD_TTL_SECONDS: int = 86400
+    PLACE_DETAILS_NEGATIVE_TTL_SECONDS: int = 300
+    PLACE_DETAILS_CACHE_MAX_ENTRIES: int = 4096
+
+    # Cache de geocodificación (memoria + BD)
+    GEOCODE_CACHE_MAX_ENTRIES: int = 4096
+    GEOCODE_HOT_TTL_SECONDS: int = 86400
+    GEOCODE_NEGATIVE_TTL_SECONDS: int = 300
+    GEOCODE_DB_MAX_AGE_DAYS: int = 180
+
+    # Catálogo local de lugares
+    CATALOG_FRESH_SECONDS: int = 86400
+    CATALOG_MAX_RESULTS: int = 60
+    # Las escrituras al catálogo se hacen en segundo plano, por lotes cada
+    # N segundos o M lugares, en una sola transacción
+    CATALOG_WRITE_INTERVAL_SECONDS: float = 1.0
+    CATALOG_WRITE_BATCH_ROWS: int = 500
+    CATALOG_WRITE_MAX_BUFFER: int = 20000
+
+    # Motor de recomendaciones
+    RECOMMENDATIONS_MAX_WORKERS: int = 16
+    RECOMMENDATIONS_DEADLINE_SECONDS: float = 3.0
+    RECOMMENDATIONS_CACHE_TTL_SECONDS: int = 600
+    RECOMMENDATIONS_CACHE_MAX_ENTRIES: int = 10000
+
+    # Precálculo de recomendaciones en segundo plano (desactivado por
+    # defecto: cada worker que lo active hace llamadas a Google propias,
+    # hasta PREWARM_UPSTREAM_BUDGET por ciclo)
+    PREWARM_ENABLED: bool = False
+    PREWARM_INTERVAL_SECONDS: int = 300
+    PREWARM_CONCURRENCY: int = 4
+    PREWARM_UPSTREAM_BUDGET: int = 200
+    PREWARM_ACTIVE_WITHIN_HOURS: int = 24
+    PREWARM_MAX_USERS: int = 500
+    PREWARM_RADIUS: int = 1500
+    PREWARM_LIMIT: int = 20
+
+    # Envío por WebSocket: cola acotada y tarea escritora por conexión
+    WS_SEND_QUEUE_SIZE: int = 256
+    WS_SEND_TIMEOUT_SECONDS: float = 5.0
+    WS_QUEUE_FULL_GRACE_SECONDS: float = 2.0
+    # Chat: los mensajes de todas las salas se guardan juntos en una
+    # transacción cada CHAT_COMMIT_WINDOW_MS (o al llegar a CHAT_COMMIT_MAX_BATCH)
+    CHAT_COMMIT_WINDOW_MS: float = 5.0
+    CHAT_COMMIT_MAX_BATCH: int = 200
+
+    # Ping a los sockets callados y cierre si no responden
+    WS_PING_INTERVAL_SECONDS: float = 25.0
+    WS_PONG_TIMEOUT_SECONDS: float = 10.0
+    WS_HEARTBEAT_TICK_SECONDS: float = 1.0
+
+    # Backplane pub/sub entre workers: vacío = un solo proceso (loopback);
+    # "redis://host:6379/0" para varios workers o nodos
+    BACKPLANE_URL: str = ""
+    BACKPLANE_CHANNEL_PREFIX: str = "mapapp:"
+
+    # Presencia en tiempo real
+    PRESENCE_GRID_CELL_METERS: int = 500
+    PRESENCE_NEARBY_MAX_RADIUS: int = 50000
+    # Las posiciones se agrupan y se envían a los amigos una vez por tick
+    PRESENCE_TICK_SECONDS: float = 0.5
+    # Movimientos menores que esto (ruido del GPS) no se difunden
+    PRESENCE_MIN_MOVE_METERS: float = 10.0
+    # Reanudar sesión (?since=<seq>): eventos recientes guardados por
+    # usuario y cuánto se conserva la sesión tras desconectarse
+    PRESENCE_RESUME_BUFFER: int = 256
+    PRESENCE_RESUME_GRACE_SECONDS: float = 120.0
+
+    # Guardado diferido de las posiciones de presencia en locations
+    # (desactivado por defecto): por lotes cada N segundos o M filas, y sólo
+    # si el usuario se ha movido al menos PRESENCE_PERSIST_MIN_MOVE_METERS
+    PRESENCE_PERSIST_ENABLED: bool = False
+    PRESENCE_PERSIST_INTERVAL_SECONDS: float = 15.0
+    PRESENCE_PERSIST_BATCH_ROWS: int = 500
+    PRESENCE_PERSIST_MIN_MOVE_METERS: float = 50.0
+    PRESENCE_PERSIST_MAX_BUFFER: int = 20000
     
     class Config:
         env_file = ".env"
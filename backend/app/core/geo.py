@@ -0,0 +1,185 @@
+import math
+import re
+import unicodedata
+from typing import Tuple
+
+EARTH_RADIUS_M = 6_371_000.0
+METERS_PER_DEGREE_LAT = 111_320.0
+
+# Política de snapping para cachés por celda: la celda mide un 5% del radio de
+# búsqueda, acotada entre 25 m y 250 m. El punto más alejado de una celda está
+# a medio diagonal (~0.71 * lado) de su centro, así que el desplazamiento máximo
+# aceptado es ~3.5% del radio: 35 m en una búsqueda de 1 km, 175 m en 50 km.
+SNAP_RADIUS_FRACTION = 0.05
+SNAP_MIN_STEP_M = 25
+SNAP_MAX_STEP_M = 250
+
+
+def haversine_m(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    """Distancia en metros entre dos coordenadas."""
+    phi1 = math.radians(lat1)
+    phi2 = math.radians(lat2)
+    dphi = phi2 - phi1
+    dlmb = math.radians(lng2 - lng1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlmb / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(min(1.0, math.sqrt(a)))
+
+
+def bounding_box(lat: float, lng: float, radius_m: float) -> Tuple[float, float, float, float]:
+    """
+    Rectángulo (min_lat, max_lat, min_lng, max_lng) que contiene el círculo
+    de radio radius_m alrededor del punto, en la misma esfera que
+    haversine_m. Si el círculo toca un polo o cruza el antimeridiano, la
+    longitud no se acota: (-180, 180).
+    """
+    angular = radius_m / EARTH_RADIUS_M
+    dlat = math.degrees(angular)
+    min_lat, max_lat = lat - dlat, lat + dlat
+    if min_lat <= -90.0 or max_lat >= 90.0:
+        return max(min_lat, -90.0), min(max_lat, 90.0), -180.0, 180.0
+    # Mayor diferencia de longitud dentro del círculo
+    dlng = math.degrees(math.asin(min(1.0, math.sin(angular) / math.cos(math.radians(lat)))))
+    if lng - dlng < -180.0 or lng + dlng > 180.0:
+        return min_lat, max_lat, -180.0, 180.0
+    return min_lat, max_lat, lng - dlng, lng + dlng
+
+
+def snap_step_meters(radius: int) -> int:
+    """Lado de celda aceptable para un radio de búsqueda dado."""
+    step = int(radius * SNAP_RADIUS_FRACTION)
+    return max(SNAP_MIN_STEP_M, min(SNAP_MAX_STEP_M, step))
+
+
+def _lat_step_deg(step_m: float) -> float:
+    return step_m / METERS_PER_DEGREE_LAT
+
+
+def _lng_step_deg(step_m: float, lat: float) -> float:
+    cos_lat = max(math.cos(math.radians(lat)), 0.01)
+    return step_m / (METERS_PER_DEGREE_LAT * cos_lat)
+
+
+def snap_to_cell(lat: float, lng: float, step_m: float) -> Tuple[int, int]:
+    """
+    Devuelve los índices (fila, columna) de la celda que contiene el punto.
+
+    Las filas tienen altura constante en grados de latitud; el ancho en grados
+    de longitud se calcula con la latitud del centro de la fila para que las
+    celdas midan ~step_m en ambos ejes.
+    """
+    dlat = _lat_step_deg(step_m)
+    row = math.floor(lat / dlat)
+    center_lat = (row + 0.5) * dlat
+    col = math.floor(lng / _lng_step_deg(step_m, center_lat))
+    return row, col
+
+
+def cell_lng_step_deg(row: int, step_m: float) -> float:
+    """Ancho en grados de longitud de las celdas de una fila de snap_to_cell."""
+    center_lat = (row + 0.5) * _lat_step_deg(step_m)
+    return _lng_step_deg(step_m, center_lat)
+
+
+def cell_center(row: int, col: int, step_m: float) -> Tuple[float, float]:
+    """Coordenadas del centro de una celda devuelta por snap_to_cell."""
+    dlat = _lat_step_deg(step_m)
+    center_lat = (row + 0.5) * dlat
+    center_lng = (col + 0.5) * _lng_step_deg(step_m, center_lat)
+    return center_lat, center_lng
+
+
+# ---------- geohash ----------
+
+GEOHASH_ALPHABET = "0123456789bcdefghjkmnpqrstuvwxyz"
+GEOHASH_PRECISION = 9  # ~5 m x 5 m, suficiente para indexar lugares
+
+
+def geohash_encode(lat: float, lng: float, precision: int = GEOHASH_PRECISION) -> str:
+    """Codifica una coordenada como geohash de la precisión indicada."""
+    lat_lo, lat_hi = -90.0, 90.0
+    lng_lo, lng_hi = -180.0, 180.0
+    chars = []
+    bits = 0
+    value = 0
+    even = True  # los bits pares codifican longitud
+    while len(chars) < precision:
+        if even:
+            mid = (lng_lo + lng_hi) / 2
+            if lng >= mid:
+                value = (value << 1) | 1
+                lng_lo = mid
+            else:
+                value <<= 1
+                lng_hi = mid
+        else:
+            mid = (lat_lo + lat_hi) / 2
+            if lat >= mid:
+                value = (value << 1) | 1
+                lat_lo = mid
+            else:
+                value <<= 1
+                lat_hi = mid
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(GEOHASH_ALPHABET[value])
+            bits = 0
+            value = 0
+    return "".join(chars)
+
+
+def geohash_cell_size_deg(precision: int) -> Tuple[float, float]:
+    """Alto y ancho en grados (lat, lng) de una celda geohash."""
+    total_bits = precision * 5
+    lng_bits = (total_bits + 1) // 2
+    lat_bits = total_bits // 2
+    return 180.0 / (2 ** lat_bits), 360.0 / (2 ** lng_bits)
+
+
+def geohash_precision_for_radius(lat: float, radius_m: float) -> int:
+    """
+    Mayor precisión cuya celda mide al menos radius_m en ambos ejes a esta
+    latitud: con ella, la celda del centro y sus 8 vecinas cubren el círculo.
+    """
+    cos_lat = max(math.cos(math.radians(lat)), 0.01)
+    for precision in range(GEOHASH_PRECISION, 0, -1):
+        dlat, dlng = geohash_cell_size_deg(precision)
+        height_m = dlat * METERS_PER_DEGREE_LAT
+        width_m = dlng * METERS_PER_DEGREE_LAT * cos_lat
+        if min(height_m, width_m) >= radius_m:
+            return precision
+    return 1
+
+
+def geohash_cover(lat: float, lng: float, radius_m: float) -> list[str]:
+    """
+    Prefijos geohash (celda central + vecinas) que cubren el círculo de
+    radio radius_m alrededor del punto. Sin duplicados.
+    """
+    precision = geohash_precision_for_radius(lat, radius_m)
+    dlat, dlng = geohash_cell_size_deg(precision)
+    prefixes: list[str] = []
+    for i in (-1, 0, 1):
+        for j in (-1, 0, 1):
+            nlat = max(-89.999999, min(89.999999, lat + i * dlat))
+            nlng = (lng + j * dlng + 180.0) % 360.0 - 180.0
+            prefix = geohash_encode(nlat, nlng, precision)
+            if prefix not in prefixes:
+                prefixes.append(prefix)
+    return prefixes
+
+
+# ---------- direcciones ----------
+
+_NON_ALNUM = re.compile(r"[\W_]+")
+
+
+def normalize_address(address: str) -> str:
+    """
+    Forma canónica de una dirección para usarla como clave de caché:
+    sin acentos, en minúsculas, con la puntuación convertida en espacios
+    y los espacios colapsados. "Gran Vía, Madrid" -> "gran via madrid".
+    """
+    decomposed = unicodedata.normalize("NFKD", address)
+    without_accents = "".join(c for c in decomposed if not unicodedata.combining(c))
+    return " ".join(_NON_ALNUM.sub(" ", without_accents.lower()).split())
@@ -1,20 +1,54 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from app.api import auth, users, maps
-from app.api import preferences, locations, recommendations, messages, friendships
+from app.api import preferences, locations, recommendations, messages, friendships, presence
 from app.websocket.chat import router as ws_router
 from app.websocket.presence import router as presence_router
+from app.websocket.backplane import backplane
+from app.websocket.heartbeat import heartbeat
+from app.websocket.presence_manager import presence_manager
 from sqlalchemy import text
 from app.core import database
 from slowapi import _rate_limit_exceeded_handler
 from slowapi.errors import RateLimitExceeded
 from app.core.limiter import limiter
+from app.services.catalog_writer import catalog_writer
+from app.services.message_writer import message_writer
+from app.services.position_recorder import position_recorder
+from app.services.recommendation_prewarmer import recommendation_prewarmer
 
 import os
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Arranca y para las tareas en segundo plano de la app."""
+    catalog_writer.start()
+    recommendation_prewarmer.start()
+    await backplane.start()
+    presence_manager.start()
+    position_recorder.start()
+    heartbeat.start()
+    message_writer.start()
+    yield
+    await heartbeat.stop()
+    # Guarda los mensajes de chat ya recibidos antes de salir
+    await message_writer.stop()
+    await presence_manager.stop()
+    # Guarda las posiciones que queden en el buffer
+    await position_recorder.stop()
+    await backplane.stop()
+    await recommendation_prewarmer.stop()
+    # Guarda los lugares pendientes del catálogo
+    await catalog_writer.stop()
+
+
 app = FastAPI(
     title="Map Recommendations API",
     description="API para recomendaciones basadas en ubicacion",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan,
 )
 
 app.state.limiter = limiter
@@ -33,6 +67,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[maps.DEGRADED_HEADER],
 )
 
 
@@ -46,6 +81,7 @@ app.include_router(messages.router, prefix="/api/v1")
 app.include_router(ws_router)
 app.include_router(presence_router)
 app.include_router(friendships.router, prefix="/api/v1")
+app.include_router(presence.router, prefix="/api/v1")
 
 
 
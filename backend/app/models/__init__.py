@@ -5,5 +5,9 @@ from app.models.location import Location
 from app.models.friendship import Friendship
 from app.models.friend_invite import FriendInvite
 from app.models.password_reset import PasswordReset
+from app.models.place import Place, PlaceSearch
+from app.models.geocode import GeocodeCacheEntry
+from app.models.conversation_read import ConversationRead
+from app.models.conversation import Conversation
 
-__all__ = ["User", "Preference", "Message", "Location", "Friendship", "FriendInvite", "PasswordReset"]
+__all__ = ["User", "Preference", "Message", "Location", "Friendship", "FriendInvite", "PasswordReset", "Place", "PlaceSearch", "GeocodeCacheEntry", "ConversationRead", "Conversation"]
@@ -0,0 +1,30 @@
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Index, UniqueConstraint
+from app.core.database import Base
+
+# Caracteres del último mensaje que se guardan como vista previa
+PREVIEW_LENGTH = 120
+
+
+class Conversation(Base):
+    """
+    Bandeja de entrada materializada: una fila por conversación y
+    participante, con el último mensaje y cuántos no ha leído. Se mantiene
+    en la misma transacción que inserta los mensajes.
+    """
+    __tablename__ = "conversations"
+    __table_args__ = (
+        UniqueConstraint("user_id", "other_user_id", name="uq_conversation_participant"),
+        # Bandeja de un usuario de la más reciente a la más antigua
+        Index("ix_conversations_inbox", "user_id", "last_message_at", "last_message_id"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    other_user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    conversation_key = Column(String, nullable=False)
+    # El último mensaje es el mayor por (timestamp, id), igual que en el historial
+    last_message_id = Column(Integer, nullable=False)
+    last_sender_id = Column(Integer, nullable=False)
+    last_message_preview = Column(String, nullable=False)
+    last_message_at = Column(DateTime, nullable=False)
+    unread_count = Column(Integer, default=0, nullable=False)
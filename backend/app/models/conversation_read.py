@@ -0,0 +1,20 @@
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, UniqueConstraint
+from datetime import datetime
+from app.core.database import Base
+
+
+class ConversationRead(Base):
+    """Hasta qué mensaje ha leído un usuario una conversación (marca de lectura)."""
+    __tablename__ = "conversation_reads"
+    __table_args__ = (
+        UniqueConstraint("user_id", "conversation_key", name="uq_conversation_read"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    conversation_key = Column(String, nullable=False)
+    # Leídos todos los mensajes recibidos hasta este, en orden (timestamp, id)
+    # como el historial: (timestamp, id) <= (last_read_at, last_read_message_id)
+    last_read_message_id = Column(Integer, nullable=False)
+    last_read_at = Column(DateTime, nullable=False)
+    updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now, nullable=False)
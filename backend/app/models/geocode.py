@@ -0,0 +1,16 @@
+from sqlalchemy import Column, Integer, Float, String, DateTime
+from datetime import datetime
+from app.core.database import Base
+
+
+class GeocodeCacheEntry(Base):
+    """Resultado de geocodificación persistido, indexado por dirección normalizada."""
+    __tablename__ = "geocode_cache"
+
+    id = Column(Integer, primary_key=True, index=True)
+    query = Column(String, nullable=False, unique=True, index=True)
+    formatted_address = Column(String, nullable=True)
+    latitude = Column(Float, nullable=False)
+    longitude = Column(Float, nullable=False)
+    place_id = Column(String, nullable=True)
+    created_at = Column(DateTime, default=datetime.now, nullable=False)
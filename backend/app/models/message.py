@@ -1,16 +1,31 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Boolean
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Boolean, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from app.core.database import Base
 
+def conversation_key(user_a_id: int, user_b_id: int) -> str:
+    """Clave de la conversación entre dos usuarios: '{min_id}_{max_id}'."""
+    lo, hi = sorted((user_a_id, user_b_id))
+    return f"{lo}_{hi}"
+
+
 class Message(Base):
     __tablename__ = "messages"
+    __table_args__ = (
+        # Historial de una conversación en orden, paginado por (timestamp, id)
+        Index("ix_messages_conversation", "conversation_key", "timestamp", "id"),
+        # Mensajes recibidos después de la marca de lectura (contador de no leídos)
+        Index("ix_messages_unread", "conversation_key", "receiver_id", "timestamp", "id"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     sender_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     receiver_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    conversation_key = Column(String, nullable=False)
     content = Column(String, nullable=False)
     timestamp = Column(DateTime, default=datetime.now)
+    # Heredado: el estado de lectura es la marca de lectura (conversation_reads);
+    # MessageService rellena is_read a partir de ella y la columna ya no se escribe
     is_read = Column(Boolean, default=False)
     
     # Relaciones
@@ -0,0 +1,49 @@
+from sqlalchemy import (
+    Column, Integer, Float, String, Boolean, DateTime, JSON, UniqueConstraint
+)
+from datetime import datetime
+from app.core.database import Base
+
+
+class Place(Base):
+    """Catálogo local de lugares vistos en Google Maps."""
+    __tablename__ = "places"
+
+    id = Column(Integer, primary_key=True, index=True)
+    place_id = Column(String, nullable=False, unique=True, index=True)
+    name = Column(String, nullable=True)
+    address = Column(String, nullable=True)
+    types = Column(JSON, nullable=False, default=list)
+    rating = Column(Float, nullable=True)
+    user_ratings_total = Column(Integer, nullable=True)
+    latitude = Column(Float, nullable=False)
+    longitude = Column(Float, nullable=False)
+    # Índice espacial: rango de prefijos sobre un B-tree (Postgres y SQLite)
+    geohash = Column(String(12), nullable=False, index=True)
+    open_now = Column(Boolean, nullable=True)
+    photos = Column(JSON, nullable=False, default=list)
+    fetched_at = Column(DateTime, default=datetime.now, nullable=False)
+
+    # Detalles completos (get_place_details), opcionales
+    details = Column(JSON, nullable=True)
+    details_fetched_at = Column(DateTime, nullable=True)
+
+
+class PlaceSearch(Base):
+    """Búsquedas nearby ya resueltas contra Google: qué zonas cubre el catálogo."""
+    __tablename__ = "place_searches"
+    __table_args__ = (
+        UniqueConstraint(
+            "geohash", "radius", "place_type", "keyword", name="uq_place_search"
+        ),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    geohash = Column(String(12), nullable=False, index=True)
+    latitude = Column(Float, nullable=False)
+    longitude = Column(Float, nullable=False)
+    radius = Column(Integer, nullable=False)
+    place_type = Column(String, nullable=False, default="")
+    keyword = Column(String, nullable=False, default="")
+    result_count = Column(Integer, nullable=False, default=0)
+    searched_at = Column(DateTime, default=datetime.now, nullable=False)
@@ -18,3 +18,29 @@ class MessageResponse(MessageBase):
         from_attributes = True
         
         
+class ReadWatermarkUpdate(BaseModel):
+    # Último mensaje leído de la conversación (se marcan todos hasta él)
+    message_id: int
+
+
+class ReadWatermarkResponse(BaseModel):
+    user_id: int
+    last_read_message_id: int | None
+    unread_count: int
+
+
+class UnreadCount(BaseModel):
+    user_id: int
+    unread_count: int
+
+
+class InboxEntry(BaseModel):
+    other_user_id: int
+    last_message_id: int
+    last_sender_id: int
+    last_message_preview: str
+    last_message_at: datetime
+    unread_count: int
+
+    class Config:
+        from_attributes = True
@@ -0,0 +1,223 @@
+import asyncio
+import logging
+import threading
+import time
+from typing import Any, Dict, FrozenSet, List, Optional, Tuple
+
+from fastapi.concurrency import run_in_threadpool
+
+from app.core.config import settings
+from app.core.database import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+# (geohash, radius, place_type, keyword): unique key of place_searches
+SearchKey = Tuple[str, int, str, str]
+# A place_searches row and the place_ids of the places it returned
+PendingSearch = Tuple[Dict[str, Any], FrozenSet[str]]
+
+
+class CatalogWriter:
+    """
+    Write-behind persistence of Maps results into the place catalog
+    (`places` and `place_searches`).
+
+    Request threads call submit() with the rows of a nearby search, and
+    submit_details() with the details of a place; that only merges them
+    into an in-memory buffer keyed like the tables, so a place seen by
+    several searches is written once. A background task writes the
+    buffer in one transaction every CATALOG_WRITE_INTERVAL_SECONDS, or as
+    soon as it holds CATALOG_WRITE_BATCH_ROWS places, and stop() writes what
+    is left on shutdown.
+
+    A search is only recorded together with its places, so the catalog
+    never claims coverage of an area whose places are not stored. Until the
+    batch is written, the area is served by MapsService's nearby cache. If
+    the database is unavailable the rows stay buffered, up to
+    CATALOG_WRITE_MAX_BUFFER places: the oldest are dropped beyond that,
+    together with every buffered search that returned one of them.
+    When the task is not running (scripts, tests) submit() writes right away.
+    """
+
+    def __init__(self) -> None:
+        # Producers are request threads, not the event loop; guards the
+        # buffers and the counters
+        self._lock = threading.Lock()
+        self._places: Dict[str, Dict[str, Any]] = {}
+        self._details: Dict[str, Dict[str, Any]] = {}
+        self._searches: Dict[SearchKey, PendingSearch] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wake = asyncio.Event()
+        self.counters = {
+            "submitted": 0,
+            "written": 0,
+            "details_written": 0,
+            "searches_written": 0,
+            "dropped": 0,
+            "dropped_searches": 0,
+            "flushes": 0,
+            "errors": 0,
+        }
+
+    def start(self) -> None:
+        if self._task is None:
+            self._loop = asyncio.get_running_loop()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop the task and write whatever is still buffered."""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        await self.flush()
+
+    def submit(self, places: List[Dict[str, Any]], search: Optional[Dict[str, Any]] = None) -> None:
+        """
+        Queue place rows (PlaceService.nearby_rows) and, optionally, the
+        place_searches row (PlaceService.search_row) of the search that
+        returned them. Safe to call from any thread.
+        """
+        searches = []
+        if search is not None:
+            searches.append((search, frozenset(place["place_id"] for place in places)))
+        self._enqueue(places, [], searches)
+
+    def submit_details(self, details: Dict[str, Any]) -> None:
+        """Queue the row of a place's details (PlaceService.details_row)."""
+        self._enqueue([], [details], [])
+
+    def _enqueue(
+        self,
+        places: List[Dict[str, Any]],
+        details: List[Dict[str, Any]],
+        searches: List[PendingSearch],
+    ) -> None:
+        if self._task is None:
+            self._count(submitted=len(places) + len(details))
+            self._write(places, details, searches)
+            return
+        with self._lock:
+            self.counters["submitted"] += len(places) + len(details)
+            self._merge(places, details, searches)
+            full = len(self._places) + len(self._details) >= settings.CATALOG_WRITE_BATCH_ROWS
+        if full:
+            self._loop.call_soon_threadsafe(self._wake.set)
+
+    def _merge(
+        self,
+        places: List[Dict[str, Any]],
+        details: List[Dict[str, Any]],
+        searches: List[PendingSearch],
+    ) -> None:
+        """Add rows to the buffer, the newest winning. Call with the lock held."""
+        for buffer, rows in ((self._places, places), (self._details, details)):
+            for row in rows:
+                buffer.pop(row["place_id"], None)
+                buffer[row["place_id"]] = row
+        for row, place_ids in searches:
+            key = (row["geohash"], row["radius"], row["place_type"], row["keyword"])
+            self._searches.pop(key, None)
+            self._searches[key] = (row, place_ids)
+        evicted = set()
+        for buffer in (self._places, self._details):
+            while len(buffer) > settings.CATALOG_WRITE_MAX_BUFFER:
+                place_id = next(iter(buffer))
+                del buffer[place_id]
+                if buffer is self._places:
+                    evicted.add(place_id)
+                self.counters["dropped"] += 1
+        if evicted:
+            # Without all its places a search must not mark its area as covered
+            for key in [key for key, (_, ids) in self._searches.items() if not ids.isdisjoint(evicted)]:
+                del self._searches[key]
+                self.counters["dropped_searches"] += 1
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), settings.CATALOG_WRITE_INTERVAL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            await self.flush()
+
+    async def flush(self) -> int:
+        """Write everything buffered in one transaction. Returns the rows written."""
+        with self._lock:
+            places, self._places = list(self._places.values()), {}
+            details, self._details = list(self._details.values()), {}
+            searches, self._searches = list(self._searches.values()), {}
+        if not places and not details and not searches:
+            return 0
+        started = time.monotonic()
+        try:
+            await run_in_threadpool(self._write, places, details, searches)
+        except Exception:
+            self._count(errors=1)
+            logger.exception(f"Error guardando {len(places)} lugares en el catálogo")
+            # Back into the buffer, behind anything newer; retried on the next flush
+            with self._lock:
+                newer = (self._places, self._details, self._searches)
+                self._places, self._details, self._searches = {}, {}, {}
+                self._merge(places, details, searches)
+                self._merge(*(list(buffer.values()) for buffer in newer))
+            return 0
+        self._count(flushes=1)
+        logger.debug(f"Saved {len(places) + len(details)} catalog places in {time.monotonic() - started:.3f}s")
+        return len(places) + len(details)
+
+    def _write(
+        self,
+        places: List[Dict[str, Any]],
+        details: List[Dict[str, Any]],
+        searches: List[PendingSearch],
+    ) -> None:
+        # Imported here: place_service submits to this module
+        from app.services.place_service import PlaceService
+
+        db = SessionLocal()
+        try:
+            batch = settings.CATALOG_WRITE_BATCH_ROWS
+            for start in range(0, len(places), batch):
+                PlaceService.upsert_place_rows(db, places[start:start + batch])
+            for start in range(0, len(details), batch):
+                PlaceService.upsert_detail_rows(db, details[start:start + batch])
+            for row, _ in searches:
+                PlaceService.record_search_row(db, row)
+            db.commit()
+        except Exception:
+            db.rollback()
+            if self._task is None:
+                # Written inline: a catalog failure must not fail the request
+                self._count(errors=1)
+                logger.exception("Error guardando lugares en el catálogo")
+                return
+            raise
+        finally:
+            db.close()
+        self._count(written=len(places), details_written=len(details), searches_written=len(searches))
+
+    def _count(self, **deltas: int) -> None:
+        # Runs on request threads, the event loop and the threadpool
+        with self._lock:
+            for name, delta in deltas.items():
+                self.counters[name] += delta
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "buffered": len(self._places),
+                "buffered_details": len(self._details),
+                "buffered_searches": len(self._searches),
+                **self.counters,
+            }
+
+
+# Singleton
+catalog_writer = CatalogWriter()
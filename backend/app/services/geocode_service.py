@@ -0,0 +1,105 @@
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.core.geo import normalize_address
+from app.models.geocode import GeocodeCacheEntry
+from app.services.maps_services import maps_service
+
+logger = logging.getLogger(__name__)
+
+# Marca de "Google no encontró la dirección" en la caché en memoria
+_NOT_FOUND = object()
+
+# Nivel caliente: en memoria, por proceso
+_hot_cache = TTLCache(
+    maxsize=settings.GEOCODE_CACHE_MAX_ENTRIES,
+    ttl=settings.GEOCODE_HOT_TTL_SECONDS,
+)
+
+
+def _entry_to_dict(entry: GeocodeCacheEntry) -> Dict[str, Any]:
+    return {
+        "formatted_address": entry.formatted_address,
+        "location": {"lat": entry.latitude, "lng": entry.longitude},
+        "place_id": entry.place_id,
+    }
+
+
+class GeocodeService:
+    @staticmethod
+    def geocode(db: Session, address: str) -> Optional[Dict[str, Any]]:
+        """
+        Geocodifica una dirección con caché en dos niveles.
+
+        La clave es la dirección normalizada (sin acentos, mayúsculas,
+        puntuación ni espacios sobrantes), así que "Gran Via, Madrid" y
+        "gran via madrid " comparten entrada. Orden de consulta:
+        1. Caché en memoria del proceso (incluye "no encontrado" reciente).
+        2. Tabla geocode_cache, que sobrevive a reinicios y despliegues.
+        3. Google; el resultado se guarda en ambos niveles. Si Google
+           falla, se devuelve la entrada caducada de la tabla, si la hay,
+           marcada con 'degraded': True.
+
+        Returns:
+            Coordenadas y dirección formateada, o None si no existe.
+
+        Raises:
+            El error de Google (CircuitOpenError si el circuito está
+            abierto) cuando falla y no hay entrada guardada: que Google no
+            responda no significa que la dirección no exista.
+        """
+        query = normalize_address(address)
+        if not query:
+            return None
+
+        cached = _hot_cache.get(query)
+        if cached is not None:
+            return None if cached is _NOT_FOUND else cached
+
+        entry = db.query(GeocodeCacheEntry).filter(GeocodeCacheEntry.query == query).first()
+        max_age = timedelta(days=settings.GEOCODE_DB_MAX_AGE_DAYS)
+        if entry is not None and entry.created_at >= datetime.now() - max_age:
+            result = _entry_to_dict(entry)
+            _hot_cache.set(query, result)
+            return result
+
+        try:
+            result = maps_service.fetch_geocode(address)
+        except Exception as e:
+            logger.error(f"Error: {e}")
+            if entry is None:
+                raise
+            # Mejor una entrada caducada que nada
+            return {**_entry_to_dict(entry), "degraded": True}
+
+        if result is None:
+            _hot_cache.set(query, _NOT_FOUND, ttl=settings.GEOCODE_NEGATIVE_TTL_SECONDS)
+            return None
+
+        try:
+            if entry is None:
+                entry = GeocodeCacheEntry(query=query)
+                db.add(entry)
+            entry.formatted_address = result["formatted_address"]
+            entry.latitude = result["location"]["lat"]
+            entry.longitude = result["location"]["lng"]
+            entry.place_id = result["place_id"]
+            entry.created_at = datetime.now()
+            db.commit()
+        except SQLAlchemyError:
+            # Otra petición guardó la misma dirección a la vez; no es un error
+            db.rollback()
+
+        _hot_cache.set(query, result)
+        return result
+
+    @staticmethod
+    def stats() -> Dict[str, Any]:
+        """Contadores del nivel en memoria."""
+        return _hot_cache.stats()
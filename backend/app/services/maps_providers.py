@@ -0,0 +1,237 @@
+import math
+import random
+import threading
+import time
+import uuid
+from typing import Any, Dict, List, Optional, Protocol, Tuple
+
+import googlemaps
+
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.core.geo import METERS_PER_DEGREE_LAT, normalize_address
+
+
+class MapsProvider(Protocol):
+    """
+    Interfaz que MapsService espera de su cliente: el subconjunto de
+    googlemaps.Client que usa, con las mismas respuestas en crudo y las
+    mismas excepciones (googlemaps.exceptions).
+    """
+
+    def places_nearby(self, **kwargs) -> Dict[str, Any]: ...
+
+    def place(self, place_id: str) -> Dict[str, Any]: ...
+
+    def geocode(self, address: str) -> List[Dict[str, Any]]: ...
+
+
+# ---------- proveedor fake ----------
+
+_FAKE_TYPES = (
+    "restaurant", "cafe", "bar", "museum", "park",
+    "store", "gym", "bakery", "library", "night_club",
+)
+_FAKE_NAMES = (
+    "Central", "del Sol", "La Plaza", "Norte", "El Rincón",
+    "Mayor", "Azul", "San Marcos", "Nuevo", "del Parque",
+)
+_FAKE_PAGE_SIZE = 20
+_FAKE_MAX_RESULTS = 60
+_FAKE_PLACE_PREFIX = "fake_"
+
+
+class FakeMapsProvider:
+    """
+    Sustituto determinista de googlemaps.Client para desarrollo y pruebas
+    de carga.
+
+    - places_nearby genera hasta 60 lugares repartidos en el círculo
+      pedido, en páginas de 20 con next_page_token. La misma búsqueda
+      devuelve siempre los mismos lugares.
+    - Los atributos de un lugar (nombre, rating, horario...) dependen solo
+      de su place_id, así que place() es coherente con places_nearby.
+    - geocode devuelve una coordenada fija por dirección normalizada.
+
+    latency_ms/jitter_ms añaden una espera gaussiana por llamada y
+    error_rate hace fallar esa fracción de llamadas con
+    googlemaps.exceptions.Timeout. Se pueden cambiar en caliente.
+    """
+
+    def __init__(
+        self,
+        latency_ms: float = 0.0,
+        jitter_ms: float = 0.0,
+        error_rate: float = 0.0,
+        seed: int = 0,
+    ) -> None:
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.seed = seed
+        self.calls = 0
+        # Aleatoriedad de latencia y errores; los datos no dependen de ella
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        # next_page_token -> (búsqueda, página)
+        self._page_tokens = TTLCache(maxsize=10000, ttl=120)
+
+    def _simulate(self) -> None:
+        with self._lock:
+            self.calls += 1
+            delay = self.latency_ms
+            if self.jitter_ms:
+                delay = max(0.0, self._rng.gauss(self.latency_ms, self.jitter_ms))
+            fail = self._rng.random() < self.error_rate
+        if delay:
+            time.sleep(delay / 1000)
+        if fail:
+            raise googlemaps.exceptions.Timeout()
+
+    # -------- places_nearby --------
+
+    def places_nearby(
+        self,
+        location: Optional[Tuple[float, float]] = None,
+        radius: Optional[int] = None,
+        keyword: Optional[str] = None,
+        type: Optional[str] = None,
+        page_token: Optional[str] = None,
+        **kwargs,
+    ) -> Dict[str, Any]:
+        self._simulate()
+        if page_token:
+            entry = self._page_tokens.get(page_token)
+            if entry is None:
+                raise googlemaps.exceptions.ApiError("INVALID_REQUEST")
+            query, page = entry
+        else:
+            if location is None or radius is None:
+                raise googlemaps.exceptions.ApiError("INVALID_REQUEST")
+            query = (round(location[0], 6), round(location[1], 6), int(radius), type or "", keyword or "")
+            page = 1
+
+        results = self._synthesize_places(*query)
+        start = (page - 1) * _FAKE_PAGE_SIZE
+        response: Dict[str, Any] = {
+            "status": "OK" if results else "ZERO_RESULTS",
+            "results": results[start:start + _FAKE_PAGE_SIZE],
+        }
+        if start + _FAKE_PAGE_SIZE < len(results):
+            token = uuid.uuid4().hex
+            self._page_tokens.set(token, (query, page + 1))
+            response["next_page_token"] = token
+        return response
+
+    def _synthesize_places(
+        self,
+        lat: float,
+        lng: float,
+        radius: int,
+        place_type: str,
+        keyword: str,
+    ) -> List[Dict[str, Any]]:
+        rng = random.Random(f"{self.seed}:{lat}:{lng}:{radius}:{place_type}:{keyword}")
+        count = rng.randint(_FAKE_PAGE_SIZE // 2, _FAKE_MAX_RESULTS)
+        cos_lat = max(math.cos(math.radians(lat)), 0.01)
+        results = []
+        for _ in range(count):
+            # Uniforme en el área del círculo
+            distance = radius * math.sqrt(rng.random())
+            bearing = rng.uniform(0, 2 * math.pi)
+            place_lat = lat + distance * math.cos(bearing) / METERS_PER_DEGREE_LAT
+            place_lng = lng + distance * math.sin(bearing) / (METERS_PER_DEGREE_LAT * cos_lat)
+            kind = place_type or rng.choice(_FAKE_TYPES)
+            place_id = f"{_FAKE_PLACE_PREFIX}{place_lat:.6f}_{place_lng:.6f}_{kind}"
+            results.append(self._place_result(place_id, place_lat, place_lng, kind))
+        return results
+
+    def _place_result(self, place_id: str, lat: float, lng: float, kind: str) -> Dict[str, Any]:
+        """Lugar en formato places_nearby; los atributos dependen del place_id."""
+        rng = random.Random(f"{self.seed}:{place_id}")
+        return {
+            "place_id": place_id,
+            "name": f"{kind.replace('_', ' ').title()} {rng.choice(_FAKE_NAMES)}",
+            "vicinity": f"Calle Falsa {rng.randint(1, 300)}",
+            "types": [kind, "point_of_interest", "establishment"],
+            "rating": round(rng.uniform(2.5, 5.0), 1),
+            "user_ratings_total": min(int(rng.paretovariate(1.2) * 10), 20000),
+            "geometry": {"location": {"lat": lat, "lng": lng}},
+            "opening_hours": {"open_now": rng.random() < 0.7},
+            "photos": [{"photo_reference": f"{place_id}_photo{i}"} for i in range(rng.randint(0, 3))],
+            "price_level": rng.randint(1, 4),
+        }
+
+    # -------- place --------
+
+    def place(self, place_id: str, **kwargs) -> Dict[str, Any]:
+        self._simulate()
+        parts = place_id[len(_FAKE_PLACE_PREFIX):].split("_", 2)
+        if not place_id.startswith(_FAKE_PLACE_PREFIX) or len(parts) != 3:
+            raise googlemaps.exceptions.ApiError("NOT_FOUND")
+        try:
+            lat, lng = float(parts[0]), float(parts[1])
+        except ValueError:
+            raise googlemaps.exceptions.ApiError("INVALID_REQUEST")
+
+        result = self._place_result(place_id, lat, lng, parts[2])
+        rng = random.Random(f"{self.seed}:{place_id}:details")
+        result.update({
+            "formatted_address": f"{result['vicinity']}, Ciudad Fake",
+            "formatted_phone_number": f"9{rng.randint(10000000, 99999999)}",
+            "website": f"https://example.com/{place_id}",
+            "opening_hours": {
+                "open_now": result["opening_hours"]["open_now"],
+                "weekday_text": [
+                    f"{day}: {rng.randint(7, 11)}:00–{rng.randint(18, 23)}:00"
+                    for day in ("Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday")
+                ],
+            },
+            "reviews": [
+                {
+                    "author_name": f"Usuario {rng.randint(1, 9999)}",
+                    "rating": rng.randint(1, 5),
+                    "text": "Reseña sintética.",
+                    "time": 1_700_000_000 + rng.randint(0, 10_000_000),
+                }
+                for _ in range(rng.randint(0, 5))
+            ],
+        })
+        return {"status": "OK", "result": result}
+
+    # -------- geocode --------
+
+    def geocode(self, address: str, **kwargs) -> List[Dict[str, Any]]:
+        self._simulate()
+        query = normalize_address(address)
+        if not query:
+            return []
+        rng = random.Random(f"{self.seed}:geocode:{query}")
+        lat = rng.uniform(-55.0, 70.0)
+        lng = rng.uniform(-180.0, 180.0)
+        return [{
+            "formatted_address": address.strip(),
+            "geometry": {"location": {"lat": lat, "lng": lng}},
+            "place_id": f"{_FAKE_PLACE_PREFIX}{lat:.6f}_{lng:.6f}_geocode",
+        }]
+
+
+def build_maps_client() -> MapsProvider:
+    """Crea el cliente de mapas configurado en MAPS_PROVIDER."""
+    provider = settings.MAPS_PROVIDER.lower()
+    if provider == "fake":
+        return FakeMapsProvider(
+            latency_ms=settings.FAKE_MAPS_LATENCY_MS,
+            jitter_ms=settings.FAKE_MAPS_JITTER_MS,
+            error_rate=settings.FAKE_MAPS_ERROR_RATE,
+            seed=settings.FAKE_MAPS_SEED,
+        )
+    if provider == "google":
+        return googlemaps.Client(
+            key=settings.GOOGLE_MAPS_API_KEY,
+            timeout=settings.MAPS_TIMEOUT_SECONDS,
+            retry_timeout=settings.MAPS_RETRY_TIMEOUT_SECONDS,
+            # Sin cuota no tiene sentido reintentar: que salte el circuito
+            retry_over_query_limit=False,
+        )
+    raise ValueError(f"MAPS_PROVIDER desconocido: {settings.MAPS_PROVIDER}")
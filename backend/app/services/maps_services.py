@@ -1,14 +1,219 @@
+import threading
+import time
 import googlemaps
-from typing import List, Dict, Optional
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Iterator, List, Dict, Optional, Tuple
+from app.core.cache import StaleWhileRevalidateCache, TTLCache
+from app.core.circuit_breaker import Bulkhead, CircuitBreaker, CircuitOpenError
 from app.core.config import settings
+from app.core.geo import cell_center, snap_step_meters, snap_to_cell
+from app.services.maps_providers import build_maps_client
 import logging
 
 logger =  logging.getLogger(__name__)
 
+# Estados de Google que significan "el lugar no existe" (cacheables)
+_NOT_FOUND_STATUSES = {"NOT_FOUND", "ZERO_RESULTS", "INVALID_REQUEST"}
+
+# Paginación de places_nearby: Google devuelve como mucho 3 páginas de 20
+_MAX_NEARBY_PAGES = 3
+_PAGE_TOKEN_DELAY_SECONDS = 2.0
+_PAGE_TOKEN_RETRIES = 3
+_PAGE_TOKEN_RETRY_SECONDS = 0.5
+# Los next_page_token caducan a los pocos minutos
+_PAGE_TOKEN_TTL_SECONDS = 120
+
+
+class UpstreamMeter:
+    """
+    Llamadas a Google de un trabajo concreto (p.ej. un ciclo del
+    precálculo), aparte del total del proceso. Ver MapsService.metered.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.calls = 0
+
+    def add(self) -> None:
+        with self._lock:
+            self.calls += 1
+
+
+# Medidor activo en el contexto actual (contextvars), o None
+_upstream_meter: ContextVar[Optional[UpstreamMeter]] = ContextVar("maps_upstream_meter", default=None)
+
 class MapsService:
     def __init__(self):
-        self.client = googlemaps.Client(key=settings.GOOGLE_MAPS_API_KEY)
+        # googlemaps.Client o el proveedor fake, según MAPS_PROVIDER
+        self.client = build_maps_client()
+        # Un circuito por operación: que geocode falle no corta nearby
+        self.breakers = {
+            "nearby": CircuitBreaker(
+                "nearby",
+                failure_threshold=settings.MAPS_NEARBY_FAILURE_THRESHOLD,
+                reset_timeout=settings.MAPS_BREAKER_RESET_SECONDS,
+            ),
+            "details": CircuitBreaker(
+                "details",
+                failure_threshold=settings.MAPS_DETAILS_FAILURE_THRESHOLD,
+                reset_timeout=settings.MAPS_BREAKER_RESET_SECONDS,
+            ),
+            "geocode": CircuitBreaker(
+                "geocode",
+                failure_threshold=settings.MAPS_GEOCODE_FAILURE_THRESHOLD,
+                reset_timeout=settings.MAPS_BREAKER_RESET_SECONDS,
+            ),
+        }
+        # Límite de llamadas simultáneas a Google, compartido por todas
+        self.bulkhead = Bulkhead(
+            max_concurrent=settings.MAPS_MAX_CONCURRENT_CALLS,
+            timeout=settings.MAPS_BULKHEAD_TIMEOUT_SECONDS,
+        )
+        self.nearby_cache = TTLCache(
+            maxsize=settings.NEARBY_CACHE_MAX_ENTRIES,
+            ttl=settings.NEARBY_CACHE_TTL_SECONDS,
+        )
+        self.details_cache = StaleWhileRevalidateCache(
+            maxsize=settings.PLACE_DETAILS_CACHE_MAX_ENTRIES,
+            soft_ttl=settings.PLACE_DETAILS_SOFT_TTL_SECONDS,
+            hard_ttl=settings.PLACE_DETAILS_HARD_TTL_SECONDS,
+            negative_ttl=settings.PLACE_DETAILS_NEGATIVE_TTL_SECONDS,
+        )
+        # Llamadas reales a Google (para presupuestos y métricas)
+        self.upstream_calls = 0
+        self._upstream_lock = threading.Lock()
+        # (cache_key, página) -> (next_page_token, instante de emisión)
+        self._page_tokens = TTLCache(
+            maxsize=settings.NEARBY_CACHE_MAX_ENTRIES,
+            ttl=_PAGE_TOKEN_TTL_SECONDS,
+        )
+
+    @staticmethod
+    def _nearby_cache_key(
+        latitude: float,
+        longitude: float,
+        radius: int,
+        place_type: Optional[str],
+        keyword: Optional[str],
+    ) -> tuple:
+        """
+        Clave de caché: celda de la rejilla (según la política de snapping de
+        app.core.geo para este radio) + radio + tipo + keyword normalizada.
+        """
+        step = snap_step_meters(radius)
+        row, col = snap_to_cell(latitude, longitude, step)
+        return (
+            row,
+            col,
+            step,
+            radius,
+            (place_type or "").lower(),
+            " ".join((keyword or "").lower().split()),
+        )
+
+    def _count_upstream_call(self) -> None:
+        with self._upstream_lock:
+            self.upstream_calls += 1
+        meter = _upstream_meter.get()
+        if meter is not None:
+            meter.add()
+
+    @staticmethod
+    @contextmanager
+    def metered(meter: UpstreamMeter) -> Iterator[UpstreamMeter]:
+        """
+        Cuenta también en `meter` las llamadas a Google hechas dentro del
+        bloque: en este hilo y en el trabajo lanzado desde él con su
+        contexto copiado (contextvars.copy_context), como las páginas de
+        las recomendaciones.
+        """
+        token = _upstream_meter.set(meter)
+        try:
+            yield meter
+        finally:
+            _upstream_meter.reset(token)
+
+    def _call(self, operation: str, method: Callable[..., Any], **kwargs) -> Any:
+        """
+        Llama a Google a través del circuito de la operación y del bulkhead.
+
+        Raises:
+            CircuitOpenError: si el circuito está abierto o no hay hueco en
+                el bulkhead a tiempo; no se llega a llamar a Google.
+            Cualquier error de Google o de red. Los estados que indican una
+            petición inválida o sin resultados no cuentan como fallo.
+        """
+        breaker = self.breakers[operation]
+        if not breaker.allow():
+            raise CircuitOpenError(f"circuito {operation} abierto")
+        try:
+            with self.bulkhead.slot():
+                self._count_upstream_call()
+                result = method(**kwargs)
+        except CircuitOpenError:
+            # Bulkhead lleno: no sabemos nada nuevo de Google
+            breaker.release()
+            raise
+        except googlemaps.exceptions.ApiError as e:
+            if e.status in _NOT_FOUND_STATUSES:
+                breaker.record_success()
+            else:
+                breaker.record_failure()
+            raise
+        except Exception:
+            breaker.record_failure()
+            raise
+        breaker.record_success()
+        return result
+
+    def is_degraded(self, operation: Optional[str] = None) -> bool:
+        """True si el circuito de la operación (o cualquiera) no está cerrado."""
+        breakers = [self.breakers[operation]] if operation else self.breakers.values()
+        return any(b.state != CircuitBreaker.CLOSED for b in breakers)
+
+    def stats(self) -> Dict[str, Any]:
+        """Contadores de las cachés, los circuitos y el bulkhead del servicio."""
+        return {
+            "upstream_calls": self.upstream_calls,
+            "nearby_cache": self.nearby_cache.stats(),
+            "details_cache": self.details_cache.stats(),
+            "breakers": {name: b.stats() for name, b in self.breakers.items()},
+            "bulkhead": self.bulkhead.stats(),
+        }
     
+    def nearby_search_center(self, latitude: float, longitude: float, radius: int) -> Tuple[float, float]:
+        """Centro de la celda con el que se consulta a Google para este radio."""
+        step = snap_step_meters(radius)
+        row, col = snap_to_cell(latitude, longitude, step)
+        return cell_center(row, col, step)
+
+    def get_cached_nearby_places(
+        self,
+        latitude: float,
+        longitude: float,
+        radius: int = 1000,
+        place_type: Optional[str] = None,
+        keyword: Optional[str] = None
+    ) -> Optional[List[Dict]]:
+        """Lugares cercanos si están en caché, None si no (sin llamar a Google)."""
+        cache_key = self._nearby_cache_key(latitude, longitude, radius, place_type, keyword)
+        cached = self.nearby_cache.get(cache_key)
+        return list(cached) if cached is not None else None
+
+    def cache_nearby_places(
+        self,
+        latitude: float,
+        longitude: float,
+        radius: int,
+        place_type: Optional[str],
+        keyword: Optional[str],
+        places: List[Dict]
+    ) -> None:
+        """Guarda en caché un resultado obtenido por otra vía (p.ej. el catálogo)."""
+        cache_key = self._nearby_cache_key(latitude, longitude, radius, place_type, keyword)
+        self.nearby_cache.set(cache_key, list(places))
+
     def get_nearby_places(
         self,
         latitude: float,
@@ -29,9 +234,34 @@ class MapsService:
         
         Returns:
             Lista de lugares cercanos
+
+        Las búsquedas se cachean por celda: dos usuarios dentro de la misma
+        celda comparten resultado, y a Google se le consulta con el centro
+        de la celda para que el resultado no dependa de quién llegó primero.
         """
+        cached = self.get_cached_nearby_places(latitude, longitude, radius, place_type, keyword)
+        if cached is not None:
+            return cached
+        return self.fetch_nearby_places(latitude, longitude, radius, place_type, keyword) or []
+
+    def fetch_nearby_places(
+        self,
+        latitude: float,
+        longitude: float,
+        radius: int = 1000,
+        place_type: Optional[str] = None,
+        keyword: Optional[str] = None
+    ) -> Optional[List[Dict]]:
+        """
+        Consulta a Google sin mirar la caché y guarda el resultado en ella.
+
+        Returns:
+            Lista de lugares cercanos, o None si la llamada a Google falla
+            (a diferencia de una búsqueda válida sin resultados).
+        """
+        cache_key = self._nearby_cache_key(latitude, longitude, radius, place_type, keyword)
         try:
-            location = (latitude, longitude)
+            location = cell_center(cache_key[0], cache_key[1], cache_key[2])
             
             # Parámetros de búsqueda
             params = {
@@ -46,77 +276,218 @@ class MapsService:
                 params['keyword'] = keyword
             
             # Realizar búsqueda
-            places_result = self.client.places_nearby(**params)
-            
-            # Procesar resultados
-            places = []
-            for place in places_result.get('results', []):
-                places.append({
-                    'place_id': place.get('place_id'),
-                    'name': place.get('name'),
-                    'address': place.get('vicinity'),
-                    'types': place.get('types', []),
-                    'rating': place.get('rating'),
-                    'user_ratings_total': place.get('user_ratings_total'),
-                    'location': {
-                        'lat': place['geometry']['location']['lat'],
-                        'lng': place['geometry']['location']['lng']
-                    },
-                    'open_now': place.get('opening_hours', {}).get('open_now'),
-                    'photos': [photo['photo_reference'] for photo in place.get('photos', [])][:3]
-                })
-            
-            return places
-            
+            places_result = self._call("nearby", self.client.places_nearby, **params)
+            places = self._parse_nearby_results(places_result)
+
+            self.nearby_cache.set(cache_key, places)
+            self._remember_page_token(cache_key, 1, places_result)
+            return list(places)
+
+        except CircuitOpenError as e:
+            logger.warning(f"Google Maps no disponible: {e}")
+            return None
         except Exception as e:
             logger.error(f"Error: {e}")
-            return []
+            return None
+
+    def iter_next_nearby_pages(
+        self,
+        latitude: float,
+        longitude: float,
+        radius: int = 1000,
+        place_type: Optional[str] = None,
+        keyword: Optional[str] = None,
+        on_fetched: Optional[Callable[[List[Dict]], None]] = None
+    ) -> Iterator[List[Dict]]:
+        """
+        Generador perezoso de las páginas 2 y 3 de una búsqueda nearby.
+
+        Solo pide a Google la siguiente página cuando el consumidor la
+        solicita, así que basta con dejar de iterar cuando hay candidatos
+        suficientes. Requiere que la primera página se haya obtenido de
+        Google hace poco (el next_page_token se guarda junto a ella); si no
+        hay token, no produce nada. Las páginas también se cachean, y
+        on_fetched se invoca solo con las que vienen de Google.
+
+        El token de Google no es válido hasta unos segundos después de
+        emitirse: se espera solo lo que falte desde su emisión. La espera
+        ocurre en el hilo del llamante (pool de FastAPI o de
+        recomendaciones), nunca en el event loop.
+        """
+        cache_key = self._nearby_cache_key(latitude, longitude, radius, place_type, keyword)
+        for page in range(2, _MAX_NEARBY_PAGES + 1):
+            page_key = cache_key + (page,)
+            cached = self.nearby_cache.get(page_key)
+            if cached is not None:
+                yield list(cached)
+                continue
+
+            token = self._page_tokens.get((cache_key, page - 1))
+            if token is None:
+                return
+            next_page_token, issued_at = token
+
+            places_result = self._fetch_next_page(next_page_token, issued_at)
+            if places_result is None:
+                return
+            places = self._parse_nearby_results(places_result)
+            self.nearby_cache.set(page_key, places)
+            self._remember_page_token(cache_key, page, places_result)
+            if on_fetched is not None:
+                on_fetched(places)
+            yield list(places)
+
+    def _remember_page_token(self, cache_key: tuple, page: int, places_result: Dict) -> None:
+        token = places_result.get('next_page_token')
+        if token:
+            self._page_tokens.set((cache_key, page), (token, time.monotonic()))
+
+    def _fetch_next_page(self, next_page_token: str, issued_at: float) -> Optional[Dict]:
+        """Pide una página siguiente respetando el retardo de activación del token."""
+        wait = issued_at + _PAGE_TOKEN_DELAY_SECONDS - time.monotonic()
+        if wait > 0:
+            time.sleep(wait)
+        for attempt in range(_PAGE_TOKEN_RETRIES):
+            try:
+                return self._call("nearby", self.client.places_nearby, page_token=next_page_token)
+            except CircuitOpenError as e:
+                logger.warning(f"Google Maps no disponible: {e}")
+                return None
+            except googlemaps.exceptions.ApiError as e:
+                # INVALID_REQUEST = el token aún no está activo
+                if e.status != "INVALID_REQUEST" or attempt == _PAGE_TOKEN_RETRIES - 1:
+                    logger.error(f"Error: {e}")
+                    return None
+                time.sleep(_PAGE_TOKEN_RETRY_SECONDS)
+            except Exception as e:
+                logger.error(f"Error: {e}")
+                return None
+        return None
+
+    @staticmethod
+    def _parse_nearby_results(places_result: Dict) -> List[Dict]:
+        """Convierte la respuesta de places_nearby al formato de la API."""
+        places = []
+        for place in places_result.get('results', []):
+            places.append({
+                'place_id': place.get('place_id'),
+                'name': place.get('name'),
+                'address': place.get('vicinity'),
+                'types': place.get('types', []),
+                'rating': place.get('rating'),
+                'user_ratings_total': place.get('user_ratings_total'),
+                'location': {
+                    'lat': place['geometry']['location']['lat'],
+                    'lng': place['geometry']['location']['lng']
+                },
+                'open_now': place.get('opening_hours', {}).get('open_now'),
+                'photos': [photo['photo_reference'] for photo in place.get('photos', [])][:3]
+            })
+        return places
     
-    def get_place_details(self, place_id: str) -> Optional[Dict]:
+    def get_place_details(
+        self,
+        place_id: str,
+        on_fetched: Optional[Callable[[Dict], None]] = None,
+        fallback: Optional[Callable[[str], Optional[Dict]]] = None
+    ) -> Optional[Dict]:
         """
         Obtener detalles completos de un lugar
         
         Args:
             place_id: ID del lugar en Google Maps
+            on_fetched: Callback opcional invocado con los detalles cada vez
+                que se obtienen de Google (también en los refrescos en
+                segundo plano). Debe gestionar su propia sesión de BD.
+            fallback: Callback opcional que devuelve una copia guardada de
+                los detalles (p.ej. del catálogo) cuando Google falla y no
+                hay copia en caché.
         
         Returns:
-            Detalles del lugar
+            Detalles del lugar, o None si no existe (también si ese "no
+            encontrado" está en caché, aunque el circuito esté abierto).
+
+        Raises:
+            El error de Google (CircuitOpenError si el circuito está
+            abierto) cuando falla y no hay copia que servir.
+
+        Usa stale-while-revalidate: pasado el TTL blando se sirve la copia
+        en caché y se refresca en segundo plano; solo se espera a Google si
+        la entrada no existe o ha superado el TTL duro. Los "no encontrado"
+        se cachean durante PLACE_DETAILS_NEGATIVE_TTL_SECONDS.
+
+        Modo degradado: si Google falla o su circuito está abierto, se
+        devuelve la última copia conocida (aunque supere el TTL duro) o la
+        de fallback, marcada con 'degraded': True.
         """
+        def load() -> Optional[Dict]:
+            details = self._fetch_place_details(place_id)
+            if details is not None and on_fetched is not None:
+                try:
+                    on_fetched(details)
+                except Exception as e:
+                    logger.error(f"Error: {e}")
+            return details
+
         try:
-            place_result = self.client.place(place_id=place_id)
-            
-            if place_result.get('status') == 'OK':
-                place = place_result['result']
-                return {
-                    'place_id': place.get('place_id'),
-                    'name': place.get('name'),
-                    'formatted_address': place.get('formatted_address'),
-                    'phone': place.get('formatted_phone_number'),
-                    'website': place.get('website'),
-                    'rating': place.get('rating'),
-                    'user_ratings_total': place.get('user_ratings_total'),
-                    'price_level': place.get('price_level'),
-                    'types': place.get('types', []),
-                    'location': {
-                        'lat': place['geometry']['location']['lat'],
-                        'lng': place['geometry']['location']['lng']
-                    },
-                    'opening_hours': place.get('opening_hours', {}).get('weekday_text'),
-                    'reviews': [
-                        {
-                            'author': review.get('author_name'),
-                            'rating': review.get('rating'),
-                            'text': review.get('text'),
-                            'time': review.get('time')
-                        }
-                        for review in place.get('reviews', [])[:5]
-                    ]
-                }
-            return None
-            
+            return self.details_cache.get_or_load(place_id, load)
         except Exception as e:
-            logger.error(f"Error: {e}")
-            return None
+            if isinstance(e, CircuitOpenError):
+                logger.warning(f"Google Maps no disponible: {e}")
+            else:
+                logger.error(f"Error: {e}")
+            details = self.details_cache.peek(place_id)
+            if details is None and fallback is not None:
+                details = fallback(place_id)
+            if details is None:
+                raise
+            return {**details, 'degraded': True}
+
+    def _fetch_place_details(self, place_id: str) -> Optional[Dict]:
+        """
+        Consulta los detalles a Google.
+
+        Returns:
+            Detalles del lugar, o None si Google dice que no existe.
+
+        Raises:
+            Cualquier otro error de Google o de red, para no cachearlo.
+        """
+        try:
+            place_result = self._call("details", self.client.place, place_id=place_id)
+        except googlemaps.exceptions.ApiError as e:
+            if e.status in _NOT_FOUND_STATUSES:
+                return None
+            raise
+
+        if place_result.get('status') == 'OK':
+            place = place_result['result']
+            return {
+                'place_id': place.get('place_id'),
+                'name': place.get('name'),
+                'formatted_address': place.get('formatted_address'),
+                'phone': place.get('formatted_phone_number'),
+                'website': place.get('website'),
+                'rating': place.get('rating'),
+                'user_ratings_total': place.get('user_ratings_total'),
+                'price_level': place.get('price_level'),
+                'types': place.get('types', []),
+                'location': {
+                    'lat': place['geometry']['location']['lat'],
+                    'lng': place['geometry']['location']['lng']
+                },
+                'opening_hours': place.get('opening_hours', {}).get('weekday_text'),
+                'reviews': [
+                    {
+                        'author': review.get('author_name'),
+                        'rating': review.get('rating'),
+                        'text': review.get('text'),
+                        'time': review.get('time')
+                    }
+                    for review in place.get('reviews', [])[:5]
+                ]
+            }
+        return None
     
     def geocode_address(self, address: str) -> Optional[Dict]:
         """
@@ -129,23 +500,35 @@ class MapsService:
             Coordenadas y dirección formateada
         """
         try:
-            geocode_result = self.client.geocode(address)
-            
-            if geocode_result:
-                result = geocode_result[0]
-                return {
-                    'formatted_address': result.get('formatted_address'),
-                    'location': {
-                        'lat': result['geometry']['location']['lat'],
-                        'lng': result['geometry']['location']['lng']
-                    },
-                    'place_id': result.get('place_id')
-                }
-            return None
-            
+            return self.fetch_geocode(address)
         except Exception as e:
             logger.error(f"Error: {e}")
             return None
 
+    def fetch_geocode(self, address: str) -> Optional[Dict]:
+        """
+        Consulta la geocodificación a Google.
+
+        Returns:
+            Coordenadas y dirección formateada, o None si no hay resultados.
+
+        Raises:
+            Errores de Google o de red, para que el llamante no los cachee.
+            CircuitOpenError si el circuito de geocode está abierto.
+        """
+        geocode_result = self._call("geocode", self.client.geocode, address=address)
+
+        if geocode_result:
+            result = geocode_result[0]
+            return {
+                'formatted_address': result.get('formatted_address'),
+                'location': {
+                    'lat': result['geometry']['location']['lat'],
+                    'lng': result['geometry']['location']['lng']
+                },
+                'place_id': result.get('place_id')
+            }
+        return None
+
 # Instancia global del servicio
 maps_service = MapsService()
\ No newline at end of file
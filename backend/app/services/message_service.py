@@ -1,10 +1,23 @@
-from typing import List, Optional
+from collections import Counter
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+from fastapi import HTTPException, status
+from sqlalchemy import case, func, insert, select, tuple_, update
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import set_committed_value
 
-from app.models.message import Message
+from app.models.conversation import PREVIEW_LENGTH, Conversation
+from app.models.conversation_read import ConversationRead
+from app.models.message import Message, conversation_key
 from app.schemas.message import MessageCreate
 
 
+def _position(message: Dict[str, Any]) -> tuple:
+    """(timestamp, id): the order of messages within a conversation."""
+    return (message["timestamp"], message["id"])
+
+
 class MessageService:
     @staticmethod
     def get_conversation(
@@ -13,34 +26,93 @@ class MessageService:
         other_user_id: int,
         skip: int = 0,
         limit: int = 20,
+        before: Optional[int] = None,
+        after: Optional[int] = None,
     ) -> List[Message]:
         """
-        Returns all messages exchanged between two users, ordered
+        Returns a page of the messages exchanged between two users, ordered
         chronologically (oldest first).
 
+        Without a cursor the page starts `skip` messages from the oldest.
+        With `before`/`after` (message IDs from a previous page) it holds
+        the `limit` messages right before / after that message, walking the
+        (conversation_key, timestamp, id) index, so every page costs the
+        same however deep it is. Both can be combined to read a range.
+
         Args:
             db: SQLAlchemy database session
             current_user_id: ID of the requesting user
             other_user_id: ID of the conversation partner
+            skip: Offset from the oldest message (ignored with a cursor)
+            limit: Maximum number of messages to return
+            before: Return messages older than this message ID
+            after: Return messages newer than this message ID
 
         Returns:
-            List of Message ORM instances ordered by timestamp ascending.
+            List of Message ORM instances ordered by (timestamp, id) ascending,
+            with is_read taken from the receiver's read watermark.
+
+        Raises:
+            HTTPException 400 if a cursor is not a message of this conversation.
         """
-        return (
-            db.query(Message)
-            .filter(
-                (
-                    (Message.sender_id == current_user_id) &
-                    (Message.receiver_id == other_user_id)
-                ) | (
-                    (Message.sender_id == other_user_id) &
-                    (Message.receiver_id == current_user_id)
-                )
-            )
-            .order_by(Message.timestamp.asc())
-            .offset(skip).limit(limit)
+        key = conversation_key(current_user_id, other_user_id)
+        position = tuple_(Message.timestamp, Message.id)
+        query = db.query(Message).filter(Message.conversation_key == key)
+
+        if after is not None:
+            query = query.filter(position > MessageService._cursor(db, key, after))
+        if before is None:
+            query = query.order_by(Message.timestamp.asc(), Message.id.asc())
+            if after is None:
+                query = query.offset(skip)
+            return MessageService._with_read_state(db, key, query.limit(limit).all())
+
+        # Los `limit` anteriores al cursor: del más nuevo hacia atrás y se
+        # devuelven en orden cronológico
+        page = (
+            query.filter(position < MessageService._cursor(db, key, before))
+            .order_by(Message.timestamp.desc(), Message.id.desc())
+            .limit(limit)
             .all()
         )
+        page.reverse()
+        return MessageService._with_read_state(db, key, page)
+
+    @staticmethod
+    def _with_read_state(db: Session, key: str, messages: List[Message]) -> List[Message]:
+        """
+        Sets is_read on messages of one conversation from their receiver's
+        watermark, the only source of read state, so it always agrees with
+        the unread counts. The value is not written back to the legacy
+        is_read column.
+        """
+        watermarks = {
+            user_id: (last_read_at, last_read_message_id)
+            for user_id, last_read_at, last_read_message_id in db.query(
+                ConversationRead.user_id, ConversationRead.last_read_at, ConversationRead.last_read_message_id
+            ).filter(ConversationRead.conversation_key == key)
+        }
+        for message in messages:
+            watermark = watermarks.get(message.receiver_id)
+            # Sin timestamp no cuenta como no leído en SQL; aquí tampoco
+            position = (message.timestamp or datetime.min, message.id)
+            set_committed_value(message, "is_read", watermark is not None and position <= watermark)
+        return messages
+
+    @staticmethod
+    def _cursor(db: Session, key: str, message_id: int) -> tuple:
+        """(timestamp, id) of a message of the conversation, for keyset pagination."""
+        row = (
+            db.query(Message.timestamp, Message.id)
+            .filter(Message.id == message_id, Message.conversation_key == key)
+            .first()
+        )
+        if row is None:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Cursor inválido: el mensaje no es de esta conversación"
+            )
+        return tuple(row)
 
     @staticmethod
     def create_message(
@@ -50,7 +122,8 @@ class MessageService:
     ) -> Message:
         """
         Persists a new message from sender_id to the receiver specified
-        in message_data.
+        in message_data, and updates both participants' inbox rows in the
+        same transaction.
 
         Args:
             db: SQLAlchemy database session
@@ -63,13 +136,149 @@ class MessageService:
         new_message = Message(
             sender_id=sender_id,
             receiver_id=message_data.receiver_id,
+            conversation_key=conversation_key(sender_id, message_data.receiver_id),
             content=message_data.content
         )
         db.add(new_message)
+        db.flush()
+        MessageService._update_inbox(db, [{
+            "id": new_message.id,
+            "sender_id": new_message.sender_id,
+            "receiver_id": new_message.receiver_id,
+            "content": new_message.content,
+            "timestamp": new_message.timestamp,
+        }])
         db.commit()
         db.refresh(new_message)
         return new_message
 
+    @staticmethod
+    def insert_messages(db: Session, rows: List[Dict[str, Any]]) -> List[int]:
+        """
+        Inserts several messages with a single multi-row INSERT ... RETURNING
+        and commits them, with the inbox rows they update, in one
+        transaction.
+
+        Args:
+            db: SQLAlchemy database session
+            rows: Column values (sender_id, receiver_id, content, timestamp)
+                  of each message
+
+        Returns:
+            The new message IDs, in the same order as rows.
+        """
+        ids = db.execute(
+            insert(Message).returning(Message.id, sort_by_parameter_order=True),
+            [
+                {**row, "conversation_key": conversation_key(row["sender_id"], row["receiver_id"])}
+                for row in rows
+            ],
+        ).scalars().all()
+        MessageService._update_inbox(db, [{**row, "id": message_id} for row, message_id in zip(rows, ids)])
+        db.commit()
+        return list(ids)
+
+    @staticmethod
+    def _update_inbox(db: Session, messages: List[Dict[str, Any]]) -> None:
+        """
+        Moves the inbox rows of both participants of each message to the
+        newest message by (timestamp, id), and counts the messages as unread for their
+        receivers: one UPDATE (or INSERT) per participant however many
+        messages there are. Not committed.
+        """
+        latest: Dict[Tuple[int, int], Dict[str, Any]] = {}
+        unread: Counter = Counter()
+        for message in messages:
+            sender_id, receiver_id = message["sender_id"], message["receiver_id"]
+            for participant in ((sender_id, receiver_id), (receiver_id, sender_id)):
+                if participant not in latest or _position(latest[participant]) < _position(message):
+                    latest[participant] = message
+            unread[(receiver_id, sender_id)] += 1
+        for (user_id, other_user_id), message in latest.items():
+            MessageService._upsert_inbox_row(db, user_id, other_user_id, message, unread[(user_id, other_user_id)])
+
+    @staticmethod
+    def _upsert_inbox_row(
+        db: Session,
+        user_id: int,
+        other_user_id: int,
+        message: Dict[str, Any],
+        unread: int,
+    ) -> None:
+        # Un lote confirmado antes con mensajes más nuevos no se pisa
+        newer = tuple_(Conversation.last_message_at, Conversation.last_message_id) < tuple_(
+            message["timestamp"], message["id"]
+        )
+        updated = db.execute(
+            update(Conversation)
+            .where(Conversation.user_id == user_id, Conversation.other_user_id == other_user_id)
+            .values(
+                last_message_id=case((newer, message["id"]), else_=Conversation.last_message_id),
+                last_sender_id=case((newer, message["sender_id"]), else_=Conversation.last_sender_id),
+                last_message_preview=case(
+                    (newer, message["content"][:PREVIEW_LENGTH]), else_=Conversation.last_message_preview
+                ),
+                last_message_at=case((newer, message["timestamp"]), else_=Conversation.last_message_at),
+                unread_count=Conversation.unread_count + unread,
+            )
+        ).rowcount
+        if updated:
+            return
+        try:
+            with db.begin_nested():
+                db.add(Conversation(
+                    user_id=user_id,
+                    other_user_id=other_user_id,
+                    conversation_key=conversation_key(user_id, other_user_id),
+                    last_message_id=message["id"],
+                    last_sender_id=message["sender_id"],
+                    last_message_preview=message["content"][:PREVIEW_LENGTH],
+                    last_message_at=message["timestamp"],
+                    unread_count=unread,
+                ))
+        except IntegrityError:
+            # La creó otra transacción a la vez: basta con actualizarla
+            MessageService._upsert_inbox_row(db, user_id, other_user_id, message, unread)
+
+    @staticmethod
+    def get_inbox(
+        db: Session,
+        user_id: int,
+        limit: int = 20,
+        before: Optional[Tuple[datetime, int]] = None,
+    ) -> List[Conversation]:
+        """
+        Returns a page of the conversations of user_id, most recently
+        active first, read from the materialized inbox with a single query
+        on the (user_id, last_message_at, last_message_id) index.
+
+        Recency is the (timestamp, id) of the last message, the same order
+        as the conversation history: message IDs alone are not enough,
+        because the chat writer stamps messages before their batch is
+        inserted.
+
+        Args:
+            db: SQLAlchemy database session
+            user_id: ID of the inbox owner
+            limit: Maximum number of conversations to return
+            before: (last_message_at, last_message_id) of the previous
+                    page's last entry; returns the conversations after it
+
+        Returns:
+            List of Conversation ORM instances ordered by
+            (last_message_at, last_message_id) descending.
+        """
+        query = db.query(Conversation).filter(Conversation.user_id == user_id)
+        if before is not None:
+            query = query.filter(
+                tuple_(Conversation.last_message_at, Conversation.last_message_id) < tuple_(*before)
+            )
+        return (
+            query.order_by(Conversation.last_message_at.desc(), Conversation.last_message_id.desc())
+            .limit(limit)
+            .all()
+        )
+
     @staticmethod
     def get_message_by_id(db: Session, message_id: int) -> Optional[Message]:
         """
@@ -87,19 +296,173 @@ class MessageService:
     @staticmethod
     def mark_as_read(db: Session, message: Message) -> Message:
         """
-        Marks the given message as read.
+        Marks the given message as read by its receiver, by advancing the
+        receiver's read watermark to it (see advance_read_watermark). Read
+        state is the watermark, so every earlier message of the
+        conversation is read too and the inbox unread count is recounted.
 
         Args:
             db: SQLAlchemy database session
-            message: The Message ORM instance to update
+            message: The Message ORM instance to mark
 
         Returns:
-            The updated Message ORM instance.
+            The Message ORM instance, with is_read from the watermark.
         """
-        message.is_read = True
-        db.commit()
+        MessageService.advance_read_watermark(db, message.receiver_id, message.sender_id, message.id)
         db.refresh(message)
-        return message
+        return MessageService._with_read_state(db, message.conversation_key, [message])[0]
+
+    @staticmethod
+    def advance_read_watermark(
+        db: Session,
+        user_id: int,
+        other_user_id: int,
+        message_id: int,
+    ) -> Optional[int]:
+        """
+        Marks every message of the conversation up to message_id as read by
+        user_id, with a single write to its read watermark. Messages are
+        ordered by (timestamp, id), as in the history, and the watermark
+        never moves back: an older message leaves it as it is.
+
+        Args:
+            db: SQLAlchemy database session
+            user_id: ID of the reader
+            other_user_id: ID of the conversation partner
+            message_id: ID of the last message read
+
+        Returns:
+            The watermark after the update.
+
+        Raises:
+            HTTPException 400 if message_id is not a message of this conversation.
+        """
+        key = conversation_key(user_id, other_user_id)
+        position = MessageService._cursor(db, key, message_id)
+        MessageService._advance_watermark(db, user_id, key, position)
+        MessageService._refresh_unread(db, user_id, key)
+        db.commit()
+        return MessageService.get_read_watermark(db, user_id, other_user_id)
+
+    @staticmethod
+    def _advance_watermark(db: Session, user_id: int, key: str, position: tuple) -> None:
+        """
+        UPDATE ... WHERE it moves forward, or INSERT if there is none yet.
+        position is the (timestamp, id) of the message. Not committed.
+        """
+        timestamp, message_id = position
+        updated = db.execute(
+            update(ConversationRead)
+            .where(
+                ConversationRead.user_id == user_id,
+                ConversationRead.conversation_key == key,
+                tuple_(ConversationRead.last_read_at, ConversationRead.last_read_message_id) < tuple_(*position),
+            )
+            .values(last_read_at=timestamp, last_read_message_id=message_id)
+        ).rowcount
+        if updated or MessageService._watermark_row(db, user_id, key) is not None:
+            return
+        try:
+            with db.begin_nested():
+                db.add(ConversationRead(
+                    user_id=user_id,
+                    conversation_key=key,
+                    last_read_at=timestamp,
+                    last_read_message_id=message_id,
+                ))
+        except IntegrityError:
+            # Otra petición la acaba de crear: basta con avanzarla
+            MessageService._advance_watermark(db, user_id, key, position)
+
+    @staticmethod
+    def _refresh_unread(db: Session, user_id: int, key: str) -> None:
+        """
+        Recounts the unread messages of user_id's inbox row after its
+        watermark moved. Not committed.
+
+        The row is locked first, so a message batch committing meanwhile
+        either lands before the recount (and is counted by it) or waits and
+        adds its increment on top; the recount never overwrites one. The
+        count walks ix_messages_unread, so it costs O(unread messages).
+        """
+        (
+            db.query(Conversation.id)
+            .filter(Conversation.user_id == user_id, Conversation.conversation_key == key)
+            .with_for_update()
+            .first()
+        )
+        unread = (
+            select(func.count(Message.id))
+            .where(*MessageService._unread_filter(db, user_id, key))
+            .scalar_subquery()
+        )
+        db.execute(
+            update(Conversation)
+            .where(Conversation.user_id == user_id, Conversation.conversation_key == key)
+            .values(unread_count=unread)
+        )
+
+    @staticmethod
+    def _unread_filter(db: Session, user_id: int, key: str) -> list:
+        """
+        Conditions on Message of the messages user_id received in the
+        conversation after its watermark, in (timestamp, id) order.
+        """
+        conditions = [Message.conversation_key == key, Message.receiver_id == user_id]
+        watermark = (
+            db.query(ConversationRead.last_read_at, ConversationRead.last_read_message_id)
+            .filter(ConversationRead.user_id == user_id, ConversationRead.conversation_key == key)
+            .first()
+        )
+        if watermark is not None:
+            conditions.append(tuple_(Message.timestamp, Message.id) > tuple_(*watermark))
+        return conditions
+
+    @staticmethod
+    def _watermark_row(db: Session, user_id: int, key: str) -> Optional[ConversationRead]:
+        return (
+            db.query(ConversationRead)
+            .filter(ConversationRead.user_id == user_id, ConversationRead.conversation_key == key)
+            .first()
+        )
+
+    @staticmethod
+    def get_read_watermark(db: Session, user_id: int, other_user_id: int) -> Optional[int]:
+        """
+        Returns the ID of the last message of the conversation read by
+        user_id, or None if they have not read any.
+        """
+        row = MessageService._watermark_row(db, user_id, conversation_key(user_id, other_user_id))
+        return row.last_read_message_id if row is not None else None
+
+    @staticmethod
+    def count_unread(db: Session, user_id: int, other_user_id: int) -> int:
+        """
+        Returns how many messages user_id has received in the conversation
+        after its read watermark.
+        """
+        key = conversation_key(user_id, other_user_id)
+        return (
+            db.query(func.count(Message.id))
+            .filter(*MessageService._unread_filter(db, user_id, key))
+            .scalar()
+        )
+
+    @staticmethod
+    def unread_counts(db: Session, user_id: int) -> List[Dict[str, int]]:
+        """
+        Returns the unread count of every conversation of user_id that has
+        unread messages, from the counters of its inbox rows.
+
+        Returns:
+            List of {"user_id": partner ID, "unread_count": int}.
+        """
+        rows = (
+            db.query(Conversation.other_user_id, Conversation.unread_count)
+            .filter(Conversation.user_id == user_id, Conversation.unread_count > 0)
+            .all()
+        )
+        return [{"user_id": other_user_id, "unread_count": count} for other_user_id, count in rows]
     
     @staticmethod
     def delete_conversation(
@@ -107,19 +470,13 @@ class MessageService:
         current_user_id: int,
         other_user_id: int,
     ) -> int:
+        key = conversation_key(current_user_id, other_user_id)
         deleted = (
             db.query(Message)
-            .filter(
-                (
-                    (Message.sender_id == current_user_id) &
-                    (Message.receiver_id == other_user_id)
-                ) | (
-                    (Message.sender_id == other_user_id) &
-                    (Message.receiver_id == current_user_id)
-                )
-            )
+            .filter(Message.conversation_key == key)
             .delete(synchronize_session=False)
         )
+        db.query(Conversation).filter(Conversation.conversation_key == key).delete(synchronize_session=False)
         db.commit()
         return deleted
 
@@ -0,0 +1,159 @@
+import asyncio
+import logging
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from fastapi.concurrency import run_in_threadpool
+
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.services.message_service import MessageService
+
+logger = logging.getLogger(__name__)
+
+# (row to insert, future resolved with the stored message)
+PendingMessage = Tuple[Dict[str, Any], asyncio.Future]
+
+
+class MessageWriter:
+    """
+    Group commit for chat messages sent over the WebSocket.
+
+    submit() queues a message and waits until it is committed. A single
+    background task takes everything queued within CHAT_COMMIT_WINDOW_MS of
+    the first message (at most CHAT_COMMIT_MAX_BATCH), from every room, and
+    stores it with one INSERT ... RETURNING and one commit. Messages that
+    arrive while a batch is being committed form the next batch.
+
+    Durability is unchanged: submit() only returns once its transaction has
+    committed, so callers broadcast a message only after it is stored. If a
+    batch fails (e.g. one receiver was just deleted) its messages are
+    retried one by one, so one bad row fails only its own submit().
+    """
+
+    def __init__(self) -> None:
+        self._queue: "asyncio.Queue[PendingMessage]" = asyncio.Queue()
+        self._task: Optional[asyncio.Task] = None
+        self.counters = {
+            "messages": 0,
+            "batches": 0,
+            "failed": 0,
+            "max_batch": 0,
+        }
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop the task once everything already submitted is stored."""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        while not self._queue.empty():
+            await self._commit(self._drain(settings.CHAT_COMMIT_MAX_BATCH))
+
+    async def submit(self, sender_id: int, receiver_id: int, content: str) -> Dict[str, Any]:
+        """
+        Store a message and return it as the chat frame fields
+        (id, sender_id, receiver_id, content, timestamp, is_read).
+        Raises if it could not be stored.
+        """
+        row = {
+            "sender_id": sender_id,
+            "receiver_id": receiver_id,
+            "content": content,
+            "timestamp": datetime.now(),
+        }
+        future = asyncio.get_running_loop().create_future()
+        if self._task is None:
+            # Not started (scripts, tests): store it right away
+            await self._commit([(row, future)])
+        else:
+            await self._queue.put((row, future))
+        return await future
+
+    async def _run(self) -> None:
+        while True:
+            first = await self._queue.get()
+            try:
+                # Leave the window open for other rooms' messages
+                await asyncio.sleep(settings.CHAT_COMMIT_WINDOW_MS / 1000)
+            finally:
+                # Also when cancelled on shutdown: first is already taken
+                await self._commit([first] + self._drain(settings.CHAT_COMMIT_MAX_BATCH - 1))
+
+    def _drain(self, limit: int) -> List[PendingMessage]:
+        batch = []
+        while len(batch) < limit and not self._queue.empty():
+            batch.append(self._queue.get_nowait())
+        return batch
+
+    async def _commit(self, batch: List[PendingMessage]) -> None:
+        if not batch:
+            return
+        rows = [row for row, _ in batch]
+        started = time.monotonic()
+        try:
+            ids = await run_in_threadpool(self._insert, rows)
+        except Exception:
+            logger.exception(f"Error guardando un lote de {len(rows)} mensajes; reintentando uno a uno")
+            ids = await self._store_each(rows)
+        for (row, future), message_id in zip(batch, ids):
+            if future.done():
+                continue
+            if isinstance(message_id, Exception):
+                self.counters["failed"] += 1
+                future.set_exception(message_id)
+            else:
+                row["id"] = message_id
+                future.set_result(self._as_message(row))
+        self.counters["messages"] += len(rows)
+        self.counters["batches"] += 1
+        self.counters["max_batch"] = max(self.counters["max_batch"], len(rows))
+        logger.debug(f"Committed {len(rows)} chat messages in {time.monotonic() - started:.3f}s")
+
+    async def _store_each(self, rows: List[Dict[str, Any]]) -> List[Any]:
+        """One transaction per row; failures are returned, not raised."""
+        results: List[Any] = []
+        for row in rows:
+            try:
+                results.append((await run_in_threadpool(self._insert, [row]))[0])
+            except Exception as e:
+                results.append(e)
+        return results
+
+    @staticmethod
+    def _insert(rows: List[Dict[str, Any]]) -> List[int]:
+        db = SessionLocal()
+        try:
+            return MessageService.insert_messages(db, rows)
+        finally:
+            db.close()
+
+    @staticmethod
+    def _as_message(row: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "id": row["id"],
+            "sender_id": row["sender_id"],
+            "receiver_id": row["receiver_id"],
+            "content": row["content"],
+            "timestamp": row["timestamp"],
+            "is_read": False,
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queued": self._queue.qsize(),
+            **self.counters,
+        }
+
+
+# Singleton
+message_writer = MessageWriter()
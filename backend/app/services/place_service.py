@@ -0,0 +1,431 @@
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+from sqlalchemy import and_, or_
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.core.geo import (
+    GEOHASH_PRECISION, bounding_box, geohash_cover, geohash_encode, haversine_m, snap_step_meters
+)
+from app.models.place import Place, PlaceSearch
+from app.services.catalog_writer import catalog_writer
+from app.services.maps_services import maps_service
+
+logger = logging.getLogger(__name__)
+
+# Columnas que se refrescan al volver a ver un lugar en una búsqueda nearby
+_NEARBY_UPDATE_COLUMNS = (
+    "name", "address", "types", "rating", "user_ratings_total",
+    "latitude", "longitude", "geohash", "open_now", "photos", "fetched_at",
+)
+# Columnas que se refrescan al obtener los detalles de un lugar
+_DETAILS_UPDATE_COLUMNS = (
+    "name", "types", "rating", "user_ratings_total",
+    "latitude", "longitude", "geohash", "details", "details_fetched_at",
+)
+
+
+def _insert_for(db: Session):
+    """insert() con soporte ON CONFLICT para el dialecto de la sesión, o None."""
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+        return insert
+    if dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+        return insert
+    return None
+
+
+def _geohash_range(column, prefix: str):
+    """Condición de rango equivalente a LIKE 'prefix%' que usa el índice B-tree."""
+    upper = prefix + "z" * (GEOHASH_PRECISION - len(prefix))
+    return and_(column >= prefix, column <= upper)
+
+
+class PlaceService:
+
+    # -------- escritura --------
+
+    @staticmethod
+    def _upsert_places(db: Session, rows: List[Dict[str, Any]], update_columns: Iterable[str]) -> None:
+        """Inserta o actualiza filas de places por place_id."""
+        if not rows:
+            return
+        insert = _insert_for(db)
+        if insert is not None:
+            stmt = insert(Place).values(rows)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=["place_id"],
+                set_={col: stmt.excluded[col] for col in update_columns},
+            )
+            db.execute(stmt)
+            return
+
+        # Dialectos sin ON CONFLICT: lectura + merge fila a fila
+        existing = {
+            p.place_id: p
+            for p in db.query(Place).filter(Place.place_id.in_([r["place_id"] for r in rows]))
+        }
+        for row in rows:
+            place = existing.get(row["place_id"])
+            if place is None:
+                db.add(Place(**row))
+            else:
+                for col in update_columns:
+                    setattr(place, col, row[col])
+
+    @staticmethod
+    def upsert_places(db: Session, places: List[Dict[str, Any]]) -> None:
+        """
+        Guarda en el catálogo los lugares devueltos por una búsqueda nearby.
+        No hace commit.
+        """
+        PlaceService.upsert_place_rows(db, PlaceService.nearby_rows(places))
+
+    @staticmethod
+    def upsert_place_rows(db: Session, rows: List[Dict[str, Any]]) -> None:
+        """Inserta o actualiza filas ya construidas con nearby_rows. No hace commit."""
+        PlaceService._upsert_places(db, rows, _NEARBY_UPDATE_COLUMNS)
+
+    @staticmethod
+    def nearby_rows(places: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Filas de places (una por place_id) para los lugares de una búsqueda nearby."""
+        now = datetime.now()
+        rows: Dict[str, Dict[str, Any]] = {}
+        for place in places:
+            place_id = place.get("place_id")
+            if not place_id:
+                continue
+            lat = place["location"]["lat"]
+            lng = place["location"]["lng"]
+            rows[place_id] = {
+                "place_id": place_id,
+                "name": place.get("name"),
+                "address": place.get("address"),
+                "types": place.get("types") or [],
+                "rating": place.get("rating"),
+                "user_ratings_total": place.get("user_ratings_total"),
+                "latitude": lat,
+                "longitude": lng,
+                "geohash": geohash_encode(lat, lng),
+                "open_now": place.get("open_now"),
+                "photos": place.get("photos") or [],
+                "fetched_at": now,
+            }
+        return list(rows.values())
+
+    @staticmethod
+    def upsert_place_details(db: Session, details: Dict[str, Any]) -> None:
+        """Guarda los detalles completos de un lugar y hace commit."""
+        try:
+            PlaceService.upsert_detail_rows(db, [PlaceService.details_row(details)])
+            db.commit()
+        except SQLAlchemyError:
+            db.rollback()
+            logger.exception("Error guardando detalles en el catálogo")
+
+    @staticmethod
+    def upsert_detail_rows(db: Session, rows: List[Dict[str, Any]]) -> None:
+        """Inserta o actualiza filas construidas con details_row. No hace commit."""
+        PlaceService._upsert_places(db, rows, _DETAILS_UPDATE_COLUMNS)
+
+    @staticmethod
+    def details_row(details: Dict[str, Any]) -> Dict[str, Any]:
+        """Fila de places con los detalles completos de un lugar."""
+        now = datetime.now()
+        lat = details["location"]["lat"]
+        lng = details["location"]["lng"]
+        return {
+            "place_id": details["place_id"],
+            "name": details.get("name"),
+            "address": details.get("formatted_address"),
+            "types": details.get("types") or [],
+            "rating": details.get("rating"),
+            "user_ratings_total": details.get("user_ratings_total"),
+            "latitude": lat,
+            "longitude": lng,
+            "geohash": geohash_encode(lat, lng),
+            "open_now": None,
+            "photos": [],
+            "fetched_at": now,
+            "details": details,
+            "details_fetched_at": now,
+        }
+
+    @staticmethod
+    def save_place_details(details: Dict[str, Any]) -> None:
+        """
+        Callback de MapsService (también desde hilos en segundo plano): deja
+        los detalles en la cola de CatalogWriter, que los guarda por lotes.
+        """
+        catalog_writer.submit_details(PlaceService.details_row(details))
+
+    @staticmethod
+    def record_search(
+        db: Session,
+        latitude: float,
+        longitude: float,
+        radius: int,
+        place_type: str,
+        keyword: str,
+        result_count: int,
+    ) -> None:
+        """Marca una zona como cubierta por una búsqueda nearby. No hace commit."""
+        PlaceService.record_search_row(db, PlaceService.search_row(
+            latitude, longitude, radius, place_type, keyword, result_count
+        ))
+
+    @staticmethod
+    def search_row(
+        latitude: float,
+        longitude: float,
+        radius: int,
+        place_type: str,
+        keyword: str,
+        result_count: int,
+    ) -> Dict[str, Any]:
+        """Fila de place_searches para una búsqueda nearby."""
+        return {
+            "geohash": geohash_encode(latitude, longitude),
+            "latitude": latitude,
+            "longitude": longitude,
+            "radius": radius,
+            "place_type": place_type,
+            "keyword": keyword,
+            "result_count": result_count,
+            "searched_at": datetime.now(),
+        }
+
+    @staticmethod
+    def record_search_row(db: Session, row: Dict[str, Any]) -> None:
+        """Inserta o actualiza una fila construida con search_row. No hace commit."""
+        insert = _insert_for(db)
+        if insert is not None:
+            stmt = insert(PlaceSearch).values(row)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=["geohash", "radius", "place_type", "keyword"],
+                set_={
+                    "result_count": stmt.excluded.result_count,
+                    "searched_at": stmt.excluded.searched_at,
+                },
+            )
+            db.execute(stmt)
+            return
+
+        search = db.query(PlaceSearch).filter(
+            PlaceSearch.geohash == row["geohash"],
+            PlaceSearch.radius == row["radius"],
+            PlaceSearch.place_type == row["place_type"],
+            PlaceSearch.keyword == row["keyword"],
+        ).first()
+        if search is None:
+            db.add(PlaceSearch(**row))
+        else:
+            search.result_count = row["result_count"]
+            search.searched_at = row["searched_at"]
+
+    # -------- lectura --------
+
+    @staticmethod
+    def is_area_covered(
+        db: Session,
+        latitude: float,
+        longitude: float,
+        radius: int,
+        place_type: str,
+        keyword: str = "",
+    ) -> bool:
+        """
+        True si una búsqueda reciente con el mismo tipo/keyword contiene el
+        círculo pedido, admitiendo el mismo desplazamiento que la política de
+        snapping (un lado de celda, ver app.core.geo). Solo se consideran búsquedas cuyo centro
+        cae en las celdas geohash que cubren el círculo, así que una búsqueda
+        mucho mayor y lejana puede no detectarse (falso negativo, nunca falso
+        positivo).
+        """
+        fresh_since = datetime.now() - timedelta(seconds=settings.CATALOG_FRESH_SECONDS)
+        prefixes = geohash_cover(latitude, longitude, radius)
+        candidates = db.query(PlaceSearch).filter(
+            or_(*[_geohash_range(PlaceSearch.geohash, p) for p in prefixes]),
+            PlaceSearch.place_type == place_type,
+            PlaceSearch.keyword == keyword,
+            PlaceSearch.radius >= radius,
+            PlaceSearch.searched_at >= fresh_since,
+        ).all()
+        tolerance = snap_step_meters(radius)
+        for search in candidates:
+            distance = haversine_m(latitude, longitude, search.latitude, search.longitude)
+            if distance + radius <= search.radius + tolerance:
+                return True
+        return False
+
+    @staticmethod
+    def search_catalog(
+        db: Session,
+        latitude: float,
+        longitude: float,
+        radius: int,
+        place_type: str = "",
+        limit: Optional[int] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Lugares del catálogo dentro del radio, con el mismo formato que
+        MapsService.get_nearby_places. Ordenados por número de reseñas como
+        aproximación a la "prominence" de Google.
+
+        Los prefijos geohash acotan el recorrido del índice, pero a radios
+        grandes cubren mucho más que el círculo (nueve celdas de ~156 km a
+        50 km); el rectángulo que lo contiene descarta el resto en SQL y
+        solo se calcula la distancia exacta de lo que queda.
+        """
+        limit = limit or settings.CATALOG_MAX_RESULTS
+        prefixes = geohash_cover(latitude, longitude, radius)
+        min_lat, max_lat, min_lng, max_lng = bounding_box(latitude, longitude, radius)
+        rows = (
+            db.query(Place)
+            .filter(
+                or_(*[_geohash_range(Place.geohash, p) for p in prefixes]),
+                Place.latitude.between(min_lat, max_lat),
+                Place.longitude.between(min_lng, max_lng),
+            )
+            .all()
+        )
+
+        # open_now solo tiene sentido si el dato es reciente
+        open_now_since = datetime.now() - timedelta(seconds=settings.NEARBY_CACHE_TTL_SECONDS)
+        places = []
+        for row in rows:
+            if place_type and place_type not in (row.types or []):
+                continue
+            if haversine_m(latitude, longitude, row.latitude, row.longitude) > radius:
+                continue
+            places.append({
+                "place_id": row.place_id,
+                "name": row.name,
+                "address": row.address,
+                "types": row.types or [],
+                "rating": row.rating,
+                "user_ratings_total": row.user_ratings_total,
+                "location": {"lat": row.latitude, "lng": row.longitude},
+                "open_now": row.open_now if row.fetched_at >= open_now_since else None,
+                "photos": row.photos or [],
+            })
+        places.sort(key=lambda p: p["user_ratings_total"] or 0, reverse=True)
+        return places[:limit]
+
+    @staticmethod
+    def load_place_details(place_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Detalles guardados en el catálogo, sin importar su antigüedad. Abre
+        su propia sesión para usarlo como fallback de MapsService.
+        """
+        db = SessionLocal()
+        try:
+            place = db.query(Place).filter(Place.place_id == place_id).first()
+            return place.details if place is not None else None
+        finally:
+            db.close()
+
+    @staticmethod
+    def degraded_nearby_places(
+        db: Session,
+        latitude: float,
+        longitude: float,
+        radius: int,
+        place_type: str,
+        keyword: str,
+    ) -> List[Dict[str, Any]]:
+        """
+        Respuesta de emergencia cuando Google no responde: todo lo que el
+        catálogo tenga en la zona, sea cual sea su antigüedad, marcado con
+        'degraded': True. La keyword se aproxima buscándola en el nombre.
+        """
+        places = PlaceService.search_catalog(db, latitude, longitude, radius, place_type)
+        if keyword:
+            places = [p for p in places if keyword in (p["name"] or "").lower()]
+        for place in places:
+            place["degraded"] = True
+        return places
+
+    # -------- orquestación --------
+
+    @staticmethod
+    def get_nearby_places(
+        db: Session,
+        latitude: float,
+        longitude: float,
+        radius: int = 1000,
+        place_type: Optional[str] = None,
+        keyword: Optional[str] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Lugares cercanos resolviendo por capas:
+        1. Caché en memoria de MapsService.
+        2. Catálogo local, si una búsqueda reciente cubre la zona.
+        3. Google Maps; el resultado se guarda en el catálogo en segundo
+           plano (ver CatalogWriter), fuera del camino de la respuesta.
+        4. Si Google falla o su circuito está abierto, lo que haya en el
+           catálogo aunque no esté al día (ver degraded_nearby_places).
+           Este resultado no se cachea para no alargar la degradación.
+
+        Las búsquedas con keyword no se sirven desde el catálogo porque no
+        sabemos qué lugares casan con la keyword según Google.
+        """
+        cached = maps_service.get_cached_nearby_places(latitude, longitude, radius, place_type, keyword)
+        if cached is not None:
+            return cached
+
+        type_key = (place_type or "").lower()
+        keyword_key = " ".join((keyword or "").lower().split())
+        center_lat, center_lng = maps_service.nearby_search_center(latitude, longitude, radius)
+
+        if not keyword_key and PlaceService.is_area_covered(db, latitude, longitude, radius, type_key):
+            places = PlaceService.search_catalog(db, latitude, longitude, radius, type_key)
+            maps_service.cache_nearby_places(latitude, longitude, radius, place_type, keyword, places)
+            return places
+
+        places = maps_service.fetch_nearby_places(latitude, longitude, radius, place_type, keyword)
+        if places is None:
+            return PlaceService.degraded_nearby_places(
+                db, latitude, longitude, radius, type_key, keyword_key
+            )
+
+        catalog_writer.submit(
+            PlaceService.nearby_rows(places),
+            PlaceService.search_row(center_lat, center_lng, radius, type_key, keyword_key, len(places)),
+        )
+        return places
+
+    @staticmethod
+    def iter_nearby_places(
+        latitude: float,
+        longitude: float,
+        radius: int = 1000,
+        place_type: Optional[str] = None,
+        keyword: Optional[str] = None,
+    ) -> Iterator[List[Dict[str, Any]]]:
+        """
+        Generador de páginas de lugares cercanos: la primera se resuelve
+        como get_nearby_places y las siguientes se piden a Google solo si el
+        consumidor sigue iterando. Las páginas nuevas se guardan en el
+        catálogo en segundo plano.
+
+        La primera página usa una sesión propia que se cierra antes de
+        entregarla: entre páginas el generador no retiene ninguna conexión,
+        así que puede reanudarse desde cualquier hilo o abandonarse sin más.
+        """
+        db = SessionLocal()
+        try:
+            first = PlaceService.get_nearby_places(db, latitude, longitude, radius, place_type, keyword)
+        finally:
+            db.close()
+        yield first
+        yield from maps_service.iter_next_nearby_pages(
+            latitude, longitude, radius, place_type, keyword,
+            on_fetched=lambda places: catalog_writer.submit(PlaceService.nearby_rows(places)),
+        )
@@ -0,0 +1,150 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from datetime import datetime
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import insert
+
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.core.geo import haversine_m
+from app.models.location import Location
+
+logger = logging.getLogger(__name__)
+
+
+class PositionRecorder:
+    """
+    Write-behind persistence of live presence positions into `locations`.
+
+    The presence WebSocket calls record() for every position it accepts;
+    that only appends to an in-memory buffer. A background task writes the
+    buffer with one bulk INSERT every PRESENCE_PERSIST_INTERVAL_SECONDS, or
+    as soon as it holds PRESENCE_PERSIST_BATCH_ROWS rows, and stop() writes
+    what is left on shutdown.
+
+    Positions closer than PRESENCE_PERSIST_MIN_MOVE_METERS to the user's
+    last recorded one are skipped, so stationary users produce no rows.
+    If the database is unavailable the rows stay buffered, up to
+    PRESENCE_PERSIST_MAX_BUFFER (the oldest are dropped beyond that).
+    Disabled unless PRESENCE_PERSIST_ENABLED is set.
+    """
+
+    def __init__(self) -> None:
+        self._buffer: Deque[Dict[str, Any]] = deque(maxlen=settings.PRESENCE_PERSIST_MAX_BUFFER)
+        # user_id -> last recorded (lat, lng), for downsampling
+        self._last: Dict[int, Tuple[float, float]] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._wake = asyncio.Event()
+        self.counters = {
+            "received": 0,
+            "downsampled": 0,
+            "written": 0,
+            "dropped": 0,
+            "flushes": 0,
+            "errors": 0,
+        }
+
+    @property
+    def enabled(self) -> bool:
+        return settings.PRESENCE_PERSIST_ENABLED
+
+    def start(self) -> None:
+        if not self.enabled or self._task is not None:
+            return
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop the task and write whatever is still buffered."""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        await self.flush()
+
+    def record(self, user_id: int, latitude: float, longitude: float, at: datetime) -> None:
+        """Buffer a position unless it is too close to the last recorded one."""
+        if self._task is None:
+            return
+        self.counters["received"] += 1
+        last = self._last.get(user_id)
+        if last is not None and haversine_m(
+            last[0], last[1], latitude, longitude
+        ) < settings.PRESENCE_PERSIST_MIN_MOVE_METERS:
+            self.counters["downsampled"] += 1
+            return
+        self._last[user_id] = (latitude, longitude)
+        if len(self._buffer) == self._buffer.maxlen:
+            self.counters["dropped"] += 1
+        self._buffer.append({
+            "user_id": user_id,
+            "latitude": latitude,
+            "longitude": longitude,
+            "timestamp": at,
+        })
+        if len(self._buffer) >= settings.PRESENCE_PERSIST_BATCH_ROWS:
+            self._wake.set()
+
+    def forget(self, user_id: int) -> None:
+        """Drop the downsampling state of a user who went offline."""
+        self._last.pop(user_id, None)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), settings.PRESENCE_PERSIST_INTERVAL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            await self.flush()
+
+    async def flush(self) -> int:
+        """Write the buffered rows in batches. Returns the rows written."""
+        written = 0
+        while self._buffer:
+            size = min(len(self._buffer), settings.PRESENCE_PERSIST_BATCH_ROWS)
+            rows = [self._buffer.popleft() for _ in range(size)]
+            started = time.monotonic()
+            try:
+                await run_in_threadpool(self._insert, rows)
+            except Exception:
+                self.counters["errors"] += 1
+                logger.exception(f"Error guardando {len(rows)} posiciones de presencia")
+                # Back to the front, in order; retried on the next flush
+                overflow = len(self._buffer) + len(rows) - self._buffer.maxlen
+                if overflow > 0:
+                    self.counters["dropped"] += overflow
+                self._buffer.extendleft(reversed(rows))
+                break
+            written += len(rows)
+            self.counters["written"] += len(rows)
+            self.counters["flushes"] += 1
+            logger.debug(f"Saved {len(rows)} presence positions in {time.monotonic() - started:.3f}s")
+        return written
+
+    @staticmethod
+    def _insert(rows: List[Dict[str, Any]]) -> None:
+        db = SessionLocal()
+        try:
+            db.execute(insert(Location), rows)
+            db.commit()
+        finally:
+            db.close()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "buffered": len(self._buffer),
+            **self.counters,
+        }
+
+
+# Singleton
+position_recorder = PositionRecorder()
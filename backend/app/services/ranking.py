@@ -0,0 +1,167 @@
+import math
+from typing import Any, Dict, Iterable, List, Sequence
+
+import numpy as np
+
+from app.core.geo import EARTH_RADIUS_M
+
+# Pesos del score de recomendación (suman 1)
+WEIGHT_PREFERENCE = 0.35
+WEIGHT_RATING = 0.25
+WEIGHT_DISTANCE = 0.20
+WEIGHT_POPULARITY = 0.15
+WEIGHT_OPEN = 0.05
+
+# Nº de reseñas a partir del cual la popularidad satura
+POPULARITY_SATURATION = 5000
+
+# open_now -> componente "abierto" del score
+_OPEN_SCORE = {True: 1.0, None: 0.5, False: 0.0}
+
+
+class PlaceColumns:
+    """
+    Entradas del score de una lista de lugares, como columnas de NumPy.
+
+    Construirlas es la parte del ranking que recorre los dicts uno a uno
+    (~1 us por lugar); el resto es vectorizado. Las recomendaciones las
+    construyen página a página en el hilo del pool que trajo cada página,
+    mientras las demás categorías siguen esperando a la red, y al final
+    rank_columns solo une columnas y puntúa.
+    """
+
+    __slots__ = ("places", "lat", "lng", "rating", "reviews", "is_open", "matches")
+
+    def __init__(
+        self,
+        places: List[Dict[str, Any]],
+        lat: np.ndarray,
+        lng: np.ndarray,
+        rating: np.ndarray,
+        reviews: np.ndarray,
+        is_open: np.ndarray,
+        matches: np.ndarray,
+    ) -> None:
+        self.places = places
+        self.lat = lat
+        self.lng = lng
+        self.rating = rating
+        self.reviews = reviews
+        self.is_open = is_open
+        self.matches = matches
+
+    def __len__(self) -> int:
+        return len(self.places)
+
+    @classmethod
+    def build(cls, places: List[Dict[str, Any]], preferred_categories: Iterable[str]) -> "PlaceColumns":
+        """Columnas de `places`; matches compara tipos y categorías en minúsculas."""
+        n = len(places)
+        preferred = {c.lower() for c in preferred_categories}
+        # Una comprensión por columna: es lo más rápido para sacar los datos de
+        # los dicts; asignar elemento a elemento sobre arrays de NumPy no lo es.
+        locations = [place["location"] for place in places]
+        return cls(
+            places,
+            lat=np.fromiter([loc["lat"] for loc in locations], dtype=float, count=n),
+            lng=np.fromiter([loc["lng"] for loc in locations], dtype=float, count=n),
+            rating=np.array([place.get("rating") or 0.0 for place in places], dtype=float),
+            reviews=np.array([place.get("user_ratings_total") or 0 for place in places], dtype=float),
+            is_open=np.array([_OPEN_SCORE.get(place.get("open_now"), 0.5) for place in places], dtype=float),
+            matches=np.array(
+                [
+                    not preferred.isdisjoint(map(str.lower, place.get("types") or ()))
+                    for place in places
+                ],
+                dtype=bool,
+            ),
+        )
+
+    def take(self, indices: Sequence[int]) -> "PlaceColumns":
+        """Las filas `indices`, en ese orden."""
+        idx = np.asarray(indices, dtype=np.intp)
+        return PlaceColumns(
+            [self.places[i] for i in indices],
+            self.lat[idx], self.lng[idx], self.rating[idx],
+            self.reviews[idx], self.is_open[idx], self.matches[idx],
+        )
+
+    @classmethod
+    def concat(cls, parts: Sequence["PlaceColumns"]) -> "PlaceColumns":
+        """Une varias listas de columnas, en orden."""
+        if not parts:
+            return cls.build([], ())
+        return cls(
+            [place for part in parts for place in part.places],
+            *(
+                np.concatenate([getattr(part, name) for part in parts])
+                for name in ("lat", "lng", "rating", "reviews", "is_open", "matches")
+            ),
+        )
+
+
+def rank_places(
+    places: List[Dict[str, Any]],
+    latitude: float,
+    longitude: float,
+    radius: int,
+    preferred_categories: Iterable[str],
+    limit: int,
+) -> List[Dict[str, Any]]:
+    """
+    Devuelve los `limit` mejores lugares según un score ponderado
+    (ver rank_columns). Construye las columnas en el momento; quien ya las
+    tenga debe llamar a rank_columns directamente.
+    """
+    return rank_columns(
+        PlaceColumns.build(places, preferred_categories), latitude, longitude, radius, limit
+    )
+
+
+def rank_columns(
+    columns: PlaceColumns,
+    latitude: float,
+    longitude: float,
+    radius: int,
+    limit: int,
+) -> List[Dict[str, Any]]:
+    """
+    Devuelve los `limit` mejores lugares según un score ponderado.
+
+    Componentes (todos normalizados a [0, 1]):
+    - preferencia: algún tipo del lugar está entre las categorías preferidas
+    - rating: rating / 5
+    - distancia: 1 - distancia / radio (haversine desde el usuario)
+    - popularidad: log(1 + reseñas), saturando en POPULARITY_SATURATION
+    - abierto: 1 abierto, 0.5 desconocido, 0 cerrado
+
+    Todo el cálculo es un único pase vectorizado con NumPy y la selección
+    del top usa argpartition, así que escala a miles de candidatos.
+    """
+    n = len(columns)
+    if n == 0 or limit <= 0:
+        return []
+
+    # Haversine vectorizado
+    phi1 = math.radians(latitude)
+    phi2 = np.radians(columns.lat)
+    dphi = phi2 - phi1
+    dlmb = np.radians(columns.lng - longitude)
+    a = np.sin(dphi / 2) ** 2 + math.cos(phi1) * np.cos(phi2) * np.sin(dlmb / 2) ** 2
+    distance = 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+    score = (
+        WEIGHT_PREFERENCE * columns.matches
+        + WEIGHT_RATING * (columns.rating / 5.0)
+        + WEIGHT_DISTANCE * np.clip(1.0 - distance / max(radius, 1), 0.0, 1.0)
+        + WEIGHT_POPULARITY * np.minimum(np.log1p(columns.reviews) / math.log1p(POPULARITY_SATURATION), 1.0)
+        + WEIGHT_OPEN * columns.is_open
+    )
+
+    if n > limit:
+        top = np.argpartition(-score, limit - 1)[:limit]
+    else:
+        top = np.arange(n)
+    # Orden final solo sobre el top; a igualdad de score, orden de llegada
+    top = top[np.lexsort((top, -score[top]))]
+    return [columns.places[i] for i in top]
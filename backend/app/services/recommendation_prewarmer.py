@@ -0,0 +1,181 @@
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import and_, func
+
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.models.location import Location
+from app.models.preference import Preference
+from app.models.user import User
+from app.services.maps_services import UpstreamMeter, maps_service
+from app.services.recommendation_service import RecommendationService
+
+logger = logging.getLogger(__name__)
+
+# (user_id, latitude, longitude, categories)
+WarmTarget = Tuple[int, float, float, List[str]]
+
+
+class RecommendationPrewarmer:
+    """
+    Background task that keeps the recommendation cache warm.
+
+    Every PREWARM_INTERVAL_SECONDS it reads the latest Location of each
+    active user (one with a location recorded in the last
+    PREWARM_ACTIVE_WITHIN_HOURS) plus their preferences, and recomputes
+    their recommendations for that cell with PREWARM_RADIUS and
+    PREWARM_LIMIT, the values the map view asks for.
+
+    At most PREWARM_CONCURRENCY users are computed at once, and a cycle
+    stops starting new users once its own refreshes have made
+    PREWARM_UPSTREAM_BUDGET calls to Google (users already in flight may
+    overshoot it slightly). Only the cycle's calls count, through an
+    UpstreamMeter (MapsService.metered), so user traffic meanwhile does not
+    use up the budget. Most refreshes are served by the nearby cache and
+    the place catalog, so they cost no upstream calls at all.
+
+    Disabled by default (PREWARM_ENABLED): each worker that runs it spends
+    its own budget.
+    """
+
+    def __init__(self) -> None:
+        self._task: Optional[asyncio.Task] = None
+        self.cycles = 0
+        self.last_cycle: Dict[str, Any] = {}
+
+    def start(self) -> None:
+        if not settings.PREWARM_ENABLED or self._task is not None:
+            return
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.run_cycle()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Error en el ciclo de precálculo de recomendaciones")
+            await asyncio.sleep(settings.PREWARM_INTERVAL_SECONDS)
+
+    @staticmethod
+    def _load_targets() -> List[WarmTarget]:
+        """Latest location and categories of every recently active user."""
+        since = datetime.now() - timedelta(hours=settings.PREWARM_ACTIVE_WITHIN_HOURS)
+        db = SessionLocal()
+        try:
+            latest = (
+                db.query(
+                    Location.user_id.label("user_id"),
+                    func.max(Location.timestamp).label("timestamp"),
+                )
+                .join(User, User.id == Location.user_id)
+                .filter(User.is_active.is_(True), Location.timestamp >= since)
+                .group_by(Location.user_id)
+                .order_by(func.max(Location.timestamp).desc())
+                .limit(settings.PREWARM_MAX_USERS)
+                .subquery()
+            )
+            rows = (
+                db.query(Location.user_id, Location.latitude, Location.longitude)
+                .join(
+                    latest,
+                    and_(
+                        Location.user_id == latest.c.user_id,
+                        Location.timestamp == latest.c.timestamp,
+                    ),
+                )
+                .all()
+            )
+            positions: Dict[int, Tuple[float, float]] = {}
+            for user_id, latitude, longitude in rows:
+                positions.setdefault(user_id, (latitude, longitude))
+            if not positions:
+                return []
+
+            categories: Dict[int, List[str]] = {user_id: [] for user_id in positions}
+            prefs = (
+                db.query(Preference.user_id, Preference.category)
+                .filter(Preference.user_id.in_(list(positions)))
+                .order_by(Preference.id)
+                .all()
+            )
+            for user_id, category in prefs:
+                categories[user_id].append(category)
+
+            return [
+                (user_id, lat, lng, RecommendationService.distinct_categories(categories[user_id]))
+                for user_id, (lat, lng) in positions.items()
+            ]
+        finally:
+            db.close()
+
+    @staticmethod
+    def _warm(meter: UpstreamMeter, target: WarmTarget) -> None:
+        """Refresh one user, counting its Google calls in meter. Blocking."""
+        user_id, latitude, longitude, categories = target
+        with maps_service.metered(meter):
+            RecommendationService.refresh(
+                user_id,
+                latitude,
+                longitude,
+                settings.PREWARM_RADIUS,
+                settings.PREWARM_LIMIT,
+                categories,
+            )
+
+    async def run_cycle(self) -> Dict[str, Any]:
+        """Refresh every active user once. Returns the cycle summary."""
+        started = time.monotonic()
+        targets = await run_in_threadpool(self._load_targets)
+        meter = UpstreamMeter()
+        semaphore = asyncio.Semaphore(settings.PREWARM_CONCURRENCY)
+        summary = {"users": len(targets), "warmed": 0, "skipped": 0, "errors": 0}
+
+        async def warm(target: WarmTarget) -> None:
+            async with semaphore:
+                if meter.calls >= settings.PREWARM_UPSTREAM_BUDGET:
+                    summary["skipped"] += 1
+                    return
+                try:
+                    await run_in_threadpool(self._warm, meter, target)
+                    summary["warmed"] += 1
+                except Exception:
+                    summary["errors"] += 1
+                    logger.exception(f"Error precalculando recomendaciones del usuario {target[0]}")
+
+        await asyncio.gather(*(warm(target) for target in targets))
+
+        summary["upstream_calls"] = meter.calls
+        summary["duration_seconds"] = round(time.monotonic() - started, 3)
+        summary["finished_at"] = datetime.now().isoformat()
+        self.cycles += 1
+        self.last_cycle = summary
+        logger.info(f"Recommendation pre-warm cycle: {summary}")
+        return summary
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": settings.PREWARM_ENABLED,
+            "cycles": self.cycles,
+            "last_cycle": self.last_cycle,
+        }
+
+
+# Singleton
+recommendation_prewarmer = RecommendationPrewarmer()
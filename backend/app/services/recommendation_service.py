@@ -0,0 +1,237 @@
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from contextvars import copy_context
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.core.geo import snap_step_meters, snap_to_cell
+from app.services.place_service import PlaceService
+from app.services.ranking import PlaceColumns, rank_columns
+
+logger = logging.getLogger(__name__)
+
+# Shared by every request so the number of concurrent Google calls stays
+# bounded no matter how many recommendation requests are in flight.
+_executor = ThreadPoolExecutor(
+    max_workers=settings.RECOMMENDATIONS_MAX_WORKERS,
+    thread_name_prefix="recommendations",
+)
+
+# (user_id, cell, radius, categories) -> (limit, ranked places)
+_recommendation_cache = TTLCache(
+    maxsize=settings.RECOMMENDATIONS_CACHE_MAX_ENTRIES,
+    ttl=settings.RECOMMENDATIONS_CACHE_TTL_SECONDS,
+)
+
+
+def _next_page(
+    pages: Iterator[List[Dict[str, Any]]],
+    preferred_categories: List[str],
+) -> Optional[PlaceColumns]:
+    """Next page of a category with its ranking columns, built in the pool worker."""
+    page = next(pages, None)
+    return PlaceColumns.build(page, preferred_categories) if page is not None else None
+
+
+def _collect_candidates(
+    latitude: float,
+    longitude: float,
+    radius: int,
+    categories: List[Optional[str]],
+    preferred_categories: List[str],
+    limit: int,
+) -> PlaceColumns:
+    """
+    Gather unique candidate places for every category concurrently.
+
+    Each round pulls the next page of every category that still has
+    pages, in parallel. The first round is the first page (cache, catalog
+    or Google); further rounds only happen while there are fewer than
+    `limit` unique candidates, so Google's next_page_token pages are only
+    requested when they are actually needed.
+
+    The whole collection shares one RECOMMENDATIONS_DEADLINE_SECONDS
+    budget. Categories that miss it are logged and skipped, so the caller
+    gets partial results instead of waiting for the slowest call. Late
+    calls keep running in the pool and still populate the caches; their
+    generators are closed by the worker as soon as the call returns.
+
+    The page generators hold no DB session between pages (see
+    PlaceService.iter_nearby_places), so resuming one on whichever pool
+    thread is free never shares a Session across threads. The worker also
+    builds the page's ranking columns, so ranking afterwards is only
+    vectorized work.
+
+    Returns:
+        Columns of the unique places (by place_id), in category order.
+    """
+    deadline = time.monotonic() + settings.RECOMMENDATIONS_DEADLINE_SECONDS
+    pages: Dict[Optional[str], Iterator[List[Dict[str, Any]]]] = {
+        category: PlaceService.iter_nearby_places(
+            latitude=latitude,
+            longitude=longitude,
+            radius=radius,
+            place_type=category,
+        )
+        for category in categories
+    }
+    seen_place_ids: set = set()
+    candidates: List[PlaceColumns] = []
+    found = 0
+    running: set = set()
+
+    pending = list(categories)
+    while pending:
+        # Each page runs in the caller's context, so per-job Google call
+        # accounting (MapsService.metered) follows it into the pool
+        futures = {
+            category: _executor.submit(copy_context().run, _next_page, pages[category], preferred_categories)
+            for category in pending
+        }
+        done, not_done = wait(
+            futures.values(), timeout=max(0.0, deadline - time.monotonic())
+        )
+        if not_done:
+            late = [c for c, f in futures.items() if f in not_done]
+            running.update(late)
+            logger.warning(f"Recommendation categories timed out: {late}")
+            for category in late:
+                # A running generator cannot be closed: the worker does it once next() returns
+                futures[category].add_done_callback(
+                    lambda _future, generator=pages[category]: generator.close()
+                )
+
+        next_pending = []
+        for category in pending:
+            future = futures[category]
+            if future not in done or future.exception() is not None:
+                continue
+            page = future.result()
+            if page is None:
+                continue  # no more pages for this category
+            next_pending.append(category)
+            keep = []
+            for i, place in enumerate(page.places):
+                place_id = place.get("place_id")
+                if place_id and place_id not in seen_place_ids:
+                    seen_place_ids.add(place_id)
+                    keep.append(i)
+            candidates.append(page if len(keep) == len(page) else page.take(keep))
+            found += len(keep)
+
+        if found >= limit:
+            break
+        pending = next_pending
+
+    # Stop the generators that are not still running
+    for category, generator in pages.items():
+        if category not in running:
+            generator.close()
+    return PlaceColumns.concat(candidates)
+
+
+class RecommendationService:
+    @staticmethod
+    def distinct_categories(categories: Iterable[str]) -> List[str]:
+        """Lower-cased categories without duplicates, in their original order."""
+        result: List[str] = []
+        for category in categories:
+            category = category.lower()
+            if category not in result:
+                result.append(category)
+        return result
+
+    @staticmethod
+    def _cache_key(
+        user_id: int,
+        latitude: float,
+        longitude: float,
+        radius: int,
+        categories: List[str],
+    ) -> tuple:
+        step = snap_step_meters(radius)
+        row, col = snap_to_cell(latitude, longitude, step)
+        return (user_id, row, col, step, radius, tuple(sorted(categories)))
+
+    @staticmethod
+    def compute(
+        latitude: float,
+        longitude: float,
+        radius: int,
+        limit: int,
+        categories: List[str],
+    ) -> List[Dict[str, Any]]:
+        """
+        Build recommendations without looking at the recommendation cache.
+
+        Args:
+            latitude: Latitude of the user
+            longitude: Longitude of the user
+            radius: Search radius in meters
+            limit: Maximum number of results
+            categories: Distinct, lower-cased preferred categories. When
+                empty, a single untyped query returns generic nearby places.
+
+        Returns:
+            Up to `limit` places ranked by app.services.ranking.
+        """
+        queried: List[Optional[str]] = list(categories) or [None]
+        candidates = _collect_candidates(latitude, longitude, radius, queried, categories, limit)
+        return rank_columns(
+            candidates,
+            latitude=latitude,
+            longitude=longitude,
+            radius=radius,
+            limit=limit,
+        )
+
+    @staticmethod
+    def refresh(
+        user_id: int,
+        latitude: float,
+        longitude: float,
+        radius: int,
+        limit: int,
+        categories: List[str],
+    ) -> List[Dict[str, Any]]:
+        """
+        Recompute recommendations and store them in the cache. Results
+        built from degraded (catalog fallback) data are not cached, so the
+        next request tries Google again.
+        """
+        places = RecommendationService.compute(latitude, longitude, radius, limit, categories)
+        if not any(place.get("degraded") for place in places):
+            key = RecommendationService._cache_key(user_id, latitude, longitude, radius, categories)
+            _recommendation_cache.set(key, (limit, places))
+        return places
+
+    @staticmethod
+    def get_recommendations(
+        user_id: int,
+        latitude: float,
+        longitude: float,
+        radius: int,
+        limit: int,
+        categories: List[str],
+    ) -> List[Dict[str, Any]]:
+        """
+        Cached recommendations for the user's snapped cell, or fresh ones.
+
+        Entries are keyed on the user, the snapped cell (same policy as the
+        nearby cache), the radius and the preferred categories, so changing
+        preferences never serves stale results. An entry computed for a
+        larger limit also serves smaller ones.
+        """
+        key = RecommendationService._cache_key(user_id, latitude, longitude, radius, categories)
+        cached = _recommendation_cache.get(key)
+        if cached is not None:
+            cached_limit, places = cached
+            if cached_limit >= limit:
+                return places[:limit]
+        return RecommendationService.refresh(user_id, latitude, longitude, radius, limit, categories)
+
+    @staticmethod
+    def stats() -> Dict[str, Any]:
+        return _recommendation_cache.stats()
@@ -0,0 +1,134 @@
+import asyncio
+import inspect
+from abc import ABC, abstractmethod
+import json
+import logging
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Union
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Channels shared by every worker
+ROOM_CHANNEL = "chat.room"
+USER_CHANNEL = "chat.user"
+PRESENCE_CHANNEL = "presence"
+
+Handler = Callable[[Dict[str, Any]], Union[None, Awaitable[None]]]
+
+
+class Backplane(ABC):
+    """
+    Pub/sub channel shared by every worker holding WebSockets.
+
+    Managers never deliver to their own sockets directly: they publish,
+    and every worker (including the publisher) gets the message through
+    its subscription and delivers it to whichever matching sockets it
+    holds. Messages must be JSON-serialisable dicts.
+    """
+
+    def __init__(self) -> None:
+        self._handlers: Dict[str, List[Handler]] = {}
+
+    def subscribe(self, channel: str, handler: Handler) -> None:
+        """Register a handler; call before start()."""
+        self._handlers.setdefault(channel, []).append(handler)
+
+    @abstractmethod
+    async def publish(self, channel: str, message: Dict[str, Any]) -> None:
+        """Send a message to every worker's handlers for the channel."""
+
+    async def start(self) -> None:
+        """Start receiving messages (from the app lifespan)."""
+
+    async def stop(self) -> None:
+        """Stop receiving messages."""
+
+    async def _dispatch(self, channel: str, message: Dict[str, Any]) -> None:
+        for handler in self._handlers.get(channel, []):
+            try:
+                result = handler(message)
+                if inspect.isawaitable(result):
+                    await result
+            except Exception:
+                logger.exception(f"Error handling backplane message on {channel}")
+
+
+class LoopbackBackplane(Backplane):
+    """
+    In-process backplane: publish delivers straight to this process's
+    handlers. Correct for a single worker, and what tests use.
+    """
+
+    async def publish(self, channel: str, message: Dict[str, Any]) -> None:
+        await self._dispatch(channel, message)
+
+
+class RedisBackplane(Backplane):
+    """
+    Redis pub/sub backplane for several workers or nodes.
+
+    Channels are prefixed with BACKPLANE_CHANNEL_PREFIX so several
+    deployments can share a Redis. The listener reconnects on errors;
+    messages published while it is disconnected are lost, as with any
+    Redis pub/sub consumer.
+    """
+
+    def __init__(self, url: str, prefix: str) -> None:
+        super().__init__()
+        try:
+            import redis.asyncio as aioredis
+        except ImportError as e:
+            raise RuntimeError("BACKPLANE_URL apunta a Redis pero el paquete 'redis' no está instalado") from e
+        self._redis = aioredis.from_url(url)
+        self._prefix = prefix
+        self._task: Optional[asyncio.Task] = None
+
+    async def publish(self, channel: str, message: Dict[str, Any]) -> None:
+        await self._redis.publish(self._prefix + channel, json.dumps(message))
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._listen())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self._redis.close()
+
+    async def _listen(self) -> None:
+        channels = [self._prefix + channel for channel in self._handlers]
+        while True:
+            pubsub = self._redis.pubsub()
+            try:
+                await pubsub.subscribe(*channels)
+                async for item in pubsub.listen():
+                    if item["type"] != "message":
+                        continue
+                    channel = item["channel"]
+                    if isinstance(channel, bytes):
+                        channel = channel.decode()
+                    await self._dispatch(channel[len(self._prefix):], json.loads(item["data"]))
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Backplane Redis desconectado; reintentando")
+                await asyncio.sleep(1)
+            finally:
+                await pubsub.close()
+
+
+def build_backplane() -> Backplane:
+    """Redis if BACKPLANE_URL is set, loopback otherwise."""
+    if settings.BACKPLANE_URL:
+        return RedisBackplane(settings.BACKPLANE_URL, settings.BACKPLANE_CHANNEL_PREFIX)
+    return LoopbackBackplane()
+
+
+# Module-level singleton shared by the WebSocket managers
+backplane = build_backplane()
@@ -1,11 +1,15 @@
 import json
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Query
+from fastapi import APIRouter, HTTPException, WebSocket, WebSocketDisconnect, Query
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.exc import SQLAlchemyError
 from app.core.database import SessionLocal
 from app.core.security import decode_access_token
 from app.services.user_service import UserService
 from app.services.message_service import MessageService
-from app.schemas.message import MessageCreate
+from app.services.message_writer import message_writer
+from app.websocket.heartbeat import PONG_TYPE, heartbeat
 from app.websocket.manager import manager
+from app.websocket.outbound import closed_by_server
 from app.websocket.user_manager import user_manager
 import logging
 
@@ -21,7 +25,7 @@ def _get_room_id(user_id_a: int, user_id_b: int) -> str:
 
 
 def _authenticate(token: str):
-    """Returns User or None."""
+    """Returns User or None. Blocking: call it off the event loop."""
     payload = decode_access_token(token)
     if payload is None:
         return None
@@ -36,6 +40,39 @@ def _authenticate(token: str):
         db.close()
 
 
+def _advance_read_watermark(user_id: int, other_user_id: int, message_id: int):
+    """Blocking: call it off the event loop."""
+    db = SessionLocal()
+    try:
+        return MessageService.advance_read_watermark(db, user_id, other_user_id, message_id)
+    finally:
+        db.close()
+
+
+def _user_exists(user_id: int) -> bool:
+    """Blocking: call it off the event loop."""
+    db = SessionLocal()
+    try:
+        return UserService.get_user_by_id(db, user_id) is not None
+    finally:
+        db.close()
+
+
+async def _read_up_to(writer, room_id: str, user_id: int, other_user_id: int, message_id: int) -> None:
+    try:
+        watermark = await run_in_threadpool(_advance_read_watermark, user_id, other_user_id, message_id)
+    except HTTPException as e:
+        writer.send_text(json.dumps({"error": e.detail}))
+        return
+    except SQLAlchemyError:
+        logger.exception("Error guardando la marca de lectura")
+        writer.send_text(json.dumps({"error": "No se pudo marcar como leído"}))
+        return
+    await manager.broadcast(
+        room_id, json.dumps({"type": "read", "user_id": user_id, "message_id": watermark})
+    )
+
+
 @router.websocket("/chat/{room_id}")
 async def websocket_chat(
     websocket: WebSocket,
@@ -51,9 +88,17 @@ async def websocket_chat(
     Client sends:  {"receiver_id": 3, "content": "Hello!"}
     Server broadcasts: {"id": 1, "sender_id": 1, "receiver_id": 3,
                         "content": "Hello!", "timestamp": "...", "is_read": false}
+
+    Read watermark: the client sends {"type": "read", "message_id": 7} to
+    mark everything up to message 7 as read, and the room gets
+    {"type": "read", "user_id": 1, "message_id": 7}.
+
+    Keepalive: the server sends {"type": "ping"} to idle sockets and closes
+    them if nothing arrives within WS_PONG_TIMEOUT_SECONDS; clients answer
+    {"type": "pong"}.
     """
     # --- Authentication ---
-    current_user = _authenticate(token)
+    current_user = await run_in_threadpool(_authenticate, token)
     if current_user is None or not current_user.is_active:
         await websocket.close(code=1008)
         return
@@ -71,23 +116,33 @@ async def websocket_chat(
     if current_user.id not in (id_a, id_b):
         await websocket.close(code=1008)
         return
+    other_user_id = id_b if current_user.id == id_a else id_a
 
     # --- Connect ---
-    await manager.connect(websocket, room_id)
+    writer = await manager.connect(websocket, room_id)
 
-    db = SessionLocal()
+    # No DB session is held while the socket is open: each query opens and
+    # closes its own in the threadpool. Receivers already checked are
+    # remembered for the life of the socket.
+    known_receivers: set[int] = set()
     try:
         while True:
             raw = await websocket.receive_text()
+            heartbeat.touch(writer)
 
             try:
                 data = json.loads(raw)
+                if data.get("type") == PONG_TYPE:
+                    continue
+                if data.get("type") == "read":
+                    await _read_up_to(writer, room_id, current_user.id, other_user_id, int(data["message_id"]))
+                    continue
                 receiver_id = int(data["receiver_id"])
                 content = str(data["content"]).strip()
                 if not content:
                     raise ValueError("empty content")
-            except (KeyError, ValueError, TypeError):
-                await websocket.send_text(
+            except (KeyError, ValueError, TypeError, AttributeError):
+                writer.send_text(
                     json.dumps(
                         {
                             "error": 'Formato inválido. Usa {"receiver_id": int, "content": str}'
@@ -97,42 +152,38 @@ async def websocket_chat(
                 continue
 
             if receiver_id == current_user.id:
-                await websocket.send_text(
+                writer.send_text(
                     json.dumps({"error": "No puedes enviarte un mensaje a ti mismo"})
                 )
                 continue
 
-            receiver = UserService.get_user_by_id(db, receiver_id)
-            if not receiver:
-                await websocket.send_text(
-                    json.dumps({"error": "Usuario receptor no existe"})
-                )
+            if receiver_id not in known_receivers:
+                if not await run_in_threadpool(_user_exists, receiver_id):
+                    writer.send_text(
+                        json.dumps({"error": "Usuario receptor no existe"})
+                    )
+                    continue
+                known_receivers.add(receiver_id)
+
+            # Persist (group commit with other rooms' messages)
+            try:
+                msg = await message_writer.submit(current_user.id, receiver_id, content)
+            except Exception:
+                logger.exception("Error guardando mensaje de chat")
+                writer.send_text(json.dumps({"error": "No se pudo enviar el mensaje"}))
                 continue
 
-            # Persist
-            msg = MessageService.create_message(
-                db,
-                sender_id=current_user.id,
-                message_data=MessageCreate(receiver_id=receiver_id, content=content),
-            )
-
-            # Broadcast to room
-            payload = json.dumps(
-                {
-                    "id": msg.id,
-                    "sender_id": msg.sender_id,
-                    "receiver_id": msg.receiver_id,
-                    "content": msg.content,
-                    "timestamp": msg.timestamp.isoformat(),
-                    "is_read": msg.is_read,
-                }
-            )
+            # Broadcast to room, only once it is committed
+            payload = json.dumps({**msg, "timestamp": msg["timestamp"].isoformat()})
             await manager.broadcast(room_id, payload)
 
     except WebSocketDisconnect:
-        manager.disconnect(websocket, room_id)
+        pass
+    except RuntimeError:
+        if not closed_by_server(websocket):
+            raise
     finally:
-        db.close()
+        manager.disconnect(websocket, room_id)
 
 
 @router.websocket("/user/{user_id}")
@@ -141,7 +192,7 @@ async def websocket_user(
     user_id: int,
     token: str = Query(...),
 ):
-    current_user = _authenticate(token)
+    current_user = await run_in_threadpool(_authenticate, token)
     if current_user is None or not current_user.is_active:
         await websocket.close(code=1008)
         return
@@ -150,10 +201,11 @@ async def websocket_user(
         await websocket.close(code=1008)
         return
 
-    await user_manager.connect(websocket, user_id)
+    writer = await user_manager.connect(websocket, user_id)
     try:
         while True:
             raw = await websocket.receive_text()
+            heartbeat.touch(writer)
             try:
                 data = json.loads(raw)
                 if data.get("type") == "emoji":
@@ -167,7 +219,12 @@ async def websocket_user(
                         }
                     )
                     await user_manager.send_to_user(receiver_id, payload)
-            except (KeyError, ValueError, TypeError):
+            except (KeyError, ValueError, TypeError, AttributeError):
                 pass
     except WebSocketDisconnect:
+        pass
+    except RuntimeError:
+        if not closed_by_server(websocket):
+            raise
+    finally:
         user_manager.disconnect(websocket, user_id)
@@ -0,0 +1,67 @@
+import json
+from datetime import datetime
+from typing import Any, List, Optional, Union
+
+import msgpack
+
+# Wire formats a presence client can ask for with ?format=
+JSON = "json"
+MSGPACK = "msgpack"
+FORMATS = (JSON, MSGPACK)
+
+# Coordinates travel as integers in millionths of a degree (~0.1 m)
+COORD_SCALE = 1_000_000
+
+Encoded = Union[str, bytes]
+
+
+def negotiate(requested: Optional[str]) -> str:
+    """The format to use for a client; anything unknown gets JSON."""
+    return requested if requested in FORMATS else JSON
+
+
+def encode(message: Any, fmt: str) -> Encoded:
+    """Serialise a whole frame: a text frame for JSON, binary for msgpack."""
+    if fmt == MSGPACK:
+        return msgpack.packb(message)
+    return json.dumps(message, separators=(",", ":"))
+
+
+def encode_update(update: dict, fmt: str) -> Encoded:
+    """
+    Serialise one position update for embedding in an "updates" frame.
+
+    JSON keeps the dict as is. msgpack uses a fixed array
+    [user_id, username, lat_e6, lng_e6, updated_at_ms]: coordinates scaled
+    by COORD_SCALE and the timestamp in epoch milliseconds.
+    """
+    if fmt == MSGPACK:
+        return msgpack.packb([
+            update["user_id"],
+            update["username"],
+            round(update["lat"] * COORD_SCALE),
+            round(update["lng"] * COORD_SCALE),
+            int(datetime.fromisoformat(update["updated_at"]).timestamp() * 1000),
+        ])
+    return json.dumps(update, separators=(",", ":"))
+
+
+def updates_frame(encoded: List[Encoded], seq: Optional[int], fmt: str) -> Encoded:
+    """
+    An "updates" frame built from already-encoded updates, so each update
+    is serialised once per worker however many recipients it has.
+    """
+    if fmt == MSGPACK:
+        packer = msgpack.Packer()
+        fields = 3 if seq is not None else 2
+        parts = [
+            packer.pack_map_header(fields),
+            packer.pack("type"), packer.pack("updates"),
+            packer.pack("updates"), packer.pack_array_header(len(encoded)),
+            *encoded,
+        ]
+        if seq is not None:
+            parts += [packer.pack("seq"), packer.pack(seq)]
+        return b"".join(parts)
+    tail = f',"seq":{seq}' if seq is not None else ""
+    return '{"type":"updates","updates":[' + ",".join(encoded) + "]" + tail + "}"
@@ -0,0 +1,157 @@
+import asyncio
+import inspect
+import logging
+import math
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Union
+
+from app.core.config import settings
+from app.websocket.outbound import SocketWriter
+
+logger = logging.getLogger(__name__)
+
+# Application-level keepalive frames (JSON text, or msgpack for presence)
+PING = {"type": "ping"}
+PONG_TYPE = "pong"
+
+IDLE_CLOSE_CODE = 1001  # "Going Away"
+
+OnReap = Callable[[], Union[None, Awaitable[None]]]
+
+
+class Heartbeat:
+    """
+    Application-level ping/pong and idle-connection reaper for every
+    WebSocket, so dead TCP connections do not linger in the managers
+    until a send happens to fail.
+
+    Endpoints register each socket's writer with a ping function and an
+    on_reap callback that unregisters it from its manager, and call
+    touch() whenever the client sends anything (a "pong" included).
+    A socket idle for WS_PING_INTERVAL_SECONDS gets a ping; if it is
+    still silent WS_PONG_TIMEOUT_SECONDS later it is reaped: the writer
+    closes it and on_reap runs, without waiting for the endpoint's
+    receive loop, which can hang on a dead peer.
+
+    Deadlines live in a timing wheel of WS_HEARTBEAT_TICK_SECONDS slots.
+    touch() moves a socket to its new slot in O(1) and each tick only
+    visits the sockets that are due, so the cost is O(due) however many
+    sockets are connected.
+    """
+
+    def __init__(
+        self,
+        ping_interval: Optional[float] = None,
+        pong_timeout: Optional[float] = None,
+        tick: Optional[float] = None,
+    ) -> None:
+        self.ping_interval = ping_interval or settings.WS_PING_INTERVAL_SECONDS
+        self.pong_timeout = pong_timeout or settings.WS_PONG_TIMEOUT_SECONDS
+        self.tick = tick or settings.WS_HEARTBEAT_TICK_SECONDS
+        size = math.ceil(max(self.ping_interval, self.pong_timeout) / self.tick) + 1
+        self._wheel: List[Set[SocketWriter]] = [set() for _ in range(size)]
+        # Ticks elapsed since start; slot of tick t is t % len(wheel)
+        self._now = 0
+        # writer -> {"due": tick, "pinged": bool, "ping": fn, "on_reap": fn}
+        self._sockets: Dict[SocketWriter, Dict[str, Any]] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._reaps: Set[asyncio.Task] = set()
+        self.counters = {
+            "registered": 0,
+            "pings": 0,
+            "reaped": 0,
+        }
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    def register(self, writer: SocketWriter, ping: Callable[[], Any], on_reap: OnReap) -> None:
+        self._sockets[writer] = {"due": None, "pinged": False, "ping": ping, "on_reap": on_reap}
+        self.counters["registered"] += 1
+        self._schedule(writer, self.ping_interval)
+
+    def unregister(self, writer: SocketWriter) -> None:
+        state = self._sockets.pop(writer, None)
+        if state is not None:
+            self._wheel[state["due"] % len(self._wheel)].discard(writer)
+
+    def touch(self, writer: SocketWriter) -> None:
+        """The client sent something: it is alive until ping_interval from now."""
+        state = self._sockets.get(writer)
+        if state is None:
+            return
+        state["pinged"] = False
+        self._schedule(writer, self.ping_interval)
+
+    def _schedule(self, writer: SocketWriter, delay: float) -> None:
+        state = self._sockets[writer]
+        due = self._now + max(1, math.ceil(delay / self.tick))
+        if due == state["due"]:
+            return
+        if state["due"] is not None:
+            self._wheel[state["due"] % len(self._wheel)].discard(writer)
+        state["due"] = due
+        self._wheel[due % len(self._wheel)].add(writer)
+
+    async def _run(self) -> None:
+        next_tick = time.monotonic()
+        while True:
+            next_tick += self.tick
+            await asyncio.sleep(max(0.0, next_tick - time.monotonic()))
+            try:
+                self.advance()
+            except Exception:
+                logger.exception("Error in WebSocket heartbeat tick")
+
+    def advance(self) -> None:
+        """Move the wheel one tick: ping or reap the sockets that are due."""
+        self._now += 1
+        slot = self._now % len(self._wheel)
+        due, self._wheel[slot] = self._wheel[slot], set()
+        for writer in due:
+            state = self._sockets[writer]
+            state["due"] = None
+            if writer.closed:
+                self._reap(writer)
+            elif not state["pinged"]:
+                state["pinged"] = True
+                self.counters["pings"] += 1
+                state["ping"]()
+                self._schedule(writer, self.pong_timeout)
+            else:
+                self._reap(writer)
+
+    def _reap(self, writer: SocketWriter) -> None:
+        state = self._sockets.pop(writer)
+        self.counters["reaped"] += 1
+        logger.info("Reaping idle WebSocket")
+        writer.evict("idle", code=IDLE_CLOSE_CODE)
+        try:
+            result = state["on_reap"]()
+            if inspect.isawaitable(result):
+                task = asyncio.ensure_future(result)
+                self._reaps.add(task)
+                task.add_done_callback(self._reaps.discard)
+        except Exception:
+            logger.exception("Error unregistering reaped WebSocket")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "live": len(self._sockets),
+            **self.counters,
+        }
+
+
+# Module-level singleton shared by every WebSocket endpoint
+heartbeat = Heartbeat()
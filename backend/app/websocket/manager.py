@@ -1,32 +1,57 @@
-from typing import Dict, List
+import json
+from typing import Any, Dict, List
 from fastapi import WebSocket
 
+from app.websocket.backplane import ROOM_CHANNEL, Backplane, backplane as default_backplane
+from app.websocket.heartbeat import PING, heartbeat
+from app.websocket.outbound import SocketWriter
+
 
 class ConnectionManager:
     """
     Manages active WebSocket connections grouped by room_id.
 
-    Each room_id maps to a list of WebSocket instances that are
-    currently connected to that chat room. Supports connect,
-    disconnect, and broadcast operations.
+    Each room_id maps to the SocketWriters of the connections that are
+    currently in that chat room. Supports connect, disconnect, and
+    broadcast operations. Every connection has its own bounded outbound
+    queue (see app.websocket.outbound), so a slow client never delays the
+    others.
+
+    Broadcasts go through the backplane, so members of a room connected to
+    other workers receive them too. Connections are registered with the
+    heartbeat, which pings idle ones and disconnects those that stop
+    answering.
     """
 
-    def __init__(self) -> None:
-        # Maps room_id -> list of active WebSocket connections
-        self.active_connections: Dict[str, List[WebSocket]] = {}
+    def __init__(self, backplane: Backplane = default_backplane) -> None:
+        # Maps room_id -> writers of the active WebSocket connections
+        self.active_connections: Dict[str, List[SocketWriter]] = {}
+        self.backplane = backplane
+        backplane.subscribe(ROOM_CHANNEL, self._on_room_message)
 
-    async def connect(self, websocket: WebSocket, room_id: str) -> None:
+    async def connect(self, websocket: WebSocket, room_id: str) -> SocketWriter:
         """
         Accept a new WebSocket connection and register it under room_id.
 
         Args:
             websocket: The incoming WebSocket connection to accept.
             room_id:   The chat room identifier (format: '{min_id}_{max_id}').
+
+        Returns:
+            The connection's SocketWriter. Replies to this client must be
+            sent through it, never directly on the socket.
         """
         await websocket.accept()
+        writer = SocketWriter(websocket).start()
         if room_id not in self.active_connections:
             self.active_connections[room_id] = []
-        self.active_connections[room_id].append(websocket)
+        self.active_connections[room_id].append(writer)
+        heartbeat.register(
+            writer,
+            ping=lambda: writer.send_text(json.dumps(PING)),
+            on_reap=lambda: self.disconnect(websocket, room_id),
+        )
+        return writer
 
     def disconnect(self, websocket: WebSocket, room_id: str) -> None:
         """
@@ -40,30 +65,32 @@ class ConnectionManager:
             room_id:   The chat room identifier the socket belonged to.
         """
         if room_id in self.active_connections:
-            try:
-                self.active_connections[room_id].remove(websocket)
-            except ValueError:
-                pass  # Already removed; safe to ignore
-            if not self.active_connections[room_id]:
+            writers = self.active_connections[room_id]
+            for writer in [w for w in writers if w.websocket is websocket]:
+                writer.stop()
+                heartbeat.unregister(writer)
+                writers.remove(writer)
+            if not writers:
                 del self.active_connections[room_id]
 
     async def broadcast(self, room_id: str, message_json: str) -> None:
         """
-        Send a JSON string to every active connection in the given room.
+        Publish a JSON string to every connection in the given room, on
+        any worker.
 
-        Connections that fail to receive the message are silently skipped
-        so that one broken socket does not interrupt delivery to others.
+        Returns without waiting for delivery. Connections whose queue is
+        full drop the message (and are evicted if it stays full).
 
         Args:
             room_id:      The chat room to broadcast to.
             message_json: A JSON-serialised string to send as text.
         """
-        connections = self.active_connections.get(room_id, [])
-        for connection in connections:
-            try:
-                await connection.send_text(message_json)
-            except Exception:
-                pass  # Connection may have closed between iteration steps
+        await self.backplane.publish(ROOM_CHANNEL, {"room_id": room_id, "message": message_json})
+
+    def _on_room_message(self, data: Dict[str, Any]) -> None:
+        """Queue a backplane room message on this worker's sockets in the room."""
+        for writer in list(self.active_connections.get(data["room_id"], [])):
+            writer.send_text(data["message"])
 
 
 # Module-level singleton used by the chat endpoint
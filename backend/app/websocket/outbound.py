@@ -0,0 +1,231 @@
+import asyncio
+import logging
+import time
+from typing import Any, Callable, Hashable, List, Optional
+
+from fastapi import WebSocket
+from starlette.websockets import WebSocketState
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Close code for clients evicted for not keeping up (RFC 6455 "Try Again Later")
+EVICTED_CLOSE_CODE = 1013
+
+# Process-wide counters, reported by the stats endpoints
+counters = {
+    "queued": 0,
+    "sent": 0,
+    "dropped": 0,
+    "evicted": 0,
+    "conflated": 0,
+}
+
+
+def closed_by_server(websocket: WebSocket) -> bool:
+    """
+    True if our side already closed the socket, e.g. a writer evicted it.
+    Receiving on such a socket raises RuntimeError instead of
+    WebSocketDisconnect, and endpoints should treat it as a disconnect.
+    """
+    return websocket.application_state == WebSocketState.DISCONNECTED
+
+
+def _frame_kind(frame: Any) -> str:
+    if isinstance(frame, bytes):
+        return "bytes"
+    return "text" if isinstance(frame, str) else "json"
+
+
+class SocketWriter:
+    """
+    Bounded outbound queue for one WebSocket, drained by its own task.
+
+    Managers enqueue with send_json/send_text, which never block, so a
+    slow client only delays its own messages. Every send is bounded by
+    WS_SEND_TIMEOUT_SECONDS. The socket is closed with code 1013 and
+    stops accepting messages ("evicted") when a send times out or when
+    its queue stays full for WS_QUEUE_FULL_GRACE_SECONDS, counted from
+    when it filled up whether or not more messages arrive; messages that
+    do not fit in the queue meanwhile are dropped. The endpoint's receive
+    loop then sees the disconnect and unregisters the socket as usual.
+
+    All messages to a socket must go through its writer so that two tasks
+    never write to the same socket at once.
+
+    send_keyed adds a latest-value-wins mailbox on top of the queue: a new
+    message for a key that is still pending replaces the old one, so a
+    backlogged client gets only the newest state per key and the mailbox
+    never holds more entries than there are keys. The pending entries are
+    sent, rendered by render_mailbox into one or more frames, when the
+    writer reaches the single marker the first keyed send put in the
+    queue (or, if the queue was full, the writer put there as soon as it
+    had room); ordering with the plain messages is kept. render_mailbox may
+    return dicts (sent as JSON), str (text frames) or bytes (binary frames).
+    """
+
+    def __init__(
+        self,
+        websocket: WebSocket,
+        maxsize: Optional[int] = None,
+        send_timeout: Optional[float] = None,
+        full_grace: Optional[float] = None,
+        render_mailbox: Optional[Callable[[List[Any]], List[Any]]] = None,
+    ) -> None:
+        self.websocket = websocket
+        self.send_timeout = send_timeout or settings.WS_SEND_TIMEOUT_SECONDS
+        self.full_grace = full_grace if full_grace is not None else settings.WS_QUEUE_FULL_GRACE_SECONDS
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize or settings.WS_SEND_QUEUE_SIZE)
+        self._task: Optional[asyncio.Task] = None
+        # When the queue filled up; cleared once the writer takes an item
+        self._full_since: Optional[float] = None
+        self._full_timer: Optional[asyncio.TimerHandle] = None
+        self._close_task: Optional[asyncio.Task] = None
+        # key -> newest pending message; drained when the marker is reached
+        self._mailbox: dict = {}
+        self._mailbox_scheduled = False
+        self._render_mailbox = render_mailbox or (lambda values: values)
+        self.closed = False
+
+    def start(self) -> "SocketWriter":
+        self._task = asyncio.create_task(self._run())
+        return self
+
+    def send_json(self, message: Any) -> bool:
+        """Queue a JSON message. Returns False if it was dropped."""
+        return self._put(("json", message))
+
+    def send_text(self, text: str) -> bool:
+        """Queue a text frame. Returns False if it was dropped."""
+        return self._put(("text", text))
+
+    def send_bytes(self, data: bytes) -> bool:
+        """Queue a binary frame. Returns False if it was dropped."""
+        return self._put(("bytes", data))
+
+    def send_keyed(self, key: Hashable, message: Any) -> bool:
+        """
+        Queue a JSON message that supersedes any pending one with the same
+        key. Returns False only if the writer is closed.
+        """
+        if self.closed:
+            return False
+        if key in self._mailbox:
+            counters["conflated"] += 1
+        self._mailbox[key] = message
+        self._schedule_mailbox()
+        return True
+
+    def _schedule_mailbox(self) -> None:
+        """
+        Queue the marker for pending keyed messages, once. If the queue is
+        full, _run retries as soon as it takes an item out.
+        """
+        if self._mailbox and not self._mailbox_scheduled and self._put(("mailbox", None)):
+            self._mailbox_scheduled = True
+
+    def _put(self, item: tuple) -> bool:
+        if self.closed:
+            return False
+        try:
+            self._queue.put_nowait(item)
+        except asyncio.QueueFull:
+            counters["dropped"] += 1
+            self._mark_full()
+            if time.monotonic() - self._full_since >= self.full_grace:
+                self.evict("send queue full")
+            return False
+        counters["queued"] += 1
+        if self._queue.full():
+            self._mark_full()
+        return True
+
+    def _mark_full(self) -> None:
+        """Start the grace period, and its deadline, when the queue fills up."""
+        if self._full_since is None:
+            self._full_since = time.monotonic()
+            self._full_timer = asyncio.get_running_loop().call_later(self.full_grace, self._full_deadline)
+
+    def _clear_full(self) -> None:
+        self._full_since = None
+        if self._full_timer is not None:
+            self._full_timer.cancel()
+            self._full_timer = None
+
+    def _full_deadline(self) -> None:
+        # Still full: the writer has not taken an item out since it filled up
+        self._full_timer = None
+        if self._full_since is not None:
+            self.evict("send queue full")
+
+    async def _run(self) -> None:
+        while True:
+            kind, payload = await self._queue.get()
+            self._clear_full()
+            if kind == "mailbox":
+                values = list(self._mailbox.values())
+                self._mailbox.clear()
+                self._mailbox_scheduled = False
+                frames = [(_frame_kind(frame), frame) for frame in self._render_mailbox(values)]
+            else:
+                frames = [(kind, payload)]
+                # There is room now for a marker that did not fit earlier
+                self._schedule_mailbox()
+            for frame_kind, frame in frames:
+                if not await self._send(frame_kind, frame):
+                    return
+
+    async def _send(self, kind: str, payload: Any) -> bool:
+        if kind == "json":
+            send = self.websocket.send_json
+        elif kind == "bytes":
+            send = self.websocket.send_bytes
+        else:
+            send = self.websocket.send_text
+        try:
+            await asyncio.wait_for(send(payload), self.send_timeout)
+        except asyncio.TimeoutError:
+            self.evict("send timeout")
+            return False
+        except Exception:
+            # Connection already broken; the endpoint will clean up
+            self.closed = True
+            return False
+        counters["sent"] += 1
+        return True
+
+    def evict(self, reason: str, code: int = EVICTED_CLOSE_CODE) -> None:
+        """Stop sending and close the socket without waiting for it."""
+        if self.closed:
+            return
+        self.closed = True
+        counters["evicted"] += 1
+        logger.warning(f"Evicting WebSocket client: {reason}")
+        self._cancel()
+        # Keep a reference so the task is not garbage collected mid-close
+        self._close_task = asyncio.create_task(self._close(code, reason))
+
+    async def _close(self, code: int, reason: str) -> None:
+        try:
+            await asyncio.wait_for(self.websocket.close(code=code, reason=reason), self.send_timeout)
+        except Exception:
+            pass
+
+    async def close(self, code: int = 1000, reason: str = "") -> None:
+        """Stop the writer and close the socket (e.g. replaced by a new one)."""
+        self.stop()
+        await self._close(code, reason)
+
+    def stop(self) -> None:
+        """Stop the writer; pending messages are discarded."""
+        self.closed = True
+        self._cancel()
+
+    def _cancel(self) -> None:
+        self._clear_full()
+        if self._task is not None and self._task is not asyncio.current_task():
+            self._task.cancel()
+        while not self._queue.empty():
+            self._queue.get_nowait()
+        self._mailbox.clear()
@@ -1,11 +1,17 @@
 import logging
+from typing import Optional
 from sqlalchemy import or_
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Query
+from fastapi.concurrency import run_in_threadpool
 
+from app.core.config import settings
 from app.core.database import SessionLocal
 from app.core.security import decode_access_token
 from app.services.user_service import UserService
 from app.models.friendship import Friendship, FriendshipStatus
+from app.websocket import compact
+from app.websocket.heartbeat import PONG_TYPE
+from app.websocket.outbound import closed_by_server
 from app.websocket.presence_manager import presence_manager
 
 logger = logging.getLogger(__name__)
@@ -14,7 +20,7 @@ router = APIRouter(prefix="/ws", tags=["WebSocket"])
 
 
 def _authenticate(token: str):
-    """Returns User or None."""
+    """Returns User or None. Blocking: call it off the event loop."""
     payload = decode_access_token(token)
     if payload is None:
         return None
@@ -30,7 +36,7 @@ def _authenticate(token: str):
 
 
 def _get_friend_ids(user_id: int) -> set[int]:
-    """Devuelve los IDs de amigos aceptados del usuario."""
+    """Devuelve los IDs de amigos aceptados del usuario (bloqueante: en el threadpool)."""
     db = SessionLocal()
     try:
         rows = db.query(Friendship).filter(
@@ -49,32 +55,98 @@ def _get_friend_ids(user_id: int) -> set[int]:
         db.close()
 
 
+def _nearby_reply(user_id: int, data: dict) -> dict:
+    """
+    Responde a un mensaje "nearby": amigos dentro de un radio alrededor de
+    la posición actual del usuario (o de lat/lng si se indican), o dentro
+    de un rectángulo "bbox": [south, west, north, east].
+    """
+    friend_ids = presence_manager.get_friend_ids(user_id) or set()
+
+    if data.get("bbox") is not None:
+        try:
+            south, west, north, east = (float(v) for v in data["bbox"])
+        except (TypeError, ValueError):
+            return {"error": "bbox inválido"}
+        if not (-90 <= south <= north <= 90) or not (-180 <= west <= 180 and -180 <= east <= 180):
+            return {"error": "bbox fuera de rango"}
+        friends = presence_manager.friends_in_bbox(friend_ids, south, west, north, east)
+        return {"type": "nearby", "bbox": [south, west, north, east], "friends": friends}
+
+    try:
+        radius = float(data.get("radius", 1000))
+    except (TypeError, ValueError):
+        return {"error": "radius inválido"}
+    if not (0 < radius <= settings.PRESENCE_NEARBY_MAX_RADIUS):
+        return {"error": "radius fuera de rango"}
+
+    if data.get("lat") is not None and data.get("lng") is not None:
+        try:
+            center = (float(data["lat"]), float(data["lng"]))
+        except (TypeError, ValueError):
+            return {"error": "lat/lng inválidos"}
+    else:
+        center = presence_manager.get_position(user_id)
+        if center is None:
+            return {"error": "Sin posición actual"}
+
+    friends = presence_manager.friends_within(friend_ids, center[0], center[1], radius)
+    return {"type": "nearby", "radius": radius, "friends": friends}
+
+
 @router.websocket("/presence")
 async def websocket_presence(
     websocket: WebSocket,
     token: str = Query(...),
+    since: Optional[int] = Query(None),
+    fmt: str = Query(compact.JSON, alias="format"),
 ):
     """
     WebSocket endpoint for live presence and location sharing.
 
     Auth:  ?token=<jwt>
-
-    Client sends: {"type": "location", "lat": float, "lng": float}
+    Resume: ?since=<seq>, the last "seq" received; the server replays only
+            the missed events, or sends a full snapshot if it cannot
+    Format: ?format=json (default) | msgpack. With msgpack every server
+            frame is a binary msgpack map with the same keys as below,
+            except that each entry of "updates" is the array
+            [user_id, username, lat_e6, lng_e6, updated_at_ms]
+            (coordinates in millionths of a degree, epoch milliseconds).
+            Client messages are JSON in both cases.
+
+    Client sends:
+      - {"type": "location", "lat": float, "lng": float}
+      - {"type": "nearby", "radius": float, ["lat": float, "lng": float]}
+        (centre defaults to the last position sent on this socket)
+      - {"type": "nearby", "bbox": [south, west, north, east]}
+      - {"type": "pong"}, in reply to "ping"
 
     Server sends:
-      - {"type": "snapshot", "friends": [{user_id, username, lat, lng, updated_at}, ...]}
-      - {"type": "update", "user_id", "username", "lat", "lng", "updated_at"}
+      - {"type": "snapshot", "seq", "friends": [{user_id, username, lat, lng, updated_at}, ...]}
+      - {"type": "updates", "updates": [{user_id, username, lat, lng, updated_at}, ...]}
+        at most once per PRESENCE_TICK_SECONDS, with the newest position of
+        every friend that moved since the previous one
       - {"type": "offline", "user_id"}
+        "updates"/"offline" frames may carry "seq": everything up to it has
+        been delivered
+      - {"type": "nearby", "radius" | "bbox", "friends": [...]}, in reply to
+        "nearby"; radius queries add "distance_m" and are sorted by it
+      - {"type": "ping"} when the socket has been idle; without any message
+        back within WS_PONG_TIMEOUT_SECONDS the socket is closed
     """
     # --- Auth ---
-    current_user = _authenticate(token)
+    current_user = await run_in_threadpool(_authenticate, token)
     if current_user is None or not current_user.is_active:
         await websocket.close(code=1008)
         return
 
     await websocket.accept()
 
-    friend_ids = _get_friend_ids(current_user.id)
+    # Si ya estaba conectado a este worker, su conjunto de amigos está al
+    # día (friendship_changed): no hace falta volver a la BD
+    friend_ids = presence_manager.get_friend_ids(current_user.id)
+    if friend_ids is None:
+        friend_ids = await run_in_threadpool(_get_friend_ids, current_user.id)
 
     # Registrar en el manager
     await presence_manager.connect(
@@ -83,36 +155,51 @@ async def websocket_presence(
         websocket=websocket,
         friend_ids=friend_ids,
         share_location=current_user.share_location,
+        fmt=compact.negotiate(fmt),
     )
 
-    # Enviar snapshot inicial de amigos online
-    snapshot = await presence_manager.get_snapshot_for(current_user.id)
-    await websocket.send_json({"type": "snapshot", "friends": snapshot})
+    # Reanudar desde since o, si no se puede, snapshot inicial de amigos online
+    if since is None or not presence_manager.resume(current_user.id, since):
+        snapshot = await presence_manager.get_snapshot_for(current_user.id)
+        presence_manager.send(current_user.id, {
+            "type": "snapshot",
+            "seq": presence_manager.get_seq(current_user.id),
+            "friends": snapshot,
+        })
 
     try:
         while True:
             data = await websocket.receive_json()
+            presence_manager.touch(current_user.id)
+            if data.get("type") == PONG_TYPE:
+                continue
+            if data.get("type") == "nearby":
+                presence_manager.send(current_user.id, _nearby_reply(current_user.id, data))
+                continue
             if data.get("type") != "location":
-                await websocket.send_json({"error": "Tipo desconocido"})
+                presence_manager.send(current_user.id, {"error": "Tipo desconocido"})
                 continue
 
             try:
                 lat = float(data["lat"])
                 lng = float(data["lng"])
             except (KeyError, TypeError, ValueError):
-                await websocket.send_json({"error": "lat/lng inválidos"})
+                presence_manager.send(current_user.id, {"error": "lat/lng inválidos"})
                 continue
 
             # Validación básica de rangos
             if not (-90 <= lat <= 90) or not (-180 <= lng <= 180):
-                await websocket.send_json({"error": "lat/lng fuera de rango"})
+                presence_manager.send(current_user.id, {"error": "lat/lng fuera de rango"})
                 continue
 
             await presence_manager.update_location(current_user.id, lat, lng)
 
     except WebSocketDisconnect:
         pass
+    except RuntimeError:
+        if not closed_by_server(websocket):
+            raise
     finally:
-        ids = presence_manager.disconnect(current_user.id)
-        if ids:
-            await presence_manager.notify_offline(current_user.id, ids)
+        # Aunque no tenga amigos: los demás workers deben olvidar su posición
+        if presence_manager.disconnect(current_user.id, websocket) is not None:
+            await presence_manager.notify_offline(current_user.id)
@@ -1,12 +1,112 @@
+import asyncio
+import logging
+import random
+import time
+from collections import deque
 from datetime import datetime
-from typing import Optional
+from functools import partial
+from typing import Any, Optional
 from fastapi import WebSocket
 
+from app.core.config import settings
+from app.core.geo import haversine_m
+from app.services.position_recorder import position_recorder
+from app.websocket import compact, outbound
+from app.websocket.heartbeat import PING, heartbeat
+from app.websocket.backplane import PRESENCE_CHANNEL, Backplane, backplane as default_backplane
+from app.websocket.outbound import SocketWriter
+from app.websocket.spatial_index import SpatialGrid
+
+logger = logging.getLogger(__name__)
+
 
 class PresenceManager:
-    def __init__(self):
-        # user_id -> dict
+    """
+    Usuarios online del WebSocket de presencia y difusión de sus posiciones.
+
+    Las posiciones no se reenvían al llegar: update_location guarda la más
+    reciente de cada usuario y, cada PRESENCE_TICK_SECONDS, flush() manda a
+    cada amigo online un único mensaje "updates" con todas las posiciones
+    nuevas de sus amigos. Los movimientos de menos de
+    PRESENCE_MIN_MOVE_METERS respecto a la última posición difundida se
+    consideran ruido del GPS y no se difunden (sí se guardan).
+
+    Posiciones y "offline" van al buzón de cada destinatario con clave el
+    amigo (SocketWriter.send_keyed): si el socket va retrasado, lo
+    pendiente de un amigo se sustituye por lo último, así que un cliente
+    lento recibe el estado actual en un solo envío y la memoria por
+    destinatario está acotada por su número de amigos.
+
+    Con varios workers, cada tick se publica en el backplane y cada worker
+    (también el que publica) guarda las posiciones en _positions/_index y
+    las entrega a sus sockets locales que sigan a ese usuario (_watchers).
+    Así las consultas "nearby" ven a los amigos conectados a otro worker.
+
+    Cada destinatario tiene una sesión con un número de secuencia que crece
+    con cada evento que se le entrega y un buffer de los últimos
+    PRESENCE_RESUME_BUFFER eventos. Al desconectarse, la sesión se conserva
+    PRESENCE_RESUME_GRACE_SECONDS (_detached) y sigue acumulando eventos,
+    de modo que al reconectar con ?since=<seq> basta con reenviar los que
+    se perdió (resume) en vez del snapshot completo.
+
+    Cada conexión elige formato (compact.JSON o compact.MSGPACK). Cada
+    posición se serializa una vez por formato (_encoded) y los mensajes
+    "updates" se montan concatenando esos trozos, sin volver a serializar
+    por destinatario.
+    """
+
+    def __init__(self, backplane: Backplane = default_backplane):
+        # user_id -> dict, sólo conexiones de este worker
         self._connections: dict[int, dict] = {}
+        # Posiciones de los usuarios que comparten ubicación en cualquier
+        # worker: user_id -> vista de amigo, y su índice espacial
+        self._positions: dict[int, dict] = {}
+        self._index = SpatialGrid(settings.PRESENCE_GRID_CELL_METERS)
+        # amigo -> usuarios de este worker (conectados o en _detached) que
+        # reciben sus mensajes
+        self._watchers: dict[int, set[int]] = {}
+        # user_id -> entrada de una conexión cerrada, reanudable hasta expires_at
+        self._detached: dict[int, dict] = {}
+        # user_id -> (posición, {formato: posición serializada})
+        self._encoded: dict[int, tuple[dict, dict[str, compact.Encoded]]] = {}
+        # user_id -> último mensaje de posición pendiente de difundir
+        self._pending: dict[int, dict] = {}
+        self._task: Optional[asyncio.Task] = None
+        self.counters = {
+            "locations_received": 0,
+            "dropped_jitter": 0,
+            "coalesced": 0,
+            "updates_flushed": 0,
+            "deliveries": 0,
+            "resumed": 0,
+            "resume_fallbacks": 0,
+        }
+        self.backplane = backplane
+        backplane.subscribe(PRESENCE_CHANNEL, self._on_message)
+
+    def start(self) -> None:
+        """Arranca el tick de difusión (desde el lifespan de la app)."""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(settings.PRESENCE_TICK_SECONDS)
+            try:
+                self._expire_detached()
+                await self.flush()
+            except Exception:
+                logger.exception("Error difundiendo posiciones de presencia")
 
     async def connect(
         self,
@@ -15,101 +115,399 @@ class PresenceManager:
         websocket: WebSocket,
         friend_ids: set[int],
         share_location: bool,
+        fmt: str = compact.JSON,
     ) -> None:
-        """Registra un nuevo usuario online. Cierra la conexión previa si existía."""
-        # Si ya estaba conectado, cerrar la anterior
+        """
+        Registra un nuevo usuario online. Cierra la conexión previa si existía.
+        fmt es el formato de los mensajes (compact.negotiate).
+        Todo lo que se envíe a este socket debe pasar por send() (o por su
+        SocketWriter), nunca directamente.
+        """
+        # Si ya estaba conectado, cerrar la anterior; su sesión continúa
         existing = self._connections.get(user_id)
         if existing:
-            try:
-                await existing["websocket"].close(code=1000, reason="reconnected")
-            except Exception:
-                pass
+            heartbeat.unregister(existing["writer"])
+            await existing["writer"].close(code=1000, reason="reconnected")
+        else:
+            existing = self._detached.pop(user_id, None)
+        if existing:
+            self._unwatch(user_id, existing["friend_ids"])
+
+        self._pending.pop(user_id, None)
 
         self._connections[user_id] = {
             "websocket": websocket,
+            "writer": SocketWriter(websocket, render_mailbox=partial(self._render_mailbox, fmt=fmt)).start(),
+            "format": fmt,
             "username": username,
             "lat": None,
             "lng": None,
             "updated_at": None,
+            # Última posición difundida, para el umbral de movimiento
+            "sent_lat": None,
+            "sent_lng": None,
             "friend_ids": friend_ids,
             "share_location": share_location,
+            "session": existing["session"] if existing else self._new_session(),
         }
+        for fid in friend_ids:
+            self._watchers.setdefault(fid, set()).add(user_id)
+
+        writer = self._connections[user_id]["writer"]
+        ping = compact.encode(PING, fmt)
+        heartbeat.register(
+            writer,
+            ping=lambda: writer.send_bytes(ping) if fmt == compact.MSGPACK else writer.send_text(ping),
+            on_reap=lambda: self._reap(user_id, websocket),
+        )
 
         # Notificar a los amigos online de que estoy online (sin posición aún)
         # No mandamos nada hasta que tengamos posición real
 
-    def disconnect(self, user_id: int) -> Optional[set[int]]:
-        """Quita al usuario y devuelve sus friend_ids para notificar offline."""
-        entry = self._connections.pop(user_id, None)
-        if entry is None:
+    def disconnect(self, user_id: int, websocket: Optional[WebSocket] = None) -> Optional[set[int]]:
+        """
+        Quita al usuario y devuelve sus friend_ids para notificar offline.
+        Si se indica websocket y el usuario ya se ha reconectado con otro,
+        no hace nada (la conexión vieja no debe borrar la nueva).
+        """
+        entry = self._connections.get(user_id)
+        if entry is None or (websocket is not None and entry["websocket"] is not websocket):
             return None
+        del self._connections[user_id]
+        entry["writer"].stop()
+        heartbeat.unregister(entry["writer"])
+        # Que no llegue una posición suya después del "offline"
+        self._pending.pop(user_id, None)
+        position_recorder.forget(user_id)
+        if settings.PRESENCE_RESUME_GRACE_SECONDS > 0:
+            # Sigue recibiendo eventos (sin enviarlos) por si reconecta
+            entry["websocket"] = None
+            entry["writer"] = None
+            entry["expires_at"] = time.monotonic() + settings.PRESENCE_RESUME_GRACE_SECONDS
+            self._detached[user_id] = entry
+        else:
+            self._unwatch(user_id, entry["friend_ids"])
         return entry["friend_ids"]
 
+    async def _reap(self, user_id: int, websocket: WebSocket) -> None:
+        """El heartbeat ha cerrado el socket por inactivo: como un disconnect."""
+        if self.disconnect(user_id, websocket) is not None:
+            await self.notify_offline(user_id)
+
+    def touch(self, user_id: int) -> None:
+        """El cliente ha enviado algo: sigue vivo (ver heartbeat)."""
+        entry = self._connections.get(user_id)
+        if entry is not None:
+            heartbeat.touch(entry["writer"])
+
+    def _expire_detached(self) -> None:
+        now = time.monotonic()
+        expired = [uid for uid, entry in self._detached.items() if entry["expires_at"] <= now]
+        for user_id in expired:
+            entry = self._detached.pop(user_id)
+            self._unwatch(user_id, entry["friend_ids"])
+
+    @staticmethod
+    def _new_session() -> dict:
+        # Empieza en un valor aleatorio: un since de otra sesión (otro
+        # worker, o de antes de reiniciar) cae fuera de rango y recibe el
+        # snapshot completo en vez de deltas ajenos
+        return {
+            "seq": random.randrange(2 ** 52),
+            "events": deque(maxlen=settings.PRESENCE_RESUME_BUFFER),
+        }
+
+    def get_seq(self, user_id: int) -> Optional[int]:
+        """Secuencia del último evento entregado al usuario."""
+        entry = self._connections.get(user_id)
+        return entry["session"]["seq"] if entry is not None else None
+
+    def resume(self, user_id: int, since: int) -> bool:
+        """
+        Reenvía al usuario los eventos posteriores a since (lo último de
+        cada amigo). False si since no es de esta sesión o el buffer ya no
+        llega tan atrás: entonces hay que mandarle el snapshot.
+        """
+        entry = self._connections.get(user_id)
+        if entry is None:
+            return False
+        session = entry["session"]
+        events = session["events"]
+        oldest = events[0][0] if events else session["seq"] + 1
+        if not (oldest - 1 <= since <= session["seq"]):
+            self.counters["resume_fallbacks"] += 1
+            return False
+        for seq, key, message in events:
+            if seq > since:
+                entry["writer"].send_keyed(key, (seq, message))
+        self.counters["resumed"] += 1
+        return True
+
+    def _unwatch(self, user_id: int, friend_ids: set[int]) -> None:
+        for fid in friend_ids:
+            watchers = self._watchers.get(fid)
+            if watchers is None:
+                continue
+            watchers.discard(user_id)
+            if not watchers:
+                del self._watchers[fid]
+
+    def send(self, user_id: int, message: dict) -> bool:
+        """Encola un mensaje para el usuario. False si no está o se descartó."""
+        entry = self._connections.get(user_id)
+        if entry is None:
+            return False
+        if entry["format"] == compact.MSGPACK:
+            return entry["writer"].send_bytes(compact.encode(message, compact.MSGPACK))
+        return entry["writer"].send_json(message)
+
+    def get_friend_ids(self, user_id: int) -> Optional[set[int]]:
+        """friend_ids del usuario si está online, None si no."""
+        entry = self._connections.get(user_id)
+        return entry["friend_ids"] if entry is not None else None
+
+    def get_position(self, user_id: int) -> Optional[tuple[float, float]]:
+        """Última posición compartida del usuario, si está online."""
+        entry = self._connections.get(user_id)
+        if entry is not None and entry["lat"] is not None:
+            return entry["lat"], entry["lng"]
+        return self._index.position(user_id)
+
     async def update_location(
         self, user_id: int, lat: float, lng: float
     ) -> None:
-        """Actualiza posición y difunde a amigos online."""
+        """
+        Actualiza la posición y la deja pendiente de difundir en el
+        siguiente tick, sustituyendo a la que hubiera pendiente.
+        """
         entry = self._connections.get(user_id)
         if entry is None:
             return
         if not entry["share_location"]:
             return  # no compartiendo, ignoramos
 
+        self.counters["locations_received"] += 1
         entry["lat"] = lat
         entry["lng"] = lng
         entry["updated_at"] = datetime.now()
+        position_recorder.record(user_id, lat, lng, entry["updated_at"])
 
-        message = {
-            "type": "update",
-            "user_id": user_id,
-            "username": entry["username"],
-            "lat": lat,
-            "lng": lng,
-            "updated_at": entry["updated_at"].isoformat(),
+        if user_id in self._pending:
+            # Siempre se sustituye: la pendiente ya no es la posición real
+            self.counters["coalesced"] += 1
+        elif entry["sent_lat"] is not None and haversine_m(
+            entry["sent_lat"], entry["sent_lng"], lat, lng
+        ) < settings.PRESENCE_MIN_MOVE_METERS:
+            self.counters["dropped_jitter"] += 1
+            return
+        self._pending[user_id] = self._friend_view(user_id, entry)
+
+    async def flush(self) -> None:
+        """
+        Publica las posiciones pendientes en un solo mensaje del backplane.
+        Cada worker las deja en el buzón de sus amigos online (_on_message).
+        """
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, {}
+
+        updates = []
+        for user_id, update in pending.items():
+            entry = self._connections.get(user_id)
+            if entry is None:
+                continue
+            entry["sent_lat"] = update["lat"]
+            entry["sent_lng"] = update["lng"]
+            updates.append(update)
+        if not updates:
+            return
+        self.counters["updates_flushed"] += len(updates)
+        await self.backplane.publish(PRESENCE_CHANNEL, {"type": "updates", "updates": updates})
+
+    def _on_message(self, message: dict) -> None:
+        """Aplica un mensaje de presencia publicado por cualquier worker."""
+        if message["type"] == "friendship":
+            a, b = message["user_ids"]
+            self._apply_friendship(a, b, message["added"])
+            self._apply_friendship(b, a, message["added"])
+            return
+        if message["type"] == "offline":
+            user_id = message["user_id"]
+            self._positions.pop(user_id, None)
+            self._encoded.pop(user_id, None)
+            self._index.remove(user_id)
+            self._deliver(user_id, message)
+            return
+        for update in message["updates"]:
+            user_id = update["user_id"]
+            self._positions[user_id] = update
+            self._index.update(user_id, update["lat"], update["lng"])
+            self._deliver(user_id, update)
+
+    def _deliver(self, sender_id: int, message: dict) -> None:
+        """
+        Deja el mensaje en el buzón de cada amigo del emisor conectado a
+        este worker (que comparta o no, da igual: recibe), sustituyendo lo
+        que tuviera pendiente del emisor. No espera a que se entregue.
+        """
+        for fid in self._watchers.get(sender_id, ()):
+            friend_entry = self._connections.get(fid) or self._detached.get(fid)
+            if friend_entry is not None and self._push(friend_entry, sender_id, message):
+                self.counters["deliveries"] += 1
+
+    @staticmethod
+    def _push(entry: dict, key: int, message: dict) -> bool:
+        """
+        Numera el evento en la sesión del destinatario, lo guarda para
+        resume() y, si está conectado, lo deja en su buzón.
+        """
+        session = entry["session"]
+        session["seq"] += 1
+        session["events"].append((session["seq"], key, message))
+        if entry["writer"] is None:
+            return False
+        # Encolar no bloquea: un amigo lento no retrasa a los demás
+        return entry["writer"].send_keyed(key, (session["seq"], message))
+
+    def _render_mailbox(self, values: list[tuple[int, dict]], fmt: str) -> list[compact.Encoded]:
+        """Mensajes a enviar para el contenido del buzón de un destinatario."""
+        messages = [message for _, message in values]
+        offline = [m for m in messages if m.get("type") == "offline"]
+        updates = [m for m in messages if m.get("type") != "offline"]
+        # Sólo el último lleva seq: si la conexión cae a mitad, el cliente
+        # reanuda desde su seq anterior y no pierde nada
+        seq = max(seq for seq, _ in values)
+        frames = [compact.encode(m, fmt) for m in offline[:-1]]
+        if updates:
+            if offline:
+                frames.append(compact.encode(offline[-1], fmt))
+            encoded = [self._encode_update(u, fmt) for u in updates]
+            frames.append(compact.updates_frame(encoded, seq, fmt))
+        else:
+            frames.append(compact.encode({**offline[-1], "seq": seq}, fmt))
+        return frames
+
+    def _encode_update(self, update: dict, fmt: str) -> compact.Encoded:
+        """La posición serializada en fmt, reutilizada entre destinatarios."""
+        cached = self._encoded.get(update["user_id"])
+        if cached is None or cached[0] is not update:
+            # Sólo se guarda la última posición de cada usuario
+            cached = (update, {})
+            if self._positions.get(update["user_id"]) is update:
+                self._encoded[update["user_id"]] = cached
+        encoded = cached[1].get(fmt)
+        if encoded is None:
+            encoded = cached[1][fmt] = compact.encode_update(update, fmt)
+        return encoded
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "online": len(self._connections),
+            "sharing": len(self._index),
+            "watched": len(self._watchers),
+            "detached": len(self._detached),
+            "pending": len(self._pending),
+            **self.counters,
+            "outbound": dict(outbound.counters),
         }
-        await self._broadcast_to_friends(user_id, message, entry["friend_ids"])
 
     async def get_snapshot_for(self, user_id: int) -> list[dict]:
         """Devuelve posiciones actuales de los amigos online del user."""
         entry = self._connections.get(user_id)
         if entry is None:
             return []
-        snapshot = []
-        for fid in entry["friend_ids"]:
-            friend = self._connections.get(fid)
+        # Sólo tienen posición los online que comparten y ya la han enviado
+        return [self._positions[fid] for fid in entry["friend_ids"] if fid in self._positions]
+
+    @staticmethod
+    def _friend_view(user_id: int, entry: dict) -> dict:
+        return {
+            "user_id": user_id,
+            "username": entry["username"],
+            "lat": entry["lat"],
+            "lng": entry["lng"],
+            "updated_at": entry["updated_at"].isoformat(),
+        }
+
+    def friends_within(
+        self,
+        friend_ids: set[int],
+        lat: float,
+        lng: float,
+        radius_m: float,
+    ) -> list[dict]:
+        """
+        Amigos online que comparten ubicación a radius_m metros o menos del
+        punto, del más cercano al más lejano, con su distancia en metros.
+        Usa el índice espacial: visita las celdas del círculo, o comprueba
+        los amigos uno a uno si son menos que esas celdas.
+        """
+        result = []
+        for fid, distance in self._index.within_radius(lat, lng, radius_m, among=friend_ids):
+            friend = self._positions.get(fid)
+            if friend is None:
+                continue  # desconectado entre la consulta y ahora
+            result.append({**friend, "distance_m": round(distance, 1)})
+        return result
+
+    def friends_in_bbox(
+        self,
+        friend_ids: set[int],
+        south: float,
+        west: float,
+        north: float,
+        east: float,
+    ) -> list[dict]:
+        """
+        Amigos online que comparten ubicación dentro del rectángulo
+        (west > east si cruza el antimeridiano).
+        """
+        result = []
+        for fid in self._index.in_bbox(south, west, north, east, among=friend_ids):
+            friend = self._positions.get(fid)
             if friend is None:
                 continue
-            if not friend["share_location"]:
-                continue
-            if friend["lat"] is None or friend["lng"] is None:
-                continue  # online pero aún sin posición
-            snapshot.append({
-                "user_id": fid,
-                "username": friend["username"],
-                "lat": friend["lat"],
-                "lng": friend["lng"],
-                "updated_at": friend["updated_at"].isoformat(),
-            })
-        return snapshot
-
-    async def notify_offline(self, user_id: int, friend_ids: set[int]) -> None:
-        """Notifica a los amigos que un user se ha desconectado."""
-        message = {"type": "offline", "user_id": user_id}
-        await self._broadcast_to_friends(user_id, message, friend_ids)
-
-    async def _broadcast_to_friends(
-        self, sender_id: int, message: dict, friend_ids: set[int]
-    ) -> None:
-        """Envía a cada amigo online (que comparta o no, da igual: recibe)."""
-        for fid in friend_ids:
-            friend_entry = self._connections.get(fid)
-            if friend_entry is None:
-                continue
-            try:
-                await friend_entry["websocket"].send_json(message)
-            except Exception:
-                # Conexión rota; ignoramos. El disconnect del WS la limpiará.
-                pass
+            result.append(friend)
+        return result
+
+    async def friendship_changed(self, user_id: int, other_id: int, added: bool) -> None:
+        """
+        Publica que dos usuarios se han hecho amigos o han dejado de serlo,
+        para que sus conexiones online lo apliquen sin reconectar.
+        """
+        await self.backplane.publish(
+            PRESENCE_CHANNEL,
+            {"type": "friendship", "user_ids": [user_id, other_id], "added": added},
+        )
+
+    def _apply_friendship(self, user_id: int, other_id: int, added: bool) -> None:
+        """
+        Añade o quita other_id de los amigos de user_id si tiene sesión en
+        este worker. Al nuevo amigo se le manda su posición, si la hay; al
+        quitado, un "offline" para que desaparezca del mapa.
+        """
+        entry = self._connections.get(user_id) or self._detached.get(user_id)
+        if entry is None or (other_id in entry["friend_ids"]) == added:
+            return
+        # Conjunto nuevo, no mutado: las consultas del threadpool pueden
+        # estar recorriendo el anterior
+        if added:
+            entry["friend_ids"] = entry["friend_ids"] | {other_id}
+            self._watchers.setdefault(other_id, set()).add(user_id)
+            position = self._positions.get(other_id)
+            if position is not None:
+                self._push(entry, other_id, position)
+        else:
+            entry["friend_ids"] = entry["friend_ids"] - {other_id}
+            self._unwatch(user_id, {other_id})
+            self._push(entry, other_id, {"type": "offline", "user_id": other_id})
+
+    async def notify_offline(self, user_id: int) -> None:
+        """
+        Publica que un user se ha desconectado: todos los workers olvidan
+        su posición y avisan a sus amigos conectados.
+        """
+        await self.backplane.publish(PRESENCE_CHANNEL, {"type": "offline", "user_id": user_id})
 
 
 # Singleton
@@ -0,0 +1,180 @@
+import math
+import threading
+from typing import Hashable, Iterable, Optional
+
+from app.core.geo import (
+    METERS_PER_DEGREE_LAT, cell_lng_step_deg, haversine_m, snap_to_cell
+)
+
+Cell = tuple[int, int]
+
+
+def _lng_intervals(west: float, east: float) -> list[tuple[float, float]]:
+    """Parte un rango de longitudes que cruza el antimeridiano en dos."""
+    if east - west >= 360:
+        return [(-180.0, 180.0)]
+    w = (west + 180.0) % 360.0 - 180.0
+    e = (east + 180.0) % 360.0 - 180.0
+    if w <= e:
+        return [(w, e)]
+    return [(w, 180.0), (-180.0, e)]
+
+
+def _in_lng_range(lng: float, west: float, east: float) -> bool:
+    if west <= east:
+        return west <= lng <= east
+    return lng >= west or lng <= east  # cruza el antimeridiano
+
+
+class SpatialGrid:
+    """
+    Índice espacial en memoria de puntos móviles.
+
+    Rejilla uniforme de celdas de ~cell_size_m (la misma que
+    app.core.geo.snap_to_cell) con el conjunto de claves de cada celda.
+    Mover un punto cuesta O(1) y las consultas solo visitan las celdas que
+    tocan la zona pedida; si son más que las celdas ocupadas, se recorren
+    estas últimas, así que una consulta nunca cuesta más que un barrido.
+
+    Thread-safe: lo actualiza el event loop y lo leen endpoints REST que
+    corren en el threadpool.
+    """
+
+    def __init__(self, cell_size_m: float) -> None:
+        self.cell_size_m = cell_size_m
+        self._dlat = cell_size_m / METERS_PER_DEGREE_LAT
+        self._cells: dict[Cell, set] = {}
+        # clave -> (lat, lng, celda)
+        self._positions: dict[Hashable, tuple[float, float, Cell]] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._positions)
+
+    def update(self, key: Hashable, lat: float, lng: float) -> None:
+        """Inserta o mueve un punto."""
+        cell = snap_to_cell(lat, lng, self.cell_size_m)
+        with self._lock:
+            old = self._positions.get(key)
+            if old is None or old[2] != cell:
+                if old is not None:
+                    self._discard(key, old[2])
+                self._cells.setdefault(cell, set()).add(key)
+            self._positions[key] = (lat, lng, cell)
+
+    def remove(self, key: Hashable) -> None:
+        with self._lock:
+            old = self._positions.pop(key, None)
+            if old is not None:
+                self._discard(key, old[2])
+
+    def position(self, key: Hashable) -> Optional[tuple[float, float]]:
+        entry = self._positions.get(key)
+        return (entry[0], entry[1]) if entry is not None else None
+
+    def _discard(self, key: Hashable, cell: Cell) -> None:
+        members = self._cells.get(cell)
+        if members is not None:
+            members.discard(key)
+            if not members:
+                del self._cells[cell]
+
+    def _cells_for(self, south: float, west: float, north: float, east: float) -> Optional[list[Cell]]:
+        """
+        Celdas que tocan el rectángulo, o None si son más que las celdas
+        ocupadas (entonces sale más barato recorrer estas).
+        """
+        budget = len(self._cells)
+        row_lo = math.floor(south / self._dlat)
+        row_hi = math.floor(north / self._dlat)
+        if row_hi - row_lo + 1 > budget:
+            return None
+        cells: list[Cell] = []
+        for row in range(row_lo, row_hi + 1):
+            dlng = cell_lng_step_deg(row, self.cell_size_m)
+            for w, e in _lng_intervals(west, east):
+                col_lo = math.floor(w / dlng)
+                col_hi = math.floor(e / dlng)
+                if len(cells) + col_hi - col_lo + 1 > budget:
+                    return None
+                cells.extend((row, col) for col in range(col_lo, col_hi + 1))
+        return cells
+
+    def _candidates(
+        self,
+        south: float,
+        west: float,
+        north: float,
+        east: float,
+        among: Optional[set],
+    ) -> Iterable[Hashable]:
+        """Claves que pueden caer en el rectángulo. Llamar con el lock."""
+        cells = self._cells_for(south, west, north, east)
+        if among is not None and (cells is None or len(among) <= len(cells)):
+            # Pocos candidatos (p.ej. los amigos): comprobarlos uno a uno
+            return [key for key in among if key in self._positions]
+        if cells is None:
+            keys: Iterable[Hashable] = list(self._positions)
+        else:
+            keys = [key for cell in cells for key in self._cells.get(cell, ())]
+        if among is not None:
+            keys = [key for key in keys if key in among]
+        return keys
+
+    def within_radius(
+        self,
+        lat: float,
+        lng: float,
+        radius_m: float,
+        among: Optional[set] = None,
+    ) -> list[tuple[Hashable, float]]:
+        """
+        Claves a radius_m metros o menos del punto, con su distancia,
+        ordenadas de más cercana a más lejana.
+
+        Args:
+            among: Si se indica, solo se consideran estas claves.
+        """
+        dlat = radius_m / METERS_PER_DEGREE_LAT
+        south = max(-90.0, lat - dlat)
+        north = min(90.0, lat + dlat)
+        # El círculo es más ancho (en grados) en su latitud más cercana al polo
+        cos_lat = math.cos(math.radians(max(abs(south), abs(north))))
+        if cos_lat < 1e-9 or radius_m / (METERS_PER_DEGREE_LAT * cos_lat) >= 180:
+            west, east = -180.0, 180.0
+        else:
+            dlng = radius_m / (METERS_PER_DEGREE_LAT * cos_lat)
+            west, east = lng - dlng, lng + dlng
+
+        result = []
+        with self._lock:
+            for key in self._candidates(south, west, north, east, among):
+                point_lat, point_lng, _ = self._positions[key]
+                distance = haversine_m(lat, lng, point_lat, point_lng)
+                if distance <= radius_m:
+                    result.append((key, distance))
+        result.sort(key=lambda item: item[1])
+        return result
+
+    def in_bbox(
+        self,
+        south: float,
+        west: float,
+        north: float,
+        east: float,
+        among: Optional[set] = None,
+    ) -> list[Hashable]:
+        """
+        Claves dentro del rectángulo. west > east indica un rectángulo que
+        cruza el antimeridiano.
+
+        Args:
+            among: Si se indica, solo se consideran estas claves.
+        """
+        result = []
+        with self._lock:
+            for key in self._candidates(south, west, north, east, among):
+                point_lat, point_lng, _ = self._positions[key]
+                if south <= point_lat <= north and _in_lng_range(point_lng, west, east):
+                    result.append(key)
+        return result
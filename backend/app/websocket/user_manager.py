@@ -1,35 +1,49 @@
-from typing import Dict, List
+import json
+from typing import Any, Dict, List
 from fastapi import WebSocket
 
+from app.websocket.backplane import USER_CHANNEL, Backplane, backplane as default_backplane
+from app.websocket.heartbeat import PING, heartbeat
+from app.websocket.outbound import SocketWriter
 
 
 class UserConnectionManager:
-    def __init__(self) -> None:
-        self.active_connections: Dict[int, List[WebSocket]] = {}
+    def __init__(self, backplane: Backplane = default_backplane) -> None:
+        # user_id -> writers of that user's sockets (one per tab/device)
+        self.active_connections: Dict[int, List[SocketWriter]] = {}
+        self.backplane = backplane
+        backplane.subscribe(USER_CHANNEL, self._on_user_message)
 
-    async def connect(self, websocket: WebSocket, user_id: int) -> None:
+    async def connect(self, websocket: WebSocket, user_id: int) -> SocketWriter:
         await websocket.accept()
+        writer = SocketWriter(websocket).start()
         if user_id not in self.active_connections:
             self.active_connections[user_id] = []
-        self.active_connections[user_id].append(websocket)
+        self.active_connections[user_id].append(writer)
+        heartbeat.register(
+            writer,
+            ping=lambda: writer.send_text(json.dumps(PING)),
+            on_reap=lambda: self.disconnect(websocket, user_id),
+        )
+        return writer
 
     def disconnect(self, websocket: WebSocket, user_id: int) -> None:
         if user_id in self.active_connections:
-            try:
-                self.active_connections[user_id].remove(websocket)
-            except ValueError:
-                pass
-            if not self.active_connections[user_id]:
+            writers = self.active_connections[user_id]
+            for writer in [w for w in writers if w.websocket is websocket]:
+                writer.stop()
+                heartbeat.unregister(writer)
+                writers.remove(writer)
+            if not writers:
                 del self.active_connections[user_id]
 
     async def send_to_user(self, user_id: int, message_json: str) -> None:
-        connections = self.active_connections.get(user_id, [])
-        for connection in connections:
-            try:
-                await connection.send_text(message_json)
-            except Exception:
-                pass
+        """Publish the message to every socket of the user, on any worker."""
+        await self.backplane.publish(USER_CHANNEL, {"user_id": user_id, "message": message_json})
 
+    def _on_user_message(self, data: Dict[str, Any]) -> None:
+        for writer in list(self.active_connections.get(data["user_id"], [])):
+            writer.send_text(data["message"])
 
-user_manager = UserConnectionManager()
 
+user_manager = UserConnectionManager()
@@ -0,0 +1,228 @@
+"""
+Benchmark de recomendaciones y Maps contra el proveedor fake.
+
+Llama directamente a los servicios (sin HTTP ni autenticación) con la
+concurrencia indicada y muestra latencias p50/p95/p99, throughput,
+errores y llamadas al proveedor por escenario. No gasta cuota de Google.
+
+Uso (desde backend/):
+    python scripts/benchmark_maps.py
+    python scripts/benchmark_maps.py --scenario recommendations --concurrency 32 --requests 2000
+    python scripts/benchmark_maps.py --latency-ms 150 --jitter-ms 50 --error-rate 0.05
+
+Por defecto usa una base SQLite temporal nueva en cada ejecución; con
+--database-url se puede apuntar a otra (se crean las tablas que falten).
+SQLite serializa las escrituras al catálogo, así que para cifras
+comparables con producción conviene usar PostgreSQL.
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Tuple
+
+SCENARIOS = ("nearby", "details", "recommendations")
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenario", choices=SCENARIOS + ("all",), default="all")
+    parser.add_argument("--requests", type=int, default=500, help="Peticiones por escenario")
+    parser.add_argument("--concurrency", type=int, default=16, help="Peticiones simultáneas")
+    parser.add_argument("--latency-ms", type=float, default=80.0, help="Latencia media del proveedor fake")
+    parser.add_argument("--jitter-ms", type=float, default=20.0, help="Desviación de la latencia")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fracción de llamadas fallidas (0-1)")
+    parser.add_argument("--center", default="40.4168,-3.7038", help="lat,lng del centro de la zona")
+    parser.add_argument("--spread-m", type=float, default=5000.0, help="Radio de la zona de los usuarios")
+    parser.add_argument("--radius", type=int, default=1500, help="Radio de búsqueda")
+    parser.add_argument("--limit", type=int, default=20, help="Resultados por recomendación")
+    parser.add_argument("--users", type=int, default=100, help="Usuarios distintos simulados")
+    parser.add_argument("--categories", default="restaurant,cafe,museum", help="Preferencias, separadas por coma")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--database-url", default=None)
+    parser.add_argument("--json", action="store_true", help="Salida en JSON")
+    return parser.parse_args()
+
+
+def configure_environment(args: argparse.Namespace) -> None:
+    """Los settings se leen al importar app, así que esto va antes."""
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    if args.database_url is None:
+        path = os.path.join(tempfile.mkdtemp(prefix="benchmark_maps_"), "benchmark.db")
+        args.database_url = f"sqlite:///{path}"
+    os.environ["DATABASE_URL"] = args.database_url
+    os.environ["MAPS_PROVIDER"] = "fake"
+    os.environ["FAKE_MAPS_LATENCY_MS"] = str(args.latency_ms)
+    os.environ["FAKE_MAPS_JITTER_MS"] = str(args.jitter_ms)
+    os.environ["FAKE_MAPS_ERROR_RATE"] = str(args.error_rate)
+    os.environ["FAKE_MAPS_SEED"] = str(args.seed)
+    os.environ.setdefault("SECRET_KEY", "benchmark")
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Percentil por rango más cercano de una lista ya ordenada."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, int(round(pct / 100 * len(sorted_values))))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def run_scenario(name: str, calls: List[Callable[[], Any]], concurrency: int, maps_service) -> Dict[str, Any]:
+    """Ejecuta las llamadas con la concurrencia dada y resume latencias."""
+    def timed(call: Callable[[], Any]) -> Tuple[float, str]:
+        """(latencia en ms, "ok" | "empty" | "error") de una llamada."""
+        start = time.perf_counter()
+        try:
+            outcome = "ok" if call() else "empty"
+        except Exception:
+            outcome = "error"
+        return (time.perf_counter() - start) * 1000, outcome
+
+    upstream_before = maps_service.upstream_calls
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        # Cada hilo devuelve su resultado; se agregan aquí, en el hilo principal
+        results = list(pool.map(timed, calls))
+    elapsed = time.perf_counter() - started
+
+    latencies = sorted(latency for latency, _ in results)
+    errors = sum(1 for _, outcome in results if outcome == "error")
+    empty = sum(1 for _, outcome in results if outcome == "empty")
+    return {
+        "scenario": name,
+        "requests": len(calls),
+        "concurrency": concurrency,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(len(calls) / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 50), 2),
+        "p95_ms": round(percentile(latencies, 95), 2),
+        "p99_ms": round(percentile(latencies, 99), 2),
+        "max_ms": round(latencies[-1], 2) if latencies else 0.0,
+        "errors": errors,
+        "empty": empty,
+        "upstream_calls": maps_service.upstream_calls - upstream_before,
+    }
+
+
+def main() -> None:
+    args = parse_args()
+    configure_environment(args)
+
+    import app.models  # noqa: F401  (registra las tablas)
+    from app.core.database import Base, SessionLocal, engine
+    from app.core.geo import METERS_PER_DEGREE_LAT
+    from app.services.catalog_writer import catalog_writer
+    from app.services.maps_services import maps_service
+    from app.services.place_service import PlaceService
+    from app.services.recommendation_service import RecommendationService
+
+    Base.metadata.create_all(engine)
+
+    rng = random.Random(args.seed)
+    center_lat, center_lng = (float(v) for v in args.center.split(","))
+    categories = RecommendationService.distinct_categories(
+        c.strip() for c in args.categories.split(",") if c.strip()
+    )
+
+    def random_point() -> tuple:
+        # Misma aproximación plana que el proveedor fake; basta para la zona
+        distance = args.spread_m * math.sqrt(rng.random())
+        bearing = rng.uniform(0, 2 * math.pi)
+        lat = center_lat + distance * math.cos(bearing) / METERS_PER_DEGREE_LAT
+        lng = center_lng + distance * math.sin(bearing) / (
+            METERS_PER_DEGREE_LAT * math.cos(math.radians(center_lat))
+        )
+        return lat, lng
+
+    def nearby(lat: float, lng: float, place_type: str) -> List[Dict[str, Any]]:
+        db = SessionLocal()
+        try:
+            return PlaceService.get_nearby_places(db, lat, lng, args.radius, place_type)
+        finally:
+            db.close()
+
+    def details(place_id: str) -> Dict[str, Any]:
+        return maps_service.get_place_details(
+            place_id,
+            on_fetched=PlaceService.save_place_details,
+            fallback=PlaceService.load_place_details,
+        )
+
+    def recommendations(user_id: int, lat: float, lng: float) -> List[Dict[str, Any]]:
+        return RecommendationService.get_recommendations(
+            user_id, lat, lng, args.radius, args.limit, categories
+        )
+
+    # Cada usuario simulado tiene una posición fija, como en la app real
+    user_points = {user_id: random_point() for user_id in range(1, args.users + 1)}
+    selected = SCENARIOS if args.scenario == "all" else (args.scenario,)
+    scenario_calls = []
+
+    for scenario in selected:
+        if scenario == "nearby":
+            calls = []
+            for _ in range(args.requests):
+                lat, lng = random_point()
+                calls.append(lambda lat=lat, lng=lng, t=rng.choice(categories or [""]): nearby(lat, lng, t))
+        elif scenario == "details":
+            # place_ids reales del proveedor fake, de búsquedas alrededor del centro
+            place_ids = [
+                place["place_id"]
+                for place in maps_service.client.places_nearby(
+                    location=(center_lat, center_lng), radius=int(args.spread_m)
+                )["results"]
+            ] or ["fake_0_0_cafe"]
+            calls = [lambda p=rng.choice(place_ids): details(p) for _ in range(args.requests)]
+        else:
+            calls = []
+            for _ in range(args.requests):
+                user_id = rng.randint(1, args.users)
+                lat, lng = user_points[user_id]
+                calls.append(lambda u=user_id, lat=lat, lng=lng: recommendations(u, lat, lng))
+        scenario_calls.append((scenario, calls))
+
+    async def run_all() -> List[Dict[str, Any]]:
+        # Como en la app: el catálogo se escribe en segundo plano
+        catalog_writer.start()
+        try:
+            return [
+                await asyncio.to_thread(run_scenario, scenario, calls, args.concurrency, maps_service)
+                for scenario, calls in scenario_calls
+            ]
+        finally:
+            await catalog_writer.stop()
+
+    reports = asyncio.run(run_all())
+
+    if args.json:
+        print(json.dumps({
+            "reports": reports,
+            "maps": maps_service.stats(),
+            "catalog_writer": catalog_writer.stats(),
+        }, indent=2))
+        return
+
+    header = f"{'scenario':<16}{'reqs':>6}{'rps':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'max ms':>9}{'errors':>8}{'empty':>7}{'upstream':>10}"
+    print(f"proveedor fake: latencia {args.latency_ms}±{args.jitter_ms} ms, errores {args.error_rate:.0%}, "
+          f"concurrencia {args.concurrency}")
+    print(header)
+    print("-" * len(header))
+    for r in reports:
+        print(f"{r['scenario']:<16}{r['requests']:>6}{r['throughput_rps']:>9}{r['p50_ms']:>9}{r['p95_ms']:>9}"
+              f"{r['p99_ms']:>9}{r['max_ms']:>9}{r['errors']:>8}{r['empty']:>7}{r['upstream_calls']:>10}")
+    stats = maps_service.stats()
+    print(f"\nnearby cache hit ratio: {stats['nearby_cache']['hit_ratio']}, "
+          f"details cache: {stats['details_cache']['hits']} hits / {stats['details_cache']['misses']} misses, "
+          f"recommendation cache hit ratio: {RecommendationService.stats()['hit_ratio']}")
+    writes = catalog_writer.stats()
+    print(f"catalog writer: {writes['written']} places in {writes['flushes']} flushes, {writes['errors']} errors")
+
+
+if __name__ == "__main__":
+    main()
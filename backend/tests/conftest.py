@@ -0,0 +1,67 @@
+"""
+Fixtures comunes: SQLite temporal, proveedor de Maps fake sin latencia y
+singletons en estado limpio entre tests.
+
+Los settings se leen al importar app, así que el entorno se fija aquí
+antes de cualquier import de la app.
+"""
+import os
+import tempfile
+
+_DB_DIR = tempfile.mkdtemp(prefix="tests_")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_DB_DIR, 'test.db')}"
+os.environ["SECRET_KEY"] = "tests"
+os.environ["MAPS_PROVIDER"] = "fake"
+os.environ["FAKE_MAPS_LATENCY_MS"] = "0"
+os.environ["FAKE_MAPS_JITTER_MS"] = "0"
+os.environ["FAKE_MAPS_ERROR_RATE"] = "0"
+os.environ["PREWARM_ENABLED"] = "false"
+
+import pytest  # noqa: E402
+
+import app.models  # noqa: E402,F401  (registra las tablas)
+from app.core.circuit_breaker import CircuitBreaker  # noqa: E402
+from app.core.database import Base, SessionLocal, engine  # noqa: E402
+from app.models.user import User  # noqa: E402
+from app.services import geocode_service  # noqa: E402
+from app.services.maps_services import maps_service  # noqa: E402
+
+
+@pytest.fixture
+def db():
+    """Sesión sobre un esquema recién creado."""
+    Base.metadata.create_all(engine)
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+        Base.metadata.drop_all(engine)
+
+
+@pytest.fixture
+def users(db):
+    """Tres usuarios; devuelve sus ids."""
+    rows = [
+        User(email=f"user{i}@example.com", username=f"user{i}", hashed_password="x")
+        for i in range(1, 4)
+    ]
+    db.add_all(rows)
+    db.commit()
+    return [user.id for user in rows]
+
+
+@pytest.fixture(autouse=True)
+def clean_maps_service():
+    """Cachés vacías, circuitos cerrados y proveedor sin errores."""
+    maps_service.nearby_cache.clear()
+    maps_service.details_cache.clear()
+    maps_service._page_tokens.clear()
+    geocode_service._hot_cache.clear()
+    for name, breaker in list(maps_service.breakers.items()):
+        maps_service.breakers[name] = CircuitBreaker(
+            name, failure_threshold=breaker.failure_threshold, reset_timeout=breaker.reset_timeout
+        )
+    maps_service.client.error_rate = 0.0
+    yield
+    maps_service.client.error_rate = 0.0
@@ -0,0 +1,37 @@
+"""WebSocket de mentira para los tests de los managers y del SocketWriter."""
+import asyncio
+
+
+class FakeWebSocket:
+    """Records what is sent; send waits on `gate` while it is cleared."""
+
+    def __init__(self):
+        self.sent = []
+        self.closed_with = None
+        self.gate = asyncio.Event()
+        self.gate.set()
+
+    async def accept(self):
+        pass
+
+    async def _send(self, frame):
+        await self.gate.wait()
+        self.sent.append(frame)
+
+    async def send_json(self, message):
+        await self._send(message)
+
+    async def send_text(self, text):
+        await self._send(text)
+
+    async def send_bytes(self, data):
+        await self._send(data)
+
+    async def close(self, code=1000, reason=""):
+        self.closed_with = code
+
+
+async def drain():
+    """Deja correr a las tareas escritoras hasta que vacíen sus colas."""
+    for _ in range(10):
+        await asyncio.sleep(0)
@@ -0,0 +1,80 @@
+import asyncio
+import json
+
+from app.websocket.backplane import LoopbackBackplane
+from app.websocket.presence_manager import PresenceManager
+from app.websocket.user_manager import UserConnectionManager
+
+from fake_socket import FakeWebSocket, drain
+
+LAT, LNG = 40.4168, -3.7038
+
+
+def test_every_handler_gets_the_message_despite_failures():
+    received = []
+
+    def broken(message):
+        raise RuntimeError("boom")
+
+    async def handler(message):
+        received.append(("async", message))
+
+    backplane = LoopbackBackplane()
+    backplane.subscribe("room", broken)
+    backplane.subscribe("room", handler)
+    backplane.subscribe("room", lambda message: received.append(("sync", message)))
+    backplane.subscribe("other", lambda message: received.append(("other", message)))
+
+    asyncio.run(backplane.publish("room", {"n": 1}))
+
+    assert received == [("async", {"n": 1}), ("sync", {"n": 1})]
+
+
+def test_positions_reach_friends_on_other_workers():
+    async def run():
+        backplane = LoopbackBackplane()
+        worker_a = PresenceManager(backplane)
+        worker_b = PresenceManager(backplane)
+        await worker_a.connect(1, "user1", FakeWebSocket(), {2}, share_location=True)
+        friend = FakeWebSocket()
+        await worker_b.connect(2, "user2", friend, {1}, share_location=True)
+
+        await worker_a.update_location(1, LAT, LNG)
+        await worker_a.flush()
+        await drain()
+        nearby = worker_b.friends_within({1}, LAT, LNG, 1000)
+
+        await worker_a.notify_offline(1)
+        await drain()
+        return friend, nearby, worker_b
+
+    friend, nearby, worker_b = asyncio.run(run())
+
+    first, second = (json.loads(frame) for frame in friend.sent)
+    assert [u["user_id"] for u in first["updates"]] == [1]
+    assert second["type"] == "offline" and second["user_id"] == 1
+    assert [f["user_id"] for f in nearby] == [1]
+    assert worker_b.friends_within({1}, LAT, LNG, 1000) == []
+
+
+def test_user_messages_reach_every_socket_on_every_worker():
+    async def run():
+        backplane = LoopbackBackplane()
+        worker_a = UserConnectionManager(backplane)
+        worker_b = UserConnectionManager(backplane)
+        phone, laptop, other = FakeWebSocket(), FakeWebSocket(), FakeWebSocket()
+        await worker_a.connect(phone, 1)
+        await worker_b.connect(laptop, 1)
+        await worker_b.connect(other, 2)
+
+        await worker_a.send_to_user(1, "hola")
+        await drain()
+        worker_a.disconnect(phone, 1)
+        worker_b.disconnect(laptop, 1)
+        worker_b.disconnect(other, 2)
+        return phone, laptop, other
+
+    phone, laptop, other = asyncio.run(run())
+
+    assert phone.sent == laptop.sent == ["hola"]
+    assert other.sent == []
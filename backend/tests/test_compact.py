@@ -0,0 +1,78 @@
+import asyncio
+import json
+from datetime import datetime
+
+import msgpack
+
+from app.websocket import compact
+from app.websocket.backplane import LoopbackBackplane
+from app.websocket.presence_manager import PresenceManager
+
+from fake_socket import FakeWebSocket, drain
+
+UPDATE = {
+    "user_id": 7,
+    "username": "ana",
+    "lat": 40.416812,
+    "lng": -3.703791,
+    "updated_at": "2026-10-17T12:30:00.250000",
+}
+
+
+def test_negotiate_defaults_to_json():
+    assert compact.negotiate("msgpack") == compact.MSGPACK
+    assert compact.negotiate("xml") == compact.JSON
+    assert compact.negotiate(None) == compact.JSON
+
+
+def test_msgpack_update_is_a_fixed_array():
+    user_id, username, lat_e6, lng_e6, updated_at_ms = msgpack.unpackb(
+        compact.encode_update(UPDATE, compact.MSGPACK)
+    )
+
+    assert (user_id, username) == (7, "ana")
+    assert (lat_e6, lng_e6) == (40416812, -3703791)
+    assert updated_at_ms == int(datetime.fromisoformat(UPDATE["updated_at"]).timestamp() * 1000)
+
+
+def test_updates_frame_matches_encoding_the_whole_message():
+    for fmt, decode in ((compact.JSON, json.loads), (compact.MSGPACK, msgpack.unpackb)):
+        encoded = [compact.encode_update(UPDATE, fmt)] * 2
+        updates = [decode(part) for part in encoded]
+
+        assert decode(compact.updates_frame(encoded, 5, fmt)) == {"type": "updates", "updates": updates, "seq": 5}
+        assert decode(compact.updates_frame(encoded, None, fmt)) == {"type": "updates", "updates": updates}
+
+
+def test_each_socket_gets_its_format_and_updates_are_encoded_once(monkeypatch):
+    calls = []
+    encode_update = compact.encode_update
+
+    def counting(update, fmt):
+        calls.append(fmt)
+        return encode_update(update, fmt)
+
+    monkeypatch.setattr(compact, "encode_update", counting)
+
+    async def run():
+        manager = PresenceManager(LoopbackBackplane())
+        await manager.connect(1, "user1", FakeWebSocket(), {2, 3, 4}, share_location=True)
+        sockets = {}
+        for user_id, fmt in ((2, compact.JSON), (3, compact.MSGPACK), (4, compact.MSGPACK)):
+            sockets[user_id] = FakeWebSocket()
+            await manager.connect(user_id, f"user{user_id}", sockets[user_id], {1}, True, fmt)
+        await manager.update_location(1, 40.4168, -3.7038)
+        await manager.flush()
+        await drain()
+        return sockets
+
+    sockets = asyncio.run(run())
+
+    [as_json] = sockets[2].sent
+    [as_msgpack] = sockets[3].sent
+    assert isinstance(as_json, str) and isinstance(as_msgpack, bytes)
+    assert json.loads(as_json)["updates"][0]["user_id"] == 1
+    assert msgpack.unpackb(as_msgpack)["updates"][0][:2] == [1, "user1"]
+    [other] = sockets[4].sent
+    assert msgpack.unpackb(other)["updates"] == msgpack.unpackb(as_msgpack)["updates"]
+    assert sorted(calls) == [compact.JSON, compact.MSGPACK]
@@ -0,0 +1,81 @@
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import HTTPException, Response
+
+from app.api.maps import geocode_address
+from app.core.geo import normalize_address
+from app.models.geocode import GeocodeCacheEntry
+from app.services import geocode_service
+from app.services.geocode_service import GeocodeService
+from app.services.maps_services import maps_service
+
+
+def test_normalize_address():
+    assert normalize_address("  Gran Vía,  MADRID. ") == "gran via madrid"
+    assert normalize_address("Calle_Mayor-5") == "calle mayor 5"
+    assert normalize_address(" ,.; ") == ""
+
+
+def test_spellings_of_an_address_share_one_entry(db):
+    first = GeocodeService.geocode(db, "Gran Vía, Madrid")
+    calls = maps_service.upstream_calls
+
+    assert GeocodeService.geocode(db, "gran via   MADRID") == first
+    assert maps_service.upstream_calls == calls
+    assert db.query(GeocodeCacheEntry).one().query == "gran via madrid"
+
+
+def test_persistent_entry_survives_the_hot_cache(db):
+    first = GeocodeService.geocode(db, "Gran Vía, Madrid")
+    geocode_service._hot_cache.clear()
+    calls = maps_service.upstream_calls
+
+    assert GeocodeService.geocode(db, "Gran Via Madrid") == first
+    assert maps_service.upstream_calls == calls
+
+
+def test_expired_entry_is_served_degraded_when_google_fails(db):
+    first = GeocodeService.geocode(db, "Gran Vía, Madrid")
+    geocode_service._hot_cache.clear()
+    db.query(GeocodeCacheEntry).update({"created_at": datetime.now() - timedelta(days=365)})
+    db.commit()
+    maps_service.client.error_rate = 1.0
+
+    result = GeocodeService.geocode(db, "Gran Vía, Madrid")
+
+    assert result == {**first, "degraded": True}
+
+
+def test_blank_address_is_not_sent_to_google(db):
+    calls = maps_service.upstream_calls
+
+    assert GeocodeService.geocode(db, " ,. ") is None
+    assert maps_service.upstream_calls == calls
+
+
+def test_geocode_upstream_error_is_502(db):
+    maps_service.client.error_rate = 1.0
+
+    with pytest.raises(HTTPException) as error:
+        geocode_address(Response(), address="Gran Via, Madrid", db=db, current_user=None)
+
+    assert error.value.status_code == 502
+
+
+def test_geocode_open_circuit_is_503(db):
+    breaker = maps_service.breakers["geocode"]
+    for _ in range(breaker.failure_threshold):
+        breaker.record_failure()
+
+    with pytest.raises(HTTPException) as error:
+        geocode_address(Response(), address="Gran Via, Madrid", db=db, current_user=None)
+
+    assert error.value.status_code == 503
+
+
+def test_geocode_served_from_provider(db):
+    result = geocode_address(Response(), address="Gran Via, Madrid", db=db, current_user=None)
+
+    assert result["place_id"]
+    assert not result.get("degraded")
@@ -0,0 +1,89 @@
+import asyncio
+
+from app.websocket.heartbeat import IDLE_CLOSE_CODE, Heartbeat
+from app.websocket.outbound import SocketWriter
+
+from fake_socket import FakeWebSocket, drain
+
+
+class Client:
+    """Un socket registrado en el heartbeat, con sus pings y su reap."""
+
+    def __init__(self, heartbeat):
+        self.websocket = FakeWebSocket()
+        self.writer = SocketWriter(self.websocket).start()
+        self.pings = 0
+        self.reaped = False
+        heartbeat.register(self.writer, ping=self._ping, on_reap=self._on_reap)
+
+    def _ping(self):
+        self.pings += 1
+
+    async def _on_reap(self):
+        self.reaped = True
+
+
+async def _advance(heartbeat, ticks):
+    for _ in range(ticks):
+        heartbeat.advance()
+    await drain()
+
+
+def test_silent_socket_is_pinged_then_reaped():
+    async def run():
+        heartbeat = Heartbeat(ping_interval=3, pong_timeout=2, tick=1)
+        client = Client(heartbeat)
+
+        await _advance(heartbeat, 2)
+        assert client.pings == 0
+        await _advance(heartbeat, 1)
+        assert client.pings == 1
+
+        await _advance(heartbeat, 1)
+        assert not client.reaped
+        await _advance(heartbeat, 1)
+        return heartbeat, client
+
+    heartbeat, client = asyncio.run(run())
+
+    assert client.reaped
+    assert client.websocket.closed_with == IDLE_CLOSE_CODE
+    assert heartbeat.stats() == {"live": 0, "registered": 1, "pings": 1, "reaped": 1}
+
+
+def test_touch_postpones_the_ping_and_answers_it():
+    async def run():
+        heartbeat = Heartbeat(ping_interval=3, pong_timeout=2, tick=1)
+        client = Client(heartbeat)
+
+        await _advance(heartbeat, 2)
+        heartbeat.touch(client.writer)
+        await _advance(heartbeat, 2)
+        assert client.pings == 0
+        await _advance(heartbeat, 1)
+        assert client.pings == 1
+
+        heartbeat.touch(client.writer)  # pong
+        await _advance(heartbeat, 3)
+        client.writer.stop()
+        return client
+
+    client = asyncio.run(run())
+
+    assert client.pings == 2
+    assert not client.reaped
+
+
+def test_unregistered_socket_is_left_alone():
+    async def run():
+        heartbeat = Heartbeat(ping_interval=3, pong_timeout=2, tick=1)
+        client = Client(heartbeat)
+        heartbeat.unregister(client.writer)
+        await _advance(heartbeat, 10)
+        client.writer.stop()
+        return heartbeat, client
+
+    heartbeat, client = asyncio.run(run())
+
+    assert (client.pings, client.reaped) == (0, False)
+    assert heartbeat.stats()["live"] == 0
@@ -0,0 +1,66 @@
+from datetime import datetime, timedelta
+
+from app.models.conversation import Conversation
+from app.schemas.message import MessageCreate
+from app.services.message_service import MessageService
+
+T0 = datetime(2026, 1, 1, 12, 0, 0)
+
+
+def _send(db, sender_id, receiver_id, content="hola"):
+    return MessageService.create_message(db, sender_id, MessageCreate(receiver_id=receiver_id, content=content))
+
+
+def _inbox_row(db, user_id, other_user_id):
+    db.expire_all()
+    return (
+        db.query(Conversation)
+        .filter(Conversation.user_id == user_id, Conversation.other_user_id == other_user_id)
+        .one()
+    )
+
+
+def test_inbox_unread_counters(db, users):
+    a, b, c = users
+    first = _send(db, a, b)
+    MessageService.insert_messages(db, [
+        {"sender_id": a, "receiver_id": b, "content": "x", "timestamp": datetime.now()},
+        {"sender_id": c, "receiver_id": b, "content": "y", "timestamp": datetime.now()},
+    ])
+    last = _send(db, a, b, "último")
+
+    assert _inbox_row(db, b, a).unread_count == 3
+    assert _inbox_row(db, a, b).unread_count == 0
+    assert _inbox_row(db, b, a).last_message_id == last.id
+    assert sorted(MessageService.unread_counts(db, b), key=lambda r: r["user_id"]) == [
+        {"user_id": a, "unread_count": 3},
+        {"user_id": c, "unread_count": 1},
+    ]
+
+    MessageService.advance_read_watermark(db, b, a, first.id)
+    assert _inbox_row(db, b, a).unread_count == 2
+    MessageService.advance_read_watermark(db, b, a, last.id)
+    assert _inbox_row(db, b, a).unread_count == 0
+
+    MessageService.delete_conversation(db, a, b)
+    db.expire_all()
+    assert [row.other_user_id for row in MessageService.get_inbox(db, b)] == [c]
+
+
+def test_inbox_orders_and_pages_by_last_message(db, users):
+    a, b, c = users
+    MessageService.insert_messages(db, [
+        {"sender_id": b, "receiver_id": a, "content": "b", "timestamp": T0 + timedelta(minutes=2)},
+        {"sender_id": c, "receiver_id": a, "content": "c", "timestamp": T0 + timedelta(minutes=1)},
+    ])
+    # Un lote que llega tarde con un mensaje más antiguo no lo sustituye
+    MessageService.insert_messages(db, [
+        {"sender_id": c, "receiver_id": a, "content": "viejo", "timestamp": T0},
+    ])
+
+    inbox = MessageService.get_inbox(db, a, limit=1)
+    assert [row.other_user_id for row in inbox] == [b]
+    rest = MessageService.get_inbox(db, a, before=(inbox[0].last_message_at, inbox[0].last_message_id))
+    assert [row.other_user_id for row in rest] == [c]
+    assert rest[0].last_message_preview == "c"
+    assert rest[0].unread_count == 2
@@ -0,0 +1,42 @@
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import HTTPException
+
+from app.schemas.message import MessageCreate
+from app.services.message_service import MessageService
+
+T0 = datetime(2026, 1, 1, 12, 0, 0)
+
+
+def _send(db, sender_id, receiver_id, content="hola"):
+    return MessageService.create_message(db, sender_id, MessageCreate(receiver_id=receiver_id, content=content))
+
+
+def test_conversation_keyset_pages(db, users):
+    a, b, _ = users
+    ids = MessageService.insert_messages(db, [
+        {"sender_id": a, "receiver_id": b, "content": str(i), "timestamp": T0 + timedelta(seconds=i)}
+        for i in range(10)
+    ])
+
+    first = MessageService.get_conversation(db, a, b, limit=4)
+    older = MessageService.get_conversation(db, b, a, limit=3, before=ids[5])
+    newer = MessageService.get_conversation(db, a, b, limit=3, after=ids[5])
+    between = MessageService.get_conversation(db, a, b, after=ids[2], before=ids[6])
+
+    assert [m.id for m in first] == ids[:4]
+    assert [m.id for m in older] == ids[2:5]
+    assert [m.id for m in newer] == ids[6:9]
+    assert [m.id for m in between] == ids[3:6]
+
+
+def test_cursor_from_another_conversation_is_rejected(db, users):
+    a, b, c = users
+    other = _send(db, a, c)
+    _send(db, a, b)
+
+    with pytest.raises(HTTPException) as error:
+        MessageService.get_conversation(db, a, b, before=other.id)
+
+    assert error.value.status_code == 400
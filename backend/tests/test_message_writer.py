@@ -0,0 +1,66 @@
+import asyncio
+
+from app.models.message import Message
+from app.services.message_writer import MessageWriter
+
+
+def test_concurrent_messages_share_one_commit(db, users):
+    async def run():
+        writer = MessageWriter()
+        writer.start()
+        messages = await asyncio.gather(*(
+            writer.submit(users[0], users[1 + i % 2], f"hola {i}") for i in range(5)
+        ))
+        await writer.stop()
+        return writer, messages
+
+    writer, messages = asyncio.run(run())
+
+    assert writer.counters["batches"] == 1
+    assert writer.counters["max_batch"] == 5
+    stored = {m.id: m.content for m in db.query(Message)}
+    assert {m["id"]: m["content"] for m in messages} == stored
+    assert len(stored) == 5
+
+
+def test_failed_batch_is_retried_row_by_row(db, users, monkeypatch):
+    insert = MessageWriter._insert
+
+    def reject_bad(rows):
+        if any(row["content"] == "bad" for row in rows):
+            raise RuntimeError("rejected")
+        return insert(rows)
+
+    monkeypatch.setattr(MessageWriter, "_insert", staticmethod(reject_bad))
+
+    async def run():
+        writer = MessageWriter()
+        writer.start()
+        results = await asyncio.gather(
+            writer.submit(users[0], users[1], "ok 1"),
+            writer.submit(users[0], users[1], "bad"),
+            writer.submit(users[1], users[0], "ok 2"),
+            return_exceptions=True,
+        )
+        await writer.stop()
+        return writer, results
+
+    writer, results = asyncio.run(run())
+
+    first, failed, second = results
+    assert isinstance(failed, RuntimeError)
+    assert (first["content"], second["content"]) == ("ok 1", "ok 2")
+    assert writer.counters["failed"] == 1
+    assert sorted(m.content for m in db.query(Message)) == ["ok 1", "ok 2"]
+
+
+def test_unstarted_writer_stores_right_away(db, users):
+    async def run():
+        writer = MessageWriter()
+        return await writer.submit(users[0], users[1], "hola")
+
+    message = asyncio.run(run())
+
+    assert db.get(Message, message["id"]).content == "hola"
+    assert message["is_read"] is False
+
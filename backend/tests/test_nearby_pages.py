@@ -0,0 +1,77 @@
+import googlemaps
+import pytest
+
+from app.services import maps_services
+from app.services.maps_services import maps_service
+from app.services.place_service import PlaceService
+
+LAT, LNG = 40.4168, -3.7038
+
+
+@pytest.fixture(autouse=True)
+def no_token_delay(monkeypatch):
+    monkeypatch.setattr(maps_services, "_PAGE_TOKEN_DELAY_SECONDS", 0.0)
+    monkeypatch.setattr(maps_services, "_PAGE_TOKEN_RETRY_SECONDS", 0.0)
+
+
+def _place_ids(page):
+    return {place["place_id"] for place in page}
+
+
+def test_next_pages_are_fetched_only_on_demand(db):
+    first = maps_service.fetch_nearby_places(LAT, LNG, 1000, "cafe")
+    calls = maps_service.upstream_calls
+
+    pages = maps_service.iter_next_nearby_pages(LAT, LNG, 1000, "cafe")
+    assert maps_service.upstream_calls == calls
+
+    second = next(pages)
+    assert maps_service.upstream_calls == calls + 1
+    assert second and not _place_ids(second) & _place_ids(first)
+    pages.close()
+    assert maps_service.upstream_calls == calls + 1
+
+
+def test_fetched_pages_are_served_from_cache(db):
+    maps_service.fetch_nearby_places(LAT, LNG, 1000, "cafe")
+    fetched = list(maps_service.iter_next_nearby_pages(LAT, LNG, 1000, "cafe"))
+    calls = maps_service.upstream_calls
+
+    assert list(maps_service.iter_next_nearby_pages(LAT, LNG, 1000, "cafe")) == fetched
+    assert maps_service.upstream_calls == calls
+    assert 1 <= len(fetched) <= 2
+
+
+def test_no_pages_without_a_token(db):
+    maps_service.fetch_nearby_places(LAT, LNG, 1000, "cafe")
+    maps_service._page_tokens.clear()
+    calls = maps_service.upstream_calls
+
+    assert list(maps_service.iter_next_nearby_pages(LAT, LNG, 1000, "cafe")) == []
+    assert maps_service.upstream_calls == calls
+
+
+def test_inactive_token_is_retried(db, monkeypatch):
+    maps_service.fetch_nearby_places(LAT, LNG, 1000, "cafe")
+    places_nearby = maps_service.client.places_nearby
+    attempts = []
+
+    def warming_up(**kwargs):
+        attempts.append(kwargs)
+        if len(attempts) == 1:
+            raise googlemaps.exceptions.ApiError("INVALID_REQUEST")
+        return places_nearby(**kwargs)
+
+    monkeypatch.setattr(maps_service.client, "places_nearby", warming_up)
+
+    assert next(maps_service.iter_next_nearby_pages(LAT, LNG, 1000, "cafe"))
+    assert len(attempts) == 2
+
+
+def test_iter_nearby_places_stops_with_the_consumer(db):
+    calls = maps_service.upstream_calls
+
+    first = next(PlaceService.iter_nearby_places(LAT, LNG, 1000, "museum"))
+
+    assert first
+    assert maps_service.upstream_calls == calls + 1
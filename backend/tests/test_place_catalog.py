@@ -0,0 +1,173 @@
+import asyncio
+import math
+
+from app.core.config import settings
+from app.core.geo import EARTH_RADIUS_M, bounding_box, haversine_m
+from app.models.place import Place, PlaceSearch
+from app.services.catalog_writer import CatalogWriter
+from app.services.maps_services import maps_service
+from app.services.place_service import PlaceService
+
+LAT, LNG = 40.4168, -3.7038
+
+
+def test_nearby_search_fills_catalog_and_covers_area(db):
+    places = PlaceService.get_nearby_places(db, LAT, LNG, 1000, "cafe")
+
+    assert places
+    assert db.query(Place).count() == len(places)
+    assert db.query(PlaceSearch).count() == 1
+    assert PlaceService.is_area_covered(db, LAT, LNG, 1000, "cafe")
+    assert not PlaceService.is_area_covered(db, LAT, LNG, 1000, "museum")
+    assert not PlaceService.is_area_covered(db, LAT, LNG, 5000, "cafe")
+
+
+def test_covered_area_is_served_from_catalog(db):
+    PlaceService.get_nearby_places(db, LAT, LNG, 1000, "cafe")
+    maps_service.nearby_cache.clear()
+    calls = maps_service.upstream_calls
+
+    places = PlaceService.get_nearby_places(db, LAT, LNG, 1000, "cafe")
+
+    assert maps_service.upstream_calls == calls
+    assert places
+    assert all("cafe" in place["types"] for place in places)
+    counts = [place["user_ratings_total"] or 0 for place in places]
+    assert counts == sorted(counts, reverse=True)
+
+
+def test_keyword_search_is_not_served_from_catalog(db):
+    PlaceService.get_nearby_places(db, LAT, LNG, 1000, "cafe")
+    calls = maps_service.upstream_calls
+
+    PlaceService.get_nearby_places(db, LAT, LNG, 1000, "cafe", keyword="central")
+
+    assert maps_service.upstream_calls == calls + 1
+
+
+def test_google_failure_falls_back_to_degraded_catalog(db):
+    stored = PlaceService.get_nearby_places(db, LAT, LNG, 1000, "cafe")
+    keyword = stored[0]["name"].split()[-1].lower()
+    maps_service.client.error_rate = 1.0
+
+    places = PlaceService.get_nearby_places(db, LAT, LNG, 1000, "cafe", keyword=keyword)
+
+    assert places
+    assert all(place["degraded"] for place in places)
+    assert all(keyword in place["name"].lower() for place in places)
+    # No se cachea: al volver Google se le pregunta de nuevo
+    assert maps_service.get_cached_nearby_places(LAT, LNG, 1000, "cafe", keyword) is None
+
+
+def test_degraded_catalog_is_empty_for_unknown_area(db):
+    maps_service.client.error_rate = 1.0
+
+    assert PlaceService.get_nearby_places(db, LAT, LNG, 1000, "cafe") == []
+
+
+def test_catalog_writer_batches_until_flushed(db):
+    places = maps_service.fetch_nearby_places(LAT, LNG, 1000, "bar")
+    rows = PlaceService.nearby_rows(places)
+    search = PlaceService.search_row(LAT, LNG, 1000, "bar", "", len(places))
+
+    async def run():
+        writer = CatalogWriter()
+        writer.start()
+        writer.submit(rows, search)
+        writer.submit(rows[:1])  # el mismo lugar dos veces se escribe una
+        assert db.query(Place).count() == 0
+        assert writer.stats()["buffered"] == len(rows)
+        await writer.stop()
+        return writer.stats()
+
+    stats = asyncio.run(run())
+
+    assert db.query(Place).count() == len(rows)
+    assert PlaceService.is_area_covered(db, LAT, LNG, 1000, "bar")
+    assert stats["written"] == len(rows)
+    assert stats["flushes"] == 1
+
+
+def test_catalog_writer_requeues_failed_batch(db, monkeypatch):
+    rows = PlaceService.nearby_rows(maps_service.fetch_nearby_places(LAT, LNG, 1000, "bar"))
+    upsert = PlaceService.upsert_place_rows
+
+    def failing(session, batch):
+        raise RuntimeError("database down")
+
+    async def run():
+        writer = CatalogWriter()
+        writer.start()
+        writer.submit(rows)
+        monkeypatch.setattr(PlaceService, "upsert_place_rows", staticmethod(failing))
+        assert await writer.flush() == 0
+        assert writer.stats()["buffered"] == len(rows)
+        monkeypatch.setattr(PlaceService, "upsert_place_rows", staticmethod(upsert))
+        assert await writer.flush() == len(rows)
+        await writer.stop()
+        return writer.stats()
+
+    stats = asyncio.run(run())
+
+    assert stats["errors"] == 1
+    assert db.query(Place).count() == len(rows)
+
+
+def test_evicting_places_drops_the_searches_that_returned_them(db, monkeypatch):
+    old = maps_service.fetch_nearby_places(LAT, LNG, 1000, "bar")
+    new = maps_service.fetch_nearby_places(LAT, LNG, 1000, "museum")
+    monkeypatch.setattr(settings, "CATALOG_WRITE_MAX_BUFFER", len(new))
+
+    async def run():
+        writer = CatalogWriter()
+        writer.start()
+        writer.submit(PlaceService.nearby_rows(old), PlaceService.search_row(LAT, LNG, 1000, "bar", "", len(old)))
+        writer.submit(PlaceService.nearby_rows(new), PlaceService.search_row(LAT, LNG, 1000, "museum", "", len(new)))
+        await writer.stop()
+        return writer.stats()
+
+    stats = asyncio.run(run())
+
+    assert stats["dropped"] == len(old)
+    assert stats["dropped_searches"] == 1
+    assert not PlaceService.is_area_covered(db, LAT, LNG, 1000, "bar")
+    assert PlaceService.is_area_covered(db, LAT, LNG, 1000, "museum")
+
+
+def test_bounding_box_contains_the_circle():
+    for lat, lng, radius in ((LAT, LNG, 1000), (60.0, 10.0, 50000), (-33.9, 151.2, 20000)):
+        min_lat, max_lat, min_lng, max_lng = bounding_box(lat, lng, radius)
+        for bearing in range(0, 360, 5):
+            point_lat, point_lng = _destination(lat, lng, bearing, radius * 0.999)
+            assert min_lat <= point_lat <= max_lat
+            assert min_lng <= point_lng <= max_lng
+        # Y no mucho más: las esquinas quedan fuera del radio
+        assert haversine_m(lat, lng, max_lat, max_lng) > radius
+
+
+def test_bounding_box_is_unbounded_across_the_antimeridian_and_poles():
+    assert bounding_box(0.0, 179.99, 5000)[2:] == (-180.0, 180.0)
+    assert bounding_box(89.99, 0.0, 5000)[2:] == (-180.0, 180.0)
+
+
+def test_catalog_search_only_returns_places_within_radius(db):
+    PlaceService.get_nearby_places(db, LAT, LNG, 5000, "cafe")
+
+    stored = db.query(Place).count()
+    places = PlaceService.search_catalog(db, LAT, LNG, 3000, "cafe")
+
+    assert 0 < len(places) < stored
+    assert all(
+        haversine_m(LAT, LNG, place["location"]["lat"], place["location"]["lng"]) <= 3000 for place in places
+    )
+
+
+def _destination(lat, lng, bearing, distance):
+    """Punto a `distance` metros en el rumbo `bearing` (grados) desde (lat, lng)."""
+    angular = distance / EARTH_RADIUS_M
+    phi, lmb, theta = math.radians(lat), math.radians(lng), math.radians(bearing)
+    phi2 = math.asin(math.sin(phi) * math.cos(angular) + math.cos(phi) * math.sin(angular) * math.cos(theta))
+    lmb2 = lmb + math.atan2(
+        math.sin(theta) * math.sin(angular) * math.cos(phi), math.cos(angular) - math.sin(phi) * math.sin(phi2)
+    )
+    return math.degrees(phi2), math.degrees(lmb2)
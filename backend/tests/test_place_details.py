@@ -0,0 +1,63 @@
+import pytest
+from fastapi import HTTPException, Response
+
+from app.api.maps import DEGRADED_HEADER, get_place_details
+from app.services.maps_services import maps_service
+
+LAT, LNG = 40.4168, -3.7038
+
+
+def _open_circuit():
+    breaker = maps_service.breakers["details"]
+    for _ in range(breaker.failure_threshold):
+        breaker.record_failure()
+
+
+def _status(place_id):
+    with pytest.raises(HTTPException) as error:
+        get_place_details(place_id, Response(), current_user=None)
+    return error.value.status_code
+
+
+@pytest.fixture
+def place_id(db):
+    return maps_service.fetch_nearby_places(LAT, LNG, 1000, "cafe")[0]["place_id"]
+
+
+def test_details_are_cached(place_id):
+    first = get_place_details(place_id, Response(), current_user=None)
+    calls = maps_service.upstream_calls
+
+    assert get_place_details(place_id, Response(), current_user=None) == first
+    assert maps_service.upstream_calls == calls
+
+
+def test_cached_not_found_is_404_with_open_circuit(db):
+    assert _status("missing") == 404
+    _open_circuit()
+
+    assert _status("missing") == 404
+
+
+def test_catalog_copy_is_served_degraded(place_id):
+    fresh = get_place_details(place_id, Response(), current_user=None)
+    maps_service.details_cache.clear()
+    _open_circuit()
+    response = Response()
+
+    place = get_place_details(place_id, response, current_user=None)
+
+    assert place == {**fresh, "degraded": True}
+    assert response.headers[DEGRADED_HEADER] == "true"
+
+
+def test_no_copy_is_503_with_open_circuit(place_id):
+    _open_circuit()
+
+    assert _status(place_id) == 503
+
+
+def test_no_copy_is_502_on_upstream_error(place_id):
+    maps_service.client.error_rate = 1.0
+
+    assert _status(place_id) == 502
@@ -0,0 +1,95 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+
+from app.core.config import settings
+from app.models.location import Location
+from app.services.position_recorder import PositionRecorder
+
+LAT, LNG = 40.4168, -3.7038
+# ~1 m y ~100 m hacia el norte
+NUDGE = 0.00001
+MOVE = 0.001
+
+
+@pytest.fixture(autouse=True)
+def persist_enabled(monkeypatch):
+    monkeypatch.setattr(settings, "PRESENCE_PERSIST_ENABLED", True)
+    monkeypatch.setattr(settings, "PRESENCE_PERSIST_INTERVAL_SECONDS", 60.0)
+
+
+def _latitudes(db, user_id):
+    return [row.latitude for row in db.query(Location).filter_by(user_id=user_id).order_by(Location.id)]
+
+
+def _database_down(rows):
+    raise RuntimeError("db down")
+
+
+def test_close_positions_are_downsampled_and_written_on_stop(db, users):
+    async def run():
+        recorder = PositionRecorder()
+        recorder.start()
+        for lat in (LAT, LAT + NUDGE, LAT + 2 * NUDGE, LAT + MOVE):
+            recorder.record(users[0], lat, LNG, datetime.now())
+        recorder.record(users[1], LAT, LNG, datetime.now())
+        assert db.query(Location).count() == 0
+        await recorder.stop()
+        return recorder
+
+    recorder = asyncio.run(run())
+
+    assert _latitudes(db, users[0]) == [LAT, LAT + MOVE]
+    assert _latitudes(db, users[1]) == [LAT]
+    assert recorder.counters["downsampled"] == 2
+    assert recorder.counters["written"] == 3
+
+
+def test_full_batch_is_written_without_waiting(db, users, monkeypatch):
+    monkeypatch.setattr(settings, "PRESENCE_PERSIST_BATCH_ROWS", 2)
+
+    async def run():
+        recorder = PositionRecorder()
+        recorder.start()
+        recorder.record(users[0], LAT, LNG, datetime.now())
+        recorder.record(users[0], LAT + MOVE, LNG, datetime.now())
+        for _ in range(100):
+            if recorder.counters["flushes"]:
+                break
+            await asyncio.sleep(0.01)
+        flushes = recorder.counters["flushes"]
+        await recorder.stop()
+        return flushes
+
+    assert asyncio.run(run()) == 1
+    assert _latitudes(db, users[0]) == [LAT, LAT + MOVE]
+
+
+def test_failed_writes_stay_buffered_in_order(db, users, monkeypatch):
+    async def run():
+        recorder = PositionRecorder()
+        recorder.start()
+        for step in range(3):
+            recorder.record(users[0], LAT + step * MOVE, LNG, datetime.now())
+
+        insert = recorder._insert
+        monkeypatch.setattr(recorder, "_insert", _database_down)
+        assert await recorder.flush() == 0
+        monkeypatch.setattr(recorder, "_insert", insert)
+        await recorder.stop()
+        return recorder
+
+    recorder = asyncio.run(run())
+
+    assert recorder.counters["errors"] == 1
+    assert _latitudes(db, users[0]) == [LAT, LAT + MOVE, LAT + 2 * MOVE]
+
+
+def test_disabled_recorder_keeps_nothing(monkeypatch):
+    monkeypatch.setattr(settings, "PRESENCE_PERSIST_ENABLED", False)
+    recorder = PositionRecorder()
+    recorder.start()
+    recorder.record(1, LAT, LNG, datetime.now())
+
+    assert recorder.stats()["buffered"] == 0
@@ -0,0 +1,64 @@
+import asyncio
+import json
+
+from app.websocket.backplane import LoopbackBackplane
+from app.websocket.presence_manager import PresenceManager
+
+from fake_socket import FakeWebSocket, drain
+
+LAT, LNG = 40.4168, -3.7038
+
+
+async def _online(manager, user_id, friend_ids):
+    websocket = FakeWebSocket()
+    await manager.connect(user_id, f"user{user_id}", websocket, set(friend_ids), share_location=True)
+    return websocket
+
+
+def test_new_friend_gets_the_position_without_reconnecting():
+    async def run():
+        manager = PresenceManager(LoopbackBackplane())
+        await _online(manager, 1, set())
+        other = await _online(manager, 2, set())
+        await manager.update_location(1, LAT, LNG)
+        await manager.flush()
+        await drain()
+        assert other.sent == []
+
+        await manager.friendship_changed(1, 2, True)
+        await drain()
+        return manager, other
+
+    manager, other = asyncio.run(run())
+
+    [frame] = [json.loads(frame) for frame in other.sent]
+    assert [u["user_id"] for u in frame["updates"]] == [1]
+    assert manager.get_friend_ids(1) == {2}
+    assert manager.get_friend_ids(2) == {1}
+
+
+def test_removed_friend_goes_offline_and_stops_receiving():
+    async def run():
+        manager = PresenceManager(LoopbackBackplane())
+        await _online(manager, 1, {2})
+        other = await _online(manager, 2, {1})
+        await manager.update_location(1, LAT, LNG)
+        await manager.flush()
+        await drain()
+        friend_ids = manager.get_friend_ids(2)
+
+        await manager.friendship_changed(2, 1, False)
+        await drain()
+        await manager.update_location(1, LAT + 0.01, LNG)
+        await manager.flush()
+        await drain()
+        return manager, other, friend_ids
+
+    manager, other, friend_ids = asyncio.run(run())
+
+    frames = [json.loads(frame) for frame in other.sent]
+    assert [frame["type"] for frame in frames] == ["updates", "offline"]
+    assert frames[1]["user_id"] == 1
+    assert manager.get_friend_ids(2) == set()
+    # El conjunto anterior no se modifica: puede estar recorriéndose
+    assert friend_ids == {1}
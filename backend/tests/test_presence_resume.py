@@ -0,0 +1,88 @@
+import asyncio
+import json
+
+from app.core.config import settings
+from app.websocket.backplane import LoopbackBackplane
+from app.websocket.presence_manager import PresenceManager
+
+from fake_socket import FakeWebSocket, drain
+
+LAT, LNG = 40.4168, -3.7038
+MOVE = 0.001
+
+
+async def _online(manager, user_id, friend_ids):
+    websocket = FakeWebSocket()
+    await manager.connect(user_id, f"user{user_id}", websocket, set(friend_ids), share_location=True)
+    return websocket
+
+
+async def _move(manager, user_id, lat):
+    await manager.update_location(user_id, lat, LNG)
+    await manager.flush()
+    await drain()
+
+
+def test_reconnect_resumes_with_the_missed_events():
+    async def run():
+        manager = PresenceManager(LoopbackBackplane())
+        await _online(manager, 1, {2})
+        first = await _online(manager, 2, {1})
+        await _move(manager, 1, LAT)
+        since = manager.get_seq(2)
+
+        manager.disconnect(2, first)
+        await _move(manager, 1, LAT + MOVE)
+        await _move(manager, 1, LAT + 2 * MOVE)
+
+        second = await _online(manager, 2, {1})
+        assert manager.resume(2, since)
+        await drain()
+        return manager, first, second, since
+
+    manager, first, second, since = asyncio.run(run())
+
+    assert len(first.sent) == 1
+    [frame] = [json.loads(frame) for frame in second.sent]
+    assert [u["lat"] for u in frame["updates"]] == [LAT + 2 * MOVE]
+    assert frame["seq"] == manager.get_seq(2) == since + 2
+    assert manager.counters["resumed"] == 1
+
+
+def test_since_out_of_range_falls_back_to_a_snapshot(monkeypatch):
+    monkeypatch.setattr(settings, "PRESENCE_RESUME_BUFFER", 2)
+
+    async def run():
+        manager = PresenceManager(LoopbackBackplane())
+        await _online(manager, 1, {2})
+        await _online(manager, 2, {1})
+        since = manager.get_seq(2)
+        for step in range(3):
+            await _move(manager, 1, LAT + step * MOVE)
+        return manager, since
+
+    manager, since = asyncio.run(run())
+
+    # Del buffer ya han salido los eventos posteriores a since
+    assert not manager.resume(2, since)
+    assert not manager.resume(2, manager.get_seq(2) + 1)
+    assert manager.resume(2, manager.get_seq(2) - 2)
+    assert manager.counters["resume_fallbacks"] == 2
+
+
+def test_session_is_dropped_after_the_grace_period(monkeypatch):
+    monkeypatch.setattr(settings, "PRESENCE_RESUME_GRACE_SECONDS", 0.0)
+
+    async def run():
+        manager = PresenceManager(LoopbackBackplane())
+        await _online(manager, 1, {2})
+        websocket = await _online(manager, 2, {1})
+        since = manager.get_seq(2)
+        manager.disconnect(2, websocket)
+        await _online(manager, 2, {1})
+        return manager, since
+
+    manager, since = asyncio.run(run())
+
+    assert manager.stats()["detached"] == 0
+    assert not manager.resume(2, since)
@@ -0,0 +1,70 @@
+import asyncio
+import json
+
+from app.websocket.backplane import LoopbackBackplane
+from app.websocket.presence_manager import PresenceManager
+
+from fake_socket import FakeWebSocket, drain
+
+LAT, LNG = 40.4168, -3.7038
+# ~1 m y ~100 m hacia el norte
+NUDGE = 0.00001
+MOVE = 0.001
+
+
+async def _online(manager, user_id, friend_ids):
+    websocket = FakeWebSocket()
+    await manager.connect(user_id, f"user{user_id}", websocket, set(friend_ids), share_location=True)
+    return websocket
+
+
+def _updates(websocket):
+    return [json.loads(frame)["updates"] for frame in websocket.sent]
+
+
+def test_positions_are_sent_once_per_tick_with_the_latest():
+    async def run():
+        manager = PresenceManager(LoopbackBackplane())
+        await _online(manager, 1, {2})
+        friend = await _online(manager, 2, {1})
+
+        for step in range(3):
+            await manager.update_location(1, LAT + step * MOVE, LNG)
+        await drain()
+        assert friend.sent == []
+
+        await manager.flush()
+        await drain()
+        return manager, friend
+
+    manager, friend = asyncio.run(run())
+
+    [updates] = _updates(friend)
+    assert [(u["user_id"], u["lat"]) for u in updates] == [(1, LAT + 2 * MOVE)]
+    assert manager.counters["coalesced"] == 2
+    assert manager.counters["updates_flushed"] == 1
+
+
+def test_gps_jitter_is_not_broadcast():
+    async def run():
+        manager = PresenceManager(LoopbackBackplane())
+        await _online(manager, 1, {2})
+        friend = await _online(manager, 2, {1})
+
+        await manager.update_location(1, LAT, LNG)
+        await manager.flush()
+        await drain()
+        await manager.update_location(1, LAT + NUDGE, LNG)
+        await manager.flush()
+        await drain()
+        # La posición sí se guarda aunque no se difunda
+        assert manager.get_position(1) == (LAT + NUDGE, LNG)
+        await manager.update_location(1, LAT + MOVE, LNG)
+        await manager.flush()
+        await drain()
+        return manager, friend
+
+    manager, friend = asyncio.run(run())
+
+    assert [[u["lat"] for u in updates] for updates in _updates(friend)] == [[LAT], [LAT + MOVE]]
+    assert manager.counters["dropped_jitter"] == 1
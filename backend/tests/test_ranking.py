@@ -0,0 +1,71 @@
+from app.services.ranking import PlaceColumns, rank_columns, rank_places
+
+LAT, LNG = 40.4168, -3.7038
+
+
+def _place(place_id, types=("cafe",), rating=4.0, reviews=100, open_now=None, dlat=0.0):
+    return {
+        "place_id": place_id,
+        "types": list(types),
+        "rating": rating,
+        "user_ratings_total": reviews,
+        "open_now": open_now,
+        "location": {"lat": LAT + dlat, "lng": LNG},
+    }
+
+
+def _ids(places):
+    return [place["place_id"] for place in places]
+
+
+def test_preferred_types_match_case_insensitively():
+    columns = PlaceColumns.build(
+        [_place("a", ["Cafe"]), _place("b", ["museum"]), _place("c", [])], ["CAFE"]
+    )
+
+    assert columns.matches.tolist() == [True, False, False]
+
+
+def test_score_components_order_places():
+    places = [
+        _place("far", dlat=0.008),
+        _place("low", rating=2.0),
+        _place("best", types=["museum"], open_now=True),
+        _place("closed", open_now=False),
+    ]
+
+    ranked = rank_places(places, LAT, LNG, 1000, ["museum"], limit=10)
+
+    # preferencia > distancia (~890 m de 1000) > rating > abierto
+    assert _ids(ranked) == ["best", "closed", "low", "far"]
+
+
+def test_limit_keeps_the_top_in_order():
+    places = [_place(str(i), rating=i % 5, reviews=i * 10) for i in range(50)]
+
+    full = rank_places(places, LAT, LNG, 1000, [], limit=50)
+    top = rank_places(places, LAT, LNG, 1000, [], limit=5)
+
+    assert top == full[:5]
+    assert rank_places(places, LAT, LNG, 1000, [], limit=0) == []
+    assert rank_places([], LAT, LNG, 1000, [], limit=5) == []
+
+
+def test_ties_keep_arrival_order():
+    places = [_place(str(i)) for i in range(5)]
+
+    assert _ids(rank_places(places, LAT, LNG, 1000, [], limit=3)) == ["0", "1", "2"]
+
+
+def test_columns_built_per_page_rank_like_the_whole_list():
+    places = [_place(str(i), types=["bar" if i % 3 else "cafe"], rating=i % 5, dlat=i * 1e-4) for i in range(30)]
+    pages = [PlaceColumns.build(places[i:i + 10], ["cafe"]) for i in range(0, 30, 10)]
+    # Los duplicados se quitan con take antes de unir
+    pages[1] = pages[1].take([0, 2, 4, 6, 8])
+    kept = places[:10] + places[10:20:2] + places[20:]
+
+    merged = PlaceColumns.concat(pages)
+
+    assert len(merged) == len(kept)
+    assert rank_columns(merged, LAT, LNG, 1000, 8) == rank_places(kept, LAT, LNG, 1000, ["cafe"], 8)
+    assert len(PlaceColumns.concat([])) == 0
@@ -0,0 +1,78 @@
+from datetime import datetime
+
+from app.models.conversation import Conversation
+from app.schemas.message import MessageCreate
+from app.services.message_service import MessageService
+
+
+def _send(db, sender_id, receiver_id, content="hola"):
+    return MessageService.create_message(db, sender_id, MessageCreate(receiver_id=receiver_id, content=content))
+
+
+def _inbox_row(db, user_id, other_user_id):
+    db.expire_all()
+    return (
+        db.query(Conversation)
+        .filter(Conversation.user_id == user_id, Conversation.other_user_id == other_user_id)
+        .one()
+    )
+
+
+def test_read_watermark_only_moves_forward(db, users):
+    a, b, _ = users
+    ids = [_send(db, a, b, str(i)).id for i in range(3)]
+
+    assert MessageService.count_unread(db, b, a) == 3
+    assert MessageService.advance_read_watermark(db, b, a, ids[1]) == ids[1]
+    assert MessageService.advance_read_watermark(db, b, a, ids[0]) == ids[1]
+    assert MessageService.count_unread(db, b, a) == 1
+    # El emisor no tiene nada sin leer
+    assert MessageService.count_unread(db, a, b) == 0
+
+
+def test_mark_as_read_advances_the_watermark(db, users):
+    a, b, _ = users
+    ids = [_send(db, a, b, str(i)).id for i in range(3)]
+    message = MessageService.get_message_by_id(db, ids[1])
+
+    assert MessageService.mark_as_read(db, message).is_read
+
+    assert MessageService.get_read_watermark(db, b, a) == ids[1]
+    assert MessageService.count_unread(db, b, a) == 1
+    assert _inbox_row(db, b, a).unread_count == 1
+
+
+def test_history_read_flags_agree_with_unread_count(db, users):
+    a, b, _ = users
+    ids = [_send(db, a if i % 2 else b, b if i % 2 else a, str(i)).id for i in range(6)]
+    MessageService.advance_read_watermark(db, b, a, ids[3])
+    MessageService.mark_as_read(db, MessageService.get_message_by_id(db, ids[0]))
+
+    history = [(m.receiver_id, m.is_read) for m in MessageService.get_conversation(db, b, a)]
+
+    # b leyó hasta ids[3]; a, solo ids[0]
+    assert [is_read for _, is_read in history] == [True, True, False, True, False, False]
+    for reader, other in ((a, b), (b, a)):
+        unread = [receiver for receiver, is_read in history if receiver == reader and not is_read]
+        assert len(unread) == MessageService.count_unread(db, reader, other)
+        assert len(unread) == _inbox_row(db, reader, other).unread_count
+
+
+def test_watermark_follows_history_order(db, users):
+    a, b, _ = users
+    # Un lote sellado antes de insertarse: id y timestamp en orden distinto
+    later, earlier = MessageService.insert_messages(db, [
+        {"sender_id": a, "receiver_id": b, "content": "later", "timestamp": datetime(2026, 1, 1, 12, 0, 2)},
+        {"sender_id": a, "receiver_id": b, "content": "earlier", "timestamp": datetime(2026, 1, 1, 12, 0, 1)},
+    ])
+    assert [m.id for m in MessageService.get_conversation(db, a, b)] == [earlier, later]
+
+    MessageService.advance_read_watermark(db, b, a, earlier)
+    assert MessageService.count_unread(db, b, a) == 1
+    assert _inbox_row(db, b, a).unread_count == 1
+
+    MessageService.advance_read_watermark(db, b, a, later)
+    assert MessageService.count_unread(db, b, a) == 0
+    assert _inbox_row(db, b, a).unread_count == 0
+    # Volver al anterior en el historial no la retrocede
+    assert MessageService.advance_read_watermark(db, b, a, earlier) == later
@@ -0,0 +1,62 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+
+from app.core.config import settings
+from app.models.location import Location
+from app.models.preference import Preference
+from app.services.maps_services import UpstreamMeter, maps_service
+from app.services.recommendation_prewarmer import RecommendationPrewarmer
+from app.services.recommendation_service import RecommendationService
+
+
+@pytest.fixture
+def active_users(db, users):
+    """Los tres usuarios con una posición reciente, lejos entre sí, y preferencia "cafe"."""
+    for i, user_id in enumerate(users):
+        db.add(Location(user_id=user_id, latitude=40.0 + i, longitude=-3.0, timestamp=datetime.now()))
+        db.add(Preference(user_id=user_id, category="cafe"))
+    db.commit()
+    return users
+
+
+def test_cycle_stops_at_its_budget(active_users, monkeypatch):
+    monkeypatch.setattr(settings, "PREWARM_UPSTREAM_BUDGET", 1)
+    monkeypatch.setattr(settings, "PREWARM_CONCURRENCY", 1)
+
+    summary = asyncio.run(RecommendationPrewarmer().run_cycle())
+
+    assert summary["users"] == 3
+    assert summary["warmed"] == 1
+    assert summary["skipped"] == 2
+    assert summary["upstream_calls"] >= 1
+
+
+def test_user_traffic_does_not_use_the_budget(active_users, monkeypatch):
+    monkeypatch.setattr(settings, "PREWARM_UPSTREAM_BUDGET", 10)
+    monkeypatch.setattr(settings, "PREWARM_CONCURRENCY", 1)
+    refresh = RecommendationService.refresh
+
+    def refresh_with_traffic(*args):
+        # Peticiones de usuarios llegando mientras dura el ciclo
+        maps_service.upstream_calls += 100
+        return refresh(*args)
+
+    monkeypatch.setattr(RecommendationService, "refresh", staticmethod(refresh_with_traffic))
+
+    summary = asyncio.run(RecommendationPrewarmer().run_cycle())
+
+    assert summary["warmed"] == 3
+    assert summary["skipped"] == 0
+    assert summary["upstream_calls"] < 10
+
+
+def test_meter_counts_calls_made_from_the_recommendation_pool(db):
+    meter = UpstreamMeter()
+    maps_service.fetch_nearby_places(10.0, 10.0, 1000, "bar")
+
+    with maps_service.metered(meter):
+        RecommendationService.compute(20.0, 20.0, 1000, 5, ["cafe", "museum"])
+
+    assert meter.calls == 2
@@ -0,0 +1,150 @@
+import asyncio
+
+from app.websocket.outbound import EVICTED_CLOSE_CODE, SocketWriter, counters
+
+from fake_socket import FakeWebSocket, drain
+
+
+def test_messages_are_sent_in_order():
+    async def run():
+        websocket = FakeWebSocket()
+        writer = SocketWriter(websocket, maxsize=10).start()
+        writer.send_text("a")
+        writer.send_json({"b": 1})
+        writer.send_bytes(b"c")
+        await drain()
+        writer.stop()
+        return websocket.sent
+
+    assert asyncio.run(run()) == ["a", {"b": 1}, b"c"]
+
+
+def test_full_queue_drops_then_evicts_after_grace():
+    async def run():
+        websocket = FakeWebSocket()
+        websocket.gate.clear()
+        writer = SocketWriter(websocket, maxsize=1, full_grace=60, send_timeout=5).start()
+        writer.send_text("in flight")
+        await drain()
+        assert writer.send_text("queued")
+        assert not writer.send_text("dropped")
+        assert not writer.closed
+        writer._full_since -= 60
+        assert not writer.send_text("evicts")
+        await drain()
+        return writer, websocket
+
+    writer, websocket = asyncio.run(run())
+
+    assert writer.closed
+    assert websocket.closed_with == EVICTED_CLOSE_CODE
+
+
+def test_queue_left_full_is_evicted_without_further_sends():
+    async def run():
+        websocket = FakeWebSocket()
+        websocket.gate.clear()
+        writer = SocketWriter(websocket, maxsize=1, full_grace=0.01, send_timeout=5).start()
+        writer.send_text("in flight")
+        await drain()
+        writer.send_text("fills the queue")
+        await asyncio.sleep(0.03)
+        await drain()
+        return writer, websocket
+
+    writer, websocket = asyncio.run(run())
+
+    assert writer.closed
+    assert websocket.closed_with == EVICTED_CLOSE_CODE
+
+
+def test_queue_drained_within_grace_is_kept():
+    async def run():
+        websocket = FakeWebSocket()
+        websocket.gate.clear()
+        writer = SocketWriter(websocket, maxsize=1, full_grace=0.03, send_timeout=5).start()
+        writer.send_text("a")
+        await drain()
+        writer.send_text("b")
+        await asyncio.sleep(0.01)
+        websocket.gate.set()
+        await asyncio.sleep(0.04)
+        writer.stop()
+        return writer, websocket
+
+    writer, websocket = asyncio.run(run())
+
+    assert websocket.closed_with is None
+    assert websocket.sent == ["a", "b"]
+
+
+def test_send_timeout_evicts():
+    async def run():
+        websocket = FakeWebSocket()
+        websocket.gate.clear()
+        writer = SocketWriter(websocket, maxsize=10, send_timeout=0.01).start()
+        writer.send_text("stuck")
+        await asyncio.sleep(0.05)
+        return writer, websocket
+
+    writer, websocket = asyncio.run(run())
+
+    assert writer.closed
+    assert websocket.closed_with == EVICTED_CLOSE_CODE
+    assert websocket.sent == []
+
+
+def test_keyed_messages_are_conflated_in_order():
+    async def run():
+        websocket = FakeWebSocket()
+        websocket.gate.clear()
+        writer = SocketWriter(websocket, maxsize=10).start()
+        conflated = counters["conflated"]
+
+        writer.send_text("first")
+        writer.send_keyed("user:1", {"lat": 1})
+        writer.send_keyed("user:2", {"lat": 2})
+        writer.send_keyed("user:1", {"lat": 3})
+        writer.send_text("last")
+        websocket.gate.set()
+        await drain()
+        writer.stop()
+        return websocket.sent, counters["conflated"] - conflated
+
+    sent, conflated = asyncio.run(run())
+
+    assert sent == ["first", {"lat": 3}, {"lat": 2}, "last"]
+    assert conflated == 1
+
+
+def test_mailbox_is_rendered_into_frames():
+    async def run():
+        websocket = FakeWebSocket()
+        writer = SocketWriter(websocket, maxsize=10, render_mailbox=lambda values: [b"".join(values)]).start()
+        websocket.gate.clear()
+        writer.send_keyed(1, b"a")
+        writer.send_keyed(2, b"b")
+        websocket.gate.set()
+        await drain()
+        writer.stop()
+        return websocket.sent
+
+    assert asyncio.run(run()) == [b"ab"]
+
+
+def test_mailbox_scheduled_once_queue_has_room():
+    async def run():
+        websocket = FakeWebSocket()
+        websocket.gate.clear()
+        writer = SocketWriter(websocket, maxsize=2, full_grace=60).start()
+        writer.send_text("a")
+        await drain()  # "a" en vuelo
+        assert writer.send_text("b") and writer.send_text("c")  # cola llena
+        assert writer.send_keyed("k", {"v": 1})
+        assert writer.send_keyed("k", {"v": 2})
+        websocket.gate.set()
+        await drain()
+        writer.stop()
+        return websocket.sent
+
+    assert asyncio.run(run()) == ["a", "b", "c", {"v": 2}]
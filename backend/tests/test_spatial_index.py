@@ -0,0 +1,62 @@
+import random
+
+from app.core.geo import haversine_m
+from app.websocket.spatial_index import SpatialGrid
+
+LAT, LNG = 40.4168, -3.7038
+
+
+def _scatter(grid, count, spread_deg=0.2, seed=0):
+    rng = random.Random(seed)
+    points = {}
+    for key in range(count):
+        points[key] = (LAT + rng.uniform(-spread_deg, spread_deg), LNG + rng.uniform(-spread_deg, spread_deg))
+        grid.update(key, *points[key])
+    return points
+
+
+def test_within_radius_matches_a_full_scan():
+    grid = SpatialGrid(500)
+    points = _scatter(grid, 500)
+
+    found = grid.within_radius(LAT, LNG, 3000)
+
+    expected = {key for key, (lat, lng) in points.items() if haversine_m(LAT, LNG, lat, lng) <= 3000}
+    assert {key for key, _ in found} == expected
+    distances = [distance for _, distance in found]
+    assert distances == sorted(distances)
+
+
+def test_moving_and_removing_points():
+    grid = SpatialGrid(500)
+    grid.update("a", LAT, LNG)
+    grid.update("a", LAT + 0.1, LNG)
+
+    assert grid.within_radius(LAT, LNG, 1000) == []
+    assert [key for key, _ in grid.within_radius(LAT + 0.1, LNG, 1000)] == ["a"]
+
+    grid.remove("a")
+    assert len(grid) == 0
+    assert grid.position("a") is None
+    assert grid._cells == {}
+
+
+def test_among_restricts_the_candidates():
+    grid = SpatialGrid(500)
+    _scatter(grid, 200, spread_deg=0.01)
+    friends = {1, 2, 3, 999}
+
+    found = grid.within_radius(LAT, LNG, 5000, among=friends)
+
+    assert {key for key, _ in found} == {1, 2, 3}
+    assert set(grid.in_bbox(LAT - 1, LNG - 1, LAT + 1, LNG + 1, among=friends)) == {1, 2, 3}
+
+
+def test_bbox_across_the_antimeridian():
+    grid = SpatialGrid(500)
+    grid.update("east", 0.0, 179.99)
+    grid.update("west", 0.0, -179.99)
+    grid.update("far", 0.0, 170.0)
+
+    assert set(grid.in_bbox(-1.0, 179.9, 1.0, -179.9)) == {"east", "west"}
+    assert {key for key, _ in grid.within_radius(0.0, 180.0, 5000)} == {"east", "west"}
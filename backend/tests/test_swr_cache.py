@@ -0,0 +1,88 @@
+import threading
+import time
+
+import pytest
+
+from app.core.cache import StaleWhileRevalidateCache
+
+
+def _swr(**ttls):
+    options = {"maxsize": 10, "soft_ttl": 0.05, "hard_ttl": 60, "negative_ttl": 0.05}
+    options.update(ttls)
+    return StaleWhileRevalidateCache(**options)
+
+
+def test_swr_serves_fresh_values_without_loading():
+    cache = _swr()
+    calls = []
+
+    assert cache.get_or_load("k", lambda: calls.append(1) or "v") == "v"
+    assert cache.get_or_load("k", lambda: calls.append(1) or "w") == "v"
+    assert len(calls) == 1
+    assert cache.stats()["hits"] == 1
+
+
+def test_swr_serves_stale_value_and_refreshes_once():
+    cache = _swr()
+    cache.get_or_load("k", lambda: "old")
+    time.sleep(0.06)
+    release = threading.Event()
+    calls = []
+
+    def loader():
+        calls.append(1)
+        release.wait(1)
+        return "new"
+
+    assert cache.get_or_load("k", loader) == "old"
+    assert cache.get_or_load("k", loader) == "old"
+    release.set()
+    cache._executor.shutdown(wait=True)
+
+    assert len(calls) == 1
+    assert cache.peek("k") == "new"
+    assert cache.stats()["stale_hits"] == 2
+
+
+def test_swr_blocks_on_loader_after_hard_ttl():
+    cache = _swr(soft_ttl=0.01, hard_ttl=0.02)
+    cache.get_or_load("k", lambda: "old")
+    time.sleep(0.03)
+
+    assert cache.get_or_load("k", lambda: "new") == "new"
+    assert cache.stats()["misses"] == 2
+
+
+def test_swr_caches_negative_results_briefly():
+    cache = _swr(negative_ttl=0.02)
+    cache.get_or_load("k", lambda: None)
+
+    assert cache.get_or_load("k", lambda: "found") is None
+    time.sleep(0.03)
+    assert cache.get_or_load("k", lambda: "found") == "found"
+
+
+def test_swr_failed_refresh_keeps_stale_value():
+    cache = _swr()
+    cache.get_or_load("k", lambda: "old")
+    time.sleep(0.06)
+
+    def failing():
+        raise RuntimeError("upstream down")
+
+    assert cache.get_or_load("k", failing) == "old"
+    cache._executor.shutdown(wait=True)
+
+    assert cache.peek("k") == "old"
+    assert cache.stats()["refresh_errors"] == 1
+
+
+def test_swr_loader_error_is_not_cached():
+    cache = _swr()
+
+    def failing():
+        raise RuntimeError("upstream down")
+
+    with pytest.raises(RuntimeError):
+        cache.get_or_load("k", failing)
+    assert cache.get_or_load("k", lambda: "v") == "v"
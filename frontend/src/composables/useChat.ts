@@ -40,6 +40,14 @@ export function useChat(otherUserId: Ref<number | null>) {
 
     ws.onmessage = (event) => {
       const data = JSON.parse(event.data)
+      if (data.type === 'ping') {
+        ws?.send(JSON.stringify({ type: 'pong' }))
+        return
+      }
+      if (data.type === 'read') {
+        // Marca de lectura del otro usuario; aún no se muestra
+        return
+      }
       if (data.error) {
         error.value = data.error
         return
@@ -28,6 +28,8 @@ export function usePresence() {
   let sendInterval: ReturnType<typeof setInterval> | null = null
   let reconnectTimer: ReturnType<typeof setTimeout> | null = null
   let unmounted = false
+  // Último "seq" recibido, para reanudar la sesión sin snapshot completo
+  let lastSeq: number | null = null
 
   function buildUrl(): string | null {
     const token = authStore.token
@@ -35,7 +37,8 @@ export function usePresence() {
     const apiUrl = import.meta.env.VITE_API_URL ?? ''
     // Convertir http(s):// → ws(s)://
     const wsUrl = apiUrl.replace(/^http/, 'ws').replace(/\/$/, '')
-    return `${wsUrl}/ws/presence?token=${encodeURIComponent(token)}`
+    const since = lastSeq !== null ? `&since=${lastSeq}` : ''
+    return `${wsUrl}/ws/presence?token=${encodeURIComponent(token)}${since}`
   }
 
   function handleMessage(raw: string) {
@@ -46,12 +49,22 @@ export function usePresence() {
       return
     }
 
-    if (data.type === 'snapshot') {
+    if (data.type === 'ping') {
+      // El servidor cierra los sockets que no contestan
+      ws?.send(JSON.stringify({ type: 'pong' }))
+    } else if (data.type === 'snapshot') {
       const map = new Map<number, FriendLocation>()
       for (const f of data.friends ?? []) {
         map.set(f.user_id, f)
       }
       friends.value = map
+    } else if (data.type === 'updates') {
+      // Lote por tick del servidor: un solo re-render para todos
+      const map = new Map(friends.value)
+      for (const f of data.updates ?? []) {
+        map.set(f.user_id, f)
+      }
+      friends.value = map
     } else if (data.type === 'update') {
       friends.value.set(data.user_id, {
         user_id: data.user_id,
@@ -66,6 +79,10 @@ export function usePresence() {
       friends.value.delete(data.user_id)
       friends.value = new Map(friends.value)
     }
+
+    if (typeof data.seq === 'number') {
+      lastSeq = data.seq
+    }
   }
 
   function startSending() {
@@ -114,7 +131,7 @@ export function usePresence() {
     ws.onclose = () => {
       stopSending()
       status.value = 'disconnected'
-      friends.value = new Map()
+      // No vaciamos friends: al reconectar con since llegan sólo los cambios
       if (!unmounted) {
         reconnectTimer = setTimeout(connect, RECONNECT_DELAY_MS)
       }
@@ -18,7 +18,9 @@ function connect() {
 
   ws.onmessage = (event) => {
     const data = JSON.parse(event.data)
-    if (data.type === 'emoji') {
+    if (data.type === 'ping') {
+      ws?.send(JSON.stringify({ type: 'pong' }))
+    } else if (data.type === 'emoji') {
       emojiHandlers.forEach(h => h(data.sender_id, data.emoji))
     }
   }